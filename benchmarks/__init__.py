@@ -0,0 +1,3 @@
+'''
+Scribble benchmarks - run with `python -m benchmarks.run`, see run.py
+'''
@@ -0,0 +1,45 @@
+'''
+Scribble benchmark campaigns - synthetic databases of any size, the same every time for the same seed
+'''
+import json # write the databases
+import os # where to write them
+import random # names, descriptions and stats
+
+from scribblecore import INVENTORY_JSON, ENEMY_JSON, LOCATION_JSON, STAT_FIELDS
+
+# share of the records that goes into each database
+CAMPAIGN_SHARES = {INVENTORY_JSON: 0.2, ENEMY_JSON: 0.6, LOCATION_JSON: 0.2}
+ADJECTIVES = ('Ancient', 'Burning', 'Cursed', 'Dire', 'Elder', 'Frost', 'Gilded', 'Hollow', 'Iron', 'Lesser', 'Mad', 'Shadow',
+              'Silver', 'Storm', 'Venom', 'Wild')
+NOUNS = {INVENTORY_JSON: ('Potion', 'Rope', 'Dagger', 'Shield', 'Scroll', 'Amulet', 'Lantern', 'Key', 'Ring', 'Bow'),
+         ENEMY_JSON: ('Goblin', 'Dragon', 'Troll', 'Skeleton', 'Wyvern', 'Basilisk', 'Ogre', 'Wraith', 'Kobold', 'Lich'),
+         LOCATION_JSON: ('Keep', 'Cavern', 'Tavern', 'Forest', 'Temple', 'Harbor', 'Crypt', 'Tower', 'Bridge', 'Market')}
+WORDS = ('dark', 'old', 'smells', 'of', 'smoke', 'glows', 'faintly', 'guarded', 'by', 'ancient', 'runes', 'the', 'party',
+         'found', 'near', 'river', 'heavy', 'cold', 'to', 'touch')
+
+# writes inventory/enemies/locations .json files with records records in total into directory, returns {fileName: count}
+def generateCampaign(directory, records, seed = 0):
+    rand = random.Random(seed)
+    counts = {}
+    for fileName, share in CAMPAIGN_SHARES.items():
+        count = int(records * share)
+        rows = [_record(rand, fileName, index) for index in range(count)]
+        with open(os.path.join(directory, fileName), 'w') as jsonFile:
+            json.dump(rows, jsonFile, indent = 2)
+        counts[fileName] = count
+    return counts
+
+# the name of record index of fileName, so benchmarks can pick names that exist
+def recordName(fileName, index):
+    nouns = NOUNS[fileName]
+    return f'{ADJECTIVES[index % len(ADJECTIVES)]} {nouns[index // len(ADJECTIVES) % len(nouns)]} {index}'
+
+def _record(rand, fileName, index):
+    record = {'name': recordName(fileName, index), 'desc': ' '.join(rand.choice(WORDS) for x in range(rand.randint(4, 12)))}
+    if fileName == INVENTORY_JSON:
+        record['count'] = rand.randint(1, 20)
+        record['activeOrPassive'] = rand.choice(('Active', 'Passive'))
+        record['key'] = 'Key' if rand.random() < 0.05 else 'Not Key'
+    elif fileName == ENEMY_JSON:
+        record['stats'] = {field: rand.randint(1, 300 if field == 'health' else 30) for field in STAT_FIELDS}
+    return record
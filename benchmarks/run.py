@@ -0,0 +1,188 @@
+'''
+Scribble benchmarks - times the campaign operations on synthetic campaigns, headless
+
+    python -m benchmarks.run --sizes 1000,10000,100000
+    python -m benchmarks.run --sizes 1000,10000 --output new.json --baseline bench_results.json
+
+Every size gets a fresh campaign in a temporary directory. For each operation the latency percentiles of --repeat
+(heavy file operations) or --ops (everything else) calls are reported, plus the peak memory of one more call.
+Results are saved as JSON; with --baseline, operations whose median got slower than --tolerance allows are listed and
+the run exits with status 1.
+'''
+import argparse # parse the command line
+import contextlib # keep the logic functions' prints out of the report
+import io # where those prints go instead
+import json # results files
+import os # work inside the temporary campaign directory
+import platform # describe the machine in the results
+import random # which records the operations touch
+import sys # exit status
+import tempfile # a fresh directory per campaign size
+import time # timers
+import tracemalloc # peak memory
+
+from scribblecore import (INVENTORY_JSON, ENEMY_JSON, LOCATION_JSON, DICE, loadConfig, loadJsonFile, saveToJson, openCampaign,
+                          closeCampaign, findRecords, suggestNames, invMenuAddLogic, invMenuRemoveLogic, distribution)
+from .campaign import CAMPAIGN_SHARES, generateCampaign, recordName
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_OUTPUT = 'bench_results.json'
+PERCENTILES = (50, 90, 99)
+REGRESSION_FLOOR_MS = 0.05 # medians closer than this are timer noise, never a regression
+
+# times function(index) for index in range(count), returns the latencies in milliseconds
+def timeCalls(function, count):
+    samples = []
+    for index in range(count):
+        start = time.perf_counter_ns()
+        function(index)
+        samples.append((time.perf_counter_ns() - start) / 1e6)
+    return samples
+
+# peak memory in KB allocated while function(index) runs once
+def peakMemory(function, index):
+    tracemalloc.start()
+    try:
+        function(index)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+# {'samples', 'mean_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'peak_kb'} for one operation
+def measure(function, count):
+    samples = timeCalls(function, count)
+    ordered = sorted(samples)
+    stats = {'samples': len(samples), 'mean_ms': sum(samples) / len(samples)}
+    for percentile in PERCENTILES:
+        stats[f'p{percentile}_ms'] = ordered[min(len(ordered) - 1, max(0, -(-percentile * len(ordered) // 100) - 1))]
+    stats['max_ms'] = ordered[-1]
+    stats['peak_kb'] = peakMemory(function, count)
+    return stats
+
+# stats of an operation that only happens once per campaign, like opening it
+def singleSample(milliseconds):
+    stats = {'samples': 1, 'mean_ms': milliseconds}
+    stats.update({f'p{percentile}_ms': milliseconds for percentile in PERCENTILES})
+    stats.update({'max_ms': milliseconds, 'peak_kb': None})
+    return stats
+
+# the operations timed on a campaign of size records, as {name: (function(index), heavy)}
+def campaignOperations(size, seed):
+    rand = random.Random(seed)
+    counts = {fileName: int(size * share) for fileName, share in CAMPAIGN_SHARES.items()}
+    enemies = loadJsonFile(ENEMY_JSON)
+    def existing(fileName):
+        return recordName(fileName, rand.randrange(counts[fileName]))
+    def itemValues(name, count):
+        return {'-Item Name-': name, '-Item Desc-': 'benchmark item', '-Item Count-': str(count), '-Item Passive-': False, '-Item Key-': False}
+    return {
+        'loadJsonFile': (lambda index: loadJsonFile(ENEMY_JSON), True),
+        'saveToJson': (lambda index: saveToJson(enemies, 'bench_save.json'), True),
+        'search': (lambda index: findRecords(existing(rand.choice((INVENTORY_JSON, ENEMY_JSON, LOCATION_JSON)))), False),
+        'search miss': (lambda index: findRecords(f'nothing called this {index}'), False),
+        'query': (lambda index: findRecords('enemies where dexterity >= 14 and health < 50 order by strength desc limit 20'), False),
+        'suggest': (lambda index: suggestNames(existing(ENEMY_JSON)[:4 + index % 6]), False),
+        'inventory add new': (lambda index: invMenuAddLogic(itemValues(f'Benchmark Item {index}', 1)), False),
+        'inventory add existing': (lambda index: invMenuAddLogic(itemValues(existing(INVENTORY_JSON), 1)), False),
+        'inventory remove': (lambda index: invMenuRemoveLogic(itemValues(existing(INVENTORY_JSON), 1)), False),
+    }
+
+def diceOperations():
+    return {
+        'roll 4d6kh3+2': (lambda index: DICE.roll('4d6kh3+2'), False),
+        'rollMany 8d6 x10000': (lambda index: DICE.rollMany('8d6', 10000), False),
+        'distribution NdS (uncached)': (lambda index: distribution(f'{index % 50 + 1}d{index // 50 % 20 + 2}'), False),
+    }
+
+# runs every operation, printing one line each; returns {name: stats}
+def runOperations(operations, repeat, ops):
+    results = {}
+    for name, (function, heavy) in operations.items():
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = measure(function, repeat if heavy else ops)
+        results[name] = stats
+        print(f'  {name:28} p50 {stats["p50_ms"]:9.3f} ms  p90 {stats["p90_ms"]:9.3f} ms  p99 {stats["p99_ms"]:9.3f} ms  '
+              f'peak {stats["peak_kb"]:10.1f} KB')
+    return results
+
+# generates a campaign of size records in a temporary directory and times it; returns {name: stats}
+def benchmarkCampaign(size, backend, repeat, ops, seed):
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix = 'scribble-bench-') as directory:
+        os.chdir(directory)
+        try:
+            generateCampaign(directory, size, seed)
+            config = loadConfig()
+            if not config.has_section('Storage'):
+                config.add_section('Storage')
+            config.set('Storage', 'backend', backend)
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter_ns()
+                openCampaign(config)
+                findRecords(recordName(ENEMY_JSON, 0)) # loads every database and builds the search index
+                opened = (time.perf_counter_ns() - start) / 1e6
+            print(f'  {"open + first search":28} {opened:13.3f} ms')
+            results = {'open + first search': singleSample(opened)}
+            results.update(runOperations(campaignOperations(size, seed), repeat, ops))
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter_ns()
+                closeCampaign() # writes everything the add/remove operations changed
+                closed = (time.perf_counter_ns() - start) / 1e6
+            print(f'  {"close (final save)":28} {closed:13.3f} ms')
+            results['close (final save)'] = singleSample(closed)
+            return results
+        finally:
+            closeCampaign()
+            os.chdir(cwd)
+
+# [(group, operation, baseline p50, current p50)] for operations whose median got slower than tolerance allows
+def findRegressions(baseline, current, tolerance):
+    regressions = []
+    for group, operations in current['results'].items():
+        for name, stats in operations.items():
+            before = baseline.get('results', {}).get(group, {}).get(name)
+            if before is None or stats['p50_ms'] - before['p50_ms'] < REGRESSION_FLOOR_MS:
+                continue
+            if stats['p50_ms'] > before['p50_ms'] * (1 + tolerance):
+                regressions.append((group, name, before['p50_ms'], stats['p50_ms']))
+    return regressions
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = 'python -m benchmarks.run', description = 'Scribble benchmarks')
+    parser.add_argument('--sizes', default = ','.join(str(size) for size in DEFAULT_SIZES),
+                        help = 'comma separated campaign sizes in records, e.g. 1000,10000,1000000')
+    parser.add_argument('--backend', default = 'json', choices = ('json', 'journal', 'sqlite'))
+    parser.add_argument('--repeat', type = int, default = 10, help = 'calls per heavy file operation (load, save)')
+    parser.add_argument('--ops', type = int, default = 500, help = 'calls per other operation')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--output', default = DEFAULT_OUTPUT, help = f'results file (default {DEFAULT_OUTPUT})')
+    parser.add_argument('--baseline', help = 'results file of an earlier run to compare against')
+    parser.add_argument('--tolerance', type = float, default = 0.2, help = 'allowed median slowdown against the baseline, 0.2 is 20%%')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    current = {'meta': {'python': platform.python_version(), 'platform': platform.platform(), 'processor': platform.processor(),
+                        'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'backend': args.backend, 'sizes': sizes,
+                        'repeat': args.repeat, 'ops': args.ops, 'seed': args.seed},
+               'results': {}}
+    print('dice')
+    current['results']['dice'] = runOperations(diceOperations(), args.repeat, args.ops)
+    for size in sizes:
+        print(f'{size} records ({args.backend})')
+        current['results'][str(size)] = benchmarkCampaign(size, args.backend, args.repeat, args.ops, args.seed)
+    with open(args.output, 'w') as resultsFile:
+        json.dump(current, resultsFile, indent = 2)
+    print(f'Saved results to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline, 'r') as baselineFile:
+            baseline = json.load(baselineFile)
+        regressions = findRegressions(baseline, current, args.tolerance)
+        for group, name, before, after in regressions:
+            print(f'REGRESSION {group} / {name}: p50 {before:.3f} ms -> {after:.3f} ms ({after / before - 1:+.0%})')
+        if regressions:
+            sys.exit(1)
+        print(f'No regressions against {args.baseline}')
+
+if __name__ == '__main__':
+    main()
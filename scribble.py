@@ -8,6 +8,9 @@ Features:
 - battleboard feature; visualize your fights with a tiled 2D grid you can place your character, allies, and enemies on
 - tallies how many deaths, beers consumed, and enemies slain during campaign!
 
+This file is the GUI; the data logic it calls lives in the 'scribblecore' package and never imports PySimpleGUI.
+Run with: python scribble.py
+
 Code Format (in order):
 - imports
 - global variables / constants
@@ -16,397 +19,591 @@ Code Format (in order):
 - public functions
 - while loop action logic function
 '''
-import PySimpleGUI as sg # library needed for graphical elements, website: https://www.pysimplegui.org/en/latest/
-import json # library needed for .json parsing and manipulation
-import configparser # library needed to parse the 'config.ini' file located in 'settings'
-import random # library needed for the randomness of a dice roller
-import os # interact with the file system and other operating system features
-import glob # search for files with a specific pattern
-
-CONFIG = 'config.ini'
-INVENTORY_JSON = 'inventory.json'
-ENEMY_JSON = 'enemies.json'
-LOCATION_JSON = 'locations.json'
+import sys # swap in a thread safe stdout once the Output element owns it
+import threading # tell the GUI thread apart from the background workers
+import time # how long each event takes, for the Diagnostics panel
+from scribblecore import (rollDice, DICE, distribution, formatDistribution, openCampaign, closeCampaign, invMenuAddLogic, invMenuRemoveLogic, enemiesMenuLogic,
+                          findResultsOrSuggest, suggestNames, printSearchResults, JobExecutor, INVENTORY_JSON, loadConfig,
+                          RESULT_COLUMNS, RESULT_PAGE_ROWS, Battleboard, WALL, FLOOR, DIFFICULT, FEET_PER_CELL, tallies,
+                          takeSnapshot, snapshotNames, undoLogic, redoLogic, snapshotTakeLogic, snapshotRestoreLogic)
+from scribblecore import instrument
+
+sg = None # PySimpleGUI, only imported once the GUI starts (see main) so importing this file stays headless
 THEME = 'Topanga'
-CURRENT_WINDOW = None
-
-class Item:
-    __name = None
-    __desc = None
-    __count = None # how many of this item you have
-    __activeOrPassive = None # is a consumable or a passive item
-    __key = None # cannot be removed from inventory
-
-    def __init__(self, values):
-        self.__name = values['-Item Name-']
-        self.__desc = values['-Item Desc-']
-        self.__count = int(values['-Item Count-'])
-        self.__activeOrPassive = self.activeOrPassive(values)
-        self.__key = self.keyOrNotKey(values)
-
-    def getName(self):
-        return self.__name
-    def getDesc(self):
-        return self.__desc
-    def getCount(self):
-        return self.__count
-    def getActiveOrPassive(self):
-        return self.__activeOrPassive
-    def getKey(self):
-        return self.__key
-
-    def setName(self, a):
-        self.__name = a
-    def setDesc(self, a):
-        self.__desc = a
-    def setCount(self, a):
-        self.__count = int(a)
-    def setActiveOrPassive(self, a):
-        self.__activeOrPassive = a
-    def setKey(self, a):
-        self.__key = a
-
-    # determine weither or not the item is active or passive
-    def activeOrPassive(self, values):
-        if bool(values['-Item Passive-']) == True:
-            return 'Passive'
-        else:
-            return 'Active'
-
-    # determine weither or not the item is permanant to your inv.
-    def keyOrNotKey(self, values):
-        if bool(values['-Item Key-']) == True:
-            return 'Key'
+CURRENT_WINDOW = 'Welcome' # the panel currently shown
+PANELS = {'Welcome': '-Panel Welcome-', 'Inventory': '-Panel Inventory-', 'Enemies': '-Panel Enemies-', 'Roller': '-Panel Roller-', 'Search': '-Panel Search-',
+          'Diagnostics': '-Panel Diagnostics-', 'Battleboard': '-Panel Battleboard-',
+          'Tallies': '-Panel Tallies-', 'Snapshots': '-Panel Snapshots-'}
+TALLY_LABELS = {'total_deaths': 'Deaths', 'beers_consumed': 'Beers', 'enemies_slain': 'Enemies slain'} # the counters with +1/-1 buttons
+TALLY_WINDOW = 3600 # seconds, the 'last hour' column of the Tallies panel
+DIAGNOSTICS_REFRESH_MS = 1000 # how often the Diagnostics panel redraws while it is shown
+JOBS = None # background workers for saving and searching, started in main
+BOARD_SIZE = (60, 40) # cells, from [Battleboard] in config.ini
+BOARD_CELL_PIXELS = 16
+BOARD_VIEW = None # the BattleboardView of the Battleboard panel, made in main
+RESULTS = None # (ResultCursor, index of its first row in the table) of the last search
+BOARD_TOOLS = ['Move', 'Wall', 'Difficult', 'Floor', 'Add Token', 'Remove Token', 'Measure', 'Sphere', 'Cube', 'Cone', 'Line']
+BOARD_TERRAIN = {'Wall': WALL, 'Difficult': DIFFICULT, 'Floor': FLOOR} # terrain painting tools
+BOARD_COLORS = {WALL: '#3b3b3b', DIFFICULT: '#8a7650', 'party': '#2e7dd7', 'ally': '#3aa655', 'enemy': '#c8382e', 'grid': '#5a5a5a',
+                'highlight': '#f2d22e'}
+PANEL_INPUTS = {'Inventory': ['-Item Name-', '-Item Desc-', '-Item Count-'], 'Enemies': ['-Enemy Name-', '-Enemy Desc-'],
+                'Roller': ['-Dice Numbers-', '-Dice Sides-', '-Dice Expression-'], 'Search': ['-Search-'],
+                'Snapshots': ['-Snapshot Name-']}
+SUGGESTED_INPUTS = {'-Search-': ('-Search Suggestions-', None), '-Item Name-': ('-Item Name Suggestions-', INVENTORY_JSON)} # input -> (its suggestion list, database the names come from)
+
+# ThreadSafePrinter - stdout while the window is open; prints from background jobs are handed to the
+# event loop as '-Print-' events, because only the GUI thread may touch the Output element
+class ThreadSafePrinter:
+    __stream = None
+    __window = None
+
+    def __init__(self, stream, window):
+        self.__stream = stream
+        self.__window = window
+
+    def write(self, text):
+        if threading.current_thread() is threading.main_thread():
+            self.__stream.write(text)
         else:
-            return 'Not Key'
-
-    # check if all variables have a value
-    def allFieldsFilled(self):
-        values = self.toDict()
-        for k in values.values():
-            if bool(k) == False:
-                return False
-        return True
-
-    # convert class data into dictionary and return
-    def toDict(self):
-        return {
-            'name': self.__name,
-            'desc': self.__desc,
-            'count': self.__count,
-            'activeOrPassive': self.__activeOrPassive,
-            'key': self.__key
-        }
-
-# Stats - data container for statistical information about your character, enemies, allies
-class Stats:
-    __hp = None
-    __str = None
-    __dex = None
-    __con = None
-    __int = None
-    __wis = None
-    __cha = None
-
-    def __init__(self, hp):
-        self.__hp = hp
-
-    # convert class data into dictionary and return
-    def toDict(self):
-        return {
-            'health': self.__hp,
-            'strength': self.__str,
-            'dexterity': self.__dex,
-            'constitution': self.__con,
-            'intelligence': self.__int,
-            'wisdom': self.__wis,
-            'charisma': self.__cha
-        }
-
-# Enemy - their stats, dropped items, equipment, name and description, and optional .PNG photo of enemy for battleboard
-class Enemy:
-    __name = None
-    __desc = None
-    __stats = None
-
-    def __init__(self, name, desc):
-        self.__name = name
-        self.__desc = desc
-
-    # convert class data into dictionary and return
-    def toDict(self):
-        return {
-            'name': self.__name,
-            'desc': self.__desc
-        }
-
-# takes a dictionary and string as input, saves data to fileName.json
-def saveToJson(info, fileName):
-    with open(fileName, 'w') as jsonFile:
-        json.dump(info, jsonFile, indent = 2)
-        print(f'Successfully entered info into {fileName}')
-
-# returns a dictionary containing all data from .json file
-def loadJsonFile(fileName):
-    try:
-        with open(fileName, 'r') as jsonFile:
-            # Attempt to load JSON data from the file
-            try:
-                dndItems = json.load(jsonFile)
-                if not isinstance(dndItems, list):
-                    dndItems = []
-                return dndItems
-            except json.decoder.JSONDecodeError:
-                print(f"Error decoding JSON from {fileName}. Returning an empty list.")
-                return []
-    except FileNotFoundError:
-        print(f"{fileName} not found. Creating a new file.")
-        with open(fileName, 'w') as jsonFile:
-            json.dump([], jsonFile)
-        return []
+            self.__window.write_event_value('-Print-', text)
+
+    def flush(self):
+        if threading.current_thread() is threading.main_thread():
+            self.__stream.flush()
+
+# BattleboardView - draws a Battleboard on an sg.Graph whose units are cells; only cells the board reports as dirty are redrawn,
+# so dragging a token or painting a wall touches a few figures instead of the whole map
+class BattleboardView:
+    __graph = None
+    __board = None
+    __figures = None # cell -> ids of the figures drawn for it (terrain, token)
+    __highlights = None # ids of the path or area outline shown on top
+    __pressed = None # cell the mouse went down on, while it is held
+
+    def __init__(self, graph, board):
+        self.__graph = graph
+        self.__board = board
+        self.__figures = {}
+        self.__highlights = []
+        for x in range(board.width + 1):
+            graph.draw_line((x, 0), (x, board.height), color = BOARD_COLORS['grid'])
+        for y in range(board.height + 1):
+            graph.draw_line((0, y), (board.width, y), color = BOARD_COLORS['grid'])
+        self.redraw()
+
+    def board(self):
+        return self.__board
+
+    # redraw the cells that changed since the last redraw
+    def redraw(self):
+        for cell in self.__board.takeDirty():
+            self.__drawCell(cell)
+
+    def __drawCell(self, cell):
+        for figure in self.__figures.pop(cell, ()):
+            self.__graph.delete_figure(figure)
+        x, y = cell
+        figures = []
+        terrain = self.__board.terrain(x, y)
+        if terrain != FLOOR:
+            figures.append(self.__graph.draw_rectangle((x, y), (x + 1, y + 1), fill_color = BOARD_COLORS[terrain], line_color = BOARD_COLORS['grid']))
+        token = self.__board.tokenAt(x, y)
+        if token is not None:
+            figures.append(self.__graph.draw_circle((x + 0.5, y + 0.5), 0.42, fill_color = BOARD_COLORS.get(token.side, 'white'), line_color = 'black'))
+            figures.append(self.__graph.draw_text(token.name[:2], (x + 0.5, y + 0.5), color = 'white', font = '_ 7'))
+        if figures:
+            self.__figures[cell] = figures
+
+    # outline cells on top of the board, replacing the previous outline
+    def highlight(self, cells):
+        self.clearHighlight()
+        for x, y in cells:
+            self.__highlights.append(self.__graph.draw_rectangle((x + 0.1, y + 0.1), (x + 0.9, y + 0.9), line_color = BOARD_COLORS['highlight']))
+
+    def clearHighlight(self):
+        for figure in self.__highlights:
+            self.__graph.delete_figure(figure)
+        self.__highlights = []
+
+    # the mouse went down on, or was dragged to, cell; returns the cell it first went down on
+    def press(self, cell):
+        if self.__pressed is None:
+            self.__pressed = cell
+        return self.__pressed
+
+    # the mouse was let go; returns the cell it first went down on, or None
+    def release(self):
+        pressed, self.__pressed = self.__pressed, None
+        return pressed
 
 # formats the inventory add/remove display
 def createLayoutMenu():
-    return [[sg.Menu([['Add/Remove', ['Inventory', 'Enemies', 'Locations']], ['Search', ['Search']], ['Dice', ['Roller']], ['Settings', ['Edit Config']], ['Credits'], ['Quit', ['Quit']]])]]
+    return [[sg.Menu([['Add/Remove', ['Inventory', 'Enemies', 'Locations']], ['Edit', ['Undo', 'Redo', 'Snapshots']], ['Search', ['Search']], ['Dice', ['Roller']], ['Battle', ['Battleboard']], ['Tallies', ['Tallies']], ['Settings', ['Edit Config', 'Diagnostics']], ['Credits'], ['Quit', ['Quit']]])]]
 
 def createLayoutInv():
     return [[sg.Text('Add/Remove Item', font='_ 14')],
-            [sg.Text('Name:'), sg.Input(k = '-Item Name-', do_not_clear=False, s=(15,1))],
-            [sg.Text('Desc:'), sg.Input(k = '-Item Desc-', do_not_clear=False, s=(25,1))],
-            [sg.Text('Count:'), sg.Input(k = '-Item Count-', do_not_clear=False, s=(5,1))],
+            [sg.Text('Name:'), sg.Input(k = '-Item Name-', s=(15,1), enable_events=True),
+             sg.Listbox([], k = '-Item Name Suggestions-', s=(25,3), enable_events=True, no_scrollbar=True)],
+            [sg.Text('Desc:'), sg.Input(k = '-Item Desc-', s=(25,1))],
+            [sg.Text('Count:'), sg.Input(k = '-Item Count-', s=(5,1))],
             [sg.Radio('Active', 1, key='-Item Active-'), sg.Radio('Passive', 1, key='-Item Passive-')],
             [sg.Radio('Key', 2, key='-Item Key-'), sg.Radio('Not Key', 2, key='-Item NotKey-')]]
 
 # formats the enemy add/remove display
 def createLayoutEnemy():
     return [[sg.Text('Enemy')],
-            [sg.Text('Name:'), sg.Input(k = '-Enemy Name-', do_not_clear=False)],
-            [sg.Text('Desc:'), sg.Input(k = '-Enemy Desc-', do_not_clear=False)]]
+            [sg.Text('Name:'), sg.Input(k = '-Enemy Name-')],
+            [sg.Text('Desc:'), sg.Input(k = '-Enemy Desc-')]]
 
 # formats the dice rolling display
 def createLayoutDice():
     return [[sg.Text('Dice Roller', font='_ 14', justification='center', expand_x=True)],
-            [sg.Text('# of Dice'), sg.Input(k ='-Dice Numbers-', do_not_clear=False, s=(10,1)),
-             sg.Text('# of Sides'), sg.Input(k ='-Dice Sides-', do_not_clear=False, s=(10,1)), sg.Button('Roll')],
+            [sg.Text('# of Dice'), sg.Input(k ='-Dice Numbers-', s=(10,1)),
+             sg.Text('# of Sides'), sg.Input(k ='-Dice Sides-', s=(10,1)), sg.Button('Roll')],
+            [sg.Text('or Dice'), sg.Input(k ='-Dice Expression-', s=(20,1)), sg.Text('e.g. 4d6kh3+2, 2d20kl1, 3d6!, 2d6r2')],
+            [sg.Text('DC'), sg.Input(k ='-Dice DC-', s=(5,1)), sg.Button('Odds')],
             [sg.Text('Number Rolled - ') ,sg.Text(s=(20,1), key = '-Output-')]]
 
 def createLayoutSearch():
     return [[sg.Text('Search Database', font='_ 14', justification='center', expand_x=True)],
-            [sg.Text('Name:'), sg.Input(k='-Search-', do_not_clear=False, s=(20, 1))],
-            [sg.Output(s=(75,13))]]
-
-# formats the button layout
-def createLayoutButtons():
-    return [[sg.Button('Enter')]]
+            [sg.Text('Name:'), sg.Input(k='-Search-', s=(45, 1), enable_events=True),
+             sg.Listbox([], k='-Search Suggestions-', s=(25,3), enable_events=True, no_scrollbar=True)],
+            [sg.Text('or a query, e.g. enemies where dex >= 14 and hp < 50 order by str desc limit 20', font='_ 8')]]
+
+# search results, RESULT_PAGE_ROWS at a time; click a heading to sort by it, a row to print the whole record
+def createLayoutResults():
+    return [[sg.Table([], headings=list(RESULT_COLUMNS), k='-Results-', num_rows=6, col_widths=[12,18,6,6,40], auto_size_columns=False,
+                      justification='left', enable_click_events=True, expand_x=True)],
+            [sg.Button('< Prev', k='-Results Prev-'), sg.Button('Next >', k='-Results Next-'), sg.Text('', k='-Results Page-', s=(50,1))]]
+
+# timings and histograms of the instrumented operations, see scribblecore/instrument.py
+def createLayoutDiagnostics():
+    return [[sg.Text('Diagnostics', font='_ 14', justification='center', expand_x=True)],
+            [sg.Multiline(k='-Diagnostics Text-', s=(95,8), font='Courier 9', disabled=True)],
+            [sg.Button('Refresh', k='-Diag Refresh-'), sg.Button('Reset', k='-Diag Reset-'), sg.Button('Start Profile', k='-Diag Profile-')]]
+
+# battleboard: pick a tool, then click or drag on the grid; areas and Measure go from where you press to where you let go
+def createLayoutBoard():
+    width, height = BOARD_SIZE
+    graph = sg.Graph((width * BOARD_CELL_PIXELS, height * BOARD_CELL_PIXELS), (0, height), (width, 0), k='-Board-',
+                     background_color='#d9d4c7', enable_events=True, drag_submits=True)
+    return [[sg.Text('Tool'), sg.Combo(BOARD_TOOLS, default_value='Move', k='-Board Tool-', readonly=True, s=(12,1)),
+             sg.Text('Token'), sg.Input(k='-Board Token-', s=(14,1)), sg.Combo(['party', 'ally', 'enemy'], default_value='enemy', k='-Board Side-', readonly=True, s=(6,1)),
+             sg.Text('Area (ft)'), sg.Input('20', k='-Board Area-', s=(5,1))],
+            [sg.Column([[graph]], scrollable=True, s=(760,200))]]
+
+# campaign counters: one row per counter with its campaign, session and last hour totals
+def createLayoutTallies():
+    rows = [[sg.Text('Campaign Tallies', font='_ 14', justification='center', expand_x=True)]]
+    for name, label in TALLY_LABELS.items():
+        rows.append([sg.Text(label, s=(12,1)), sg.Button('+1', k=f'-Tally +{name}-'), sg.Button('-1', k=f'-Tally -{name}-'),
+                     sg.Text('', k=f'-Tally {name}-', s=(50,1))])
+    rows.append([sg.Button('New Session', k='-Tally Session-'), sg.Text('', k='-Tally Session Text-', s=(50,1))])
+    return rows
+
+# named versions of the campaign to go back to, e.g. the one taken when a session starts
+def createLayoutSnapshots():
+    return [[sg.Text('Snapshots', font='_ 14', justification='center', expand_x=True)],
+            [sg.Text('Name:'), sg.Input(k='-Snapshot Name-', s=(30,1)), sg.Button('Take Snapshot', k='-Snapshot Take-')],
+            [sg.Listbox([], k='-Snapshots-', s=(40,5)), sg.Button('Restore', k='-Snapshot Restore-')],
+            [sg.Text('', k='-Snapshot History-', s=(90,2))]]
+
+# formats the button layout, every panel's Enter button needs its own key now that they share a window
+def createLayoutButtons(key):
+    return [[sg.Button('Enter', k = key)]]
 
 def createLayoutInvButtons():
-    return [[sg.Button('Enter'), sg.Button('Remove')],
+    return [[sg.Button('Enter', k = '-Inv Enter-'), sg.Button('Remove')],
             [sg.Text('- Enter: Type JUST name and count to add more of this item to inv.')],
             [sg.Text('- Remove: Type JUST name and count, # for that amount, 0 to set 0, or -1 to completely remove')]]
 
-# return the created mainMenu window
+# wraps a panel's layout in a column the menu can show and hide, pin keeps its place in the window while hidden
+def createPanel(name, layout, visible = False):
+    return sg.pin(sg.Column(layout, key = PANELS[name], visible = visible))
+
+# return the one Scribble window: every panel is built here once, at startup, and the menu only shows and hides them
+@instrument.timed('create window')
 def makeMainMenuWindow():
     sg.theme(THEME) # set color palette / theme of application
     layout_final = [[createLayoutMenu()],
-                    [sg.Text('Welcome to Scribble!', font='_ 14', justification='c', expand_x=True)]]
-    return sg.Window('Scribble', layout_final, size=(800, 400))
-
-def makeInventoryWindow():
-    layout_final = [[createLayoutMenu()],
-                    [createLayoutInv()],
-                    [createLayoutInvButtons()]]
-    return sg.Window('Scribble', layout_final, size=(800,400))
-
-def makeEnemyWindow():
-    layout_final = [[createLayoutMenu()],
-                    [createLayoutEnemy()],
-                    [createLayoutButtons()]]
-    return sg.Window('Scribble', layout_final, size=(800,400))
-
-def makeDiceWindow():
-    layout_final = [[createLayoutMenu()],
-                    [createLayoutDice()]]
-    return sg.Window('Scribble', layout_final, size=(800,400))
-
-def makeSearchWindow():
-    layout_final = [[createLayoutMenu()],
-                    [createLayoutSearch()],
-                    [createLayoutButtons()]]
-    return sg.Window('Scribble', layout_final, size=(800,400))
-
-def search(find):
-    currentDirectory = os.getcwd() # the current directory the script is located in
-    jsonFiles = glob.glob(os.path.join(currentDirectory, '*.json')) # create list of all .json files in current directory
-    jsonNames = [os.path.basename(file) for file in jsonFiles] # create list of all .json file names
-
-    for jsonFile in jsonNames:
-        data = loadJsonFile(jsonFile)
-        for item in data:
-            if item['name'].lower() == find.lower():
-                return data
-    print('Search could not find item, does not exist?')
-    return []
-
-def invMenuAddLogic(values):
-    item = Item(values)  # Create item object
-    existingItems = search(item.getName())  # Search if item is pre-existing in database
-    existingItem = None  # Single item we are looking to edit
-
-    # Get the single item we are looking for in 'existingItems'
-    for x in existingItems:
-        if x['name'] == item.getName():
-            existingItem = x
-            break
-
-    if existingItem:
-        # If item already exists in the inventory, update its count
-        oldItemCount = int(existingItem['count'])
-        newCount = item.getCount()
-        existingItem['count'] = str(oldItemCount + newCount)  # Increase count by new count
-        saveToJson(existingItems, INVENTORY_JSON)
+                    [createPanel('Welcome', [[sg.Text('Welcome to Scribble!', font='_ 14', justification='c', expand_x=True)]], visible = True)],
+                    [createPanel('Inventory', createLayoutInv() + createLayoutInvButtons())],
+                    [createPanel('Enemies', createLayoutEnemy() + createLayoutButtons('-Enemy Enter-'))],
+                    [createPanel('Roller', createLayoutDice())],
+                    [createPanel('Search', createLayoutSearch() + createLayoutButtons('-Search Enter-') + createLayoutResults())],
+                    [createPanel('Diagnostics', createLayoutDiagnostics())],
+                    [createPanel('Battleboard', createLayoutBoard())],
+                    [createPanel('Tallies', createLayoutTallies())],
+                    [createPanel('Snapshots', createLayoutSnapshots())],
+                    [sg.Output(s=(75,8))], # shared by every panel, prints from the logic functions show up here
+                    [sg.Text('Ready', key='-Status-', s=(40,1))]] # how many saves/searches are still running
+    return sg.Window('Scribble', layout_final, size=(800,400), finalize=True)
+
+# hide the current panel and show the one picked from the menu, nothing is rebuilt
+def showPanel(window, name):
+    global CURRENT_WINDOW
+    if name == CURRENT_WINDOW:
+        return
+    window[PANELS[CURRENT_WINDOW]].update(visible = False)
+    window[PANELS[name]].update(visible = True)
+    CURRENT_WINDOW = name
+    if name == 'Diagnostics':
+        diagnosticsLogic(window)
+    elif name == 'Tallies':
+        updateTallies(window)
+    elif name == 'Snapshots':
+        updateSnapshots(window)
+
+# empty the text inputs of a panel after its form was submitted
+def clearInputs(window, name):
+    for key in PANEL_INPUTS.get(name, []):
+        window[key].update('')
+        if key in SUGGESTED_INPUTS:
+            window[SUGGESTED_INPUTS[key][0]].update(values = [])
+
+# refresh the suggestion list under an input after every keystroke
+def suggestionLogic(window, key, text):
+    listKey, fileName = SUGGESTED_INPUTS[key]
+    window[listKey].update(values = suggestNames(text, fileName))
+
+# a suggestion was clicked: put it in its input
+def pickSuggestionLogic(window, listKey, picked):
+    for key, (suggestionKey, fileName) in SUGGESTED_INPUTS.items():
+        if suggestionKey == listKey and picked:
+            window[key].update(picked[0])
+            window[listKey].update(values = [])
+
+# start the background workers: finished jobs come back to runApplication as '-Job Done-' events
+# and the store's write-behind saves run there too (repeated saves of one collection are coalesced)
+def startJobs(window):
+    global JOBS
+    JOBS = JobExecutor(lambda name, result, error: window.write_event_value('-Job Done-', (name, result, error)))
+    store = openCampaign()
+    store.setFlushScheduler(lambda fileName: JOBS.submit('save ' + fileName, store.flush, fileName, coalesce = True))
+    sys.stdout = ThreadSafePrinter(sys.stdout, window)
+
+# stop the background workers once the running jobs are done; a write-behind timer that runs out from now on
+# flushes on its own thread instead of handing the save to a pool that no longer takes jobs
+def stopJobs():
+    openCampaign().setFlushScheduler(None)
+    JOBS.shutdown()
+
+# show how many background jobs are still queued or running
+def updateStatus(window):
+    pending = JOBS.pending()
+    window['-Status-'].update(f'{pending} operation(s) pending...' if pending else 'Ready')
+
+# background job: search for find and fetch the first page of results
+def searchJob(find):
+    cursor, suggestions = findResultsOrSuggest(find)
+    return cursor, suggestions, 0, cursor.rows(0)
+
+# background job: fetch the page of cursor starting at start, sorted by column first if given
+def resultsPageJob(cursor, start, column = None, descending = False):
+    if column is not None:
+        cursor.sort(column, descending)
+    return cursor, start, cursor.rows(start)
+
+# a background job finished: show its result, or what went wrong
+def jobDoneLogic(window, name, result, error):
+    if error is not None:
+        print(f'{name} failed: {error}')
+    elif name == 'search':
+        cursor, suggestions, start, rows = result
+        showResults(window, cursor, start, rows)
+        if not rows:
+            printSearchResults([], suggestions)
+    elif name == 'results page' and RESULTS is not None and result[0] is RESULTS[0]: # not a page of an older search
+        showResults(window, *result)
+    elif name == 'dice odds':
+        printDiceOdds(*result)
+
+# put a page of search results in the table; a page past the last result only updates the count
+def showResults(window, cursor, start, rows):
+    global RESULTS
+    total = f'{cursor.count()}' if cursor.complete() else f'{cursor.count()}+'
+    column, descending = cursor.sortColumn()
+    order = f', by {column} {"descending" if descending else "ascending"}' if column is not None else ''
+    if rows or not start:
+        RESULTS = (cursor, start)
+        window['-Results-'].update(values = rows)
+        shown = len(rows)
+    else: # Next went past the last result, keep the page shown
+        start = RESULTS[1]
+        shown = min(RESULT_PAGE_ROWS, cursor.count() - start)
+    window['-Results Page-'].update(f'{start + 1}-{start + shown} of {total}{order}' if shown else 'No results')
+
+# Prev/Next, a click on a heading (sort by it, again to flip the order) or on a row (print the whole record)
+def resultsLogic(window, event):
+    if RESULTS is None:
+        return
+    cursor, start = RESULTS
+    if event == '-Results Prev-':
+        if start > 0:
+            JOBS.submit('results page', resultsPageJob, cursor, max(0, start - RESULT_PAGE_ROWS))
+    elif event == '-Results Next-':
+        if start + RESULT_PAGE_ROWS < cursor.count() or not cursor.complete():
+            JOBS.submit('results page', resultsPageJob, cursor, start + RESULT_PAGE_ROWS)
     else:
-        # If item is not found in the inventory, add it
-        if item.allFieldsFilled():
-            existingItems = loadJsonFile(INVENTORY_JSON)
-            existingItems.append(item.toDict())
-            saveToJson(existingItems, INVENTORY_JSON)
-            print("Successfully added item to inventory")
-        else:
-            print("You are missing fields in item")
-
-def invMenuRemoveLogic(values):
-    inputValue = values['-Item Name-'].strip()  # Get the name of the item to remove (trimmed)
-    count = int(values['-Item Count-'])  # Get the count of the item to remove
-    data = loadJsonFile(INVENTORY_JSON)  # Load inventory data from JSON
-    removed = False  # Flag to track if any item was removed
-
-    # Iterate over the list of items and remove the matching item based on name and count
-    for item in data:
-        if item['name'].strip().lower() == inputValue.lower():
-            itemCount = int(item['count'])
-            if count < 0:
-                # Complete removal from database if count is negative and item is not a key
-                if item['key'] == 'Key':
-                    print('Item is a key and cannot be removed completely.')
-                else:
-                    data.remove(item)
-                    removed = True
-            elif count > 0: # Decrease the count of the item by the specified amount
-                newCount = max(0, itemCount - count)
-                item['count'] = newCount
-                if newCount == 0:
-                    data.remove(item)
-                    removed = True
-                else:
-                    print(f'Successfully removed {count} of that item.')
-            else: # set equal to 0
-                newCount = 0
-                item['count'] = newCount
-                removed = True
-
-    if removed:
-        print('Successfully removed item(s).')
+        row, column = event[2]
+        if row == -1 and column is not None and 0 <= column < len(RESULT_COLUMNS):
+            current, descending = cursor.sortColumn()
+            JOBS.submit('results page', resultsPageJob, cursor, 0, RESULT_COLUMNS[column], current == RESULT_COLUMNS[column] and not descending)
+        elif row is not None and row >= 0:
+            found = cursor.result(start + row)
+            if found is not None:
+                printSearchResults([found])
+
+# a +1/-1 or New Session button of the Tallies panel was pressed; the counters are saved a few seconds later, in one go
+def tallyLogic(window, event):
+    counters = tallies()
+    if event == '-Tally Session-':
+        session = counters.startSession()
+        print(f'Session {session} started.')
+        try:
+            takeSnapshot(f'Session {session} start') # so the session can be rolled back from Edit > Snapshots
+        except ValueError:
+            pass # not kept while sharing a campaign
     else:
-        print('No matching item found or count is invalid.')
-
-    # Save the updated inventory data to the JSON file
-    saveToJson(data, INVENTORY_JSON)
-
-def enemiesMenuLogic(values):
-    enemy = Enemy(values['-Enemy Name-'], values['-Enemy Desc-'])
-
-    # if enemy fields have data, add them to json
-    if bool(values['-Enemy Name-']) == True and bool(values['-Enemy Desc-']) == True:
-        existingEnemies = loadJsonFile(ENEMY_JSON)
-        existingEnemies.append(enemy.toDict())
-        saveToJson(existingEnemies, ENEMY_JSON)
+        counters.increment(event[8:-1], 1 if event[7] == '+' else -1) # '-Tally +total_deaths-'
+    updateTallies(window)
+
+# show every counter's totals: whole campaign, this session and the last hour
+def updateTallies(window):
+    counters = tallies()
+    for name in TALLY_LABELS:
+        window[f'-Tally {name}-'].update(f'{counters.total(name)} in the campaign, {counters.sessionTotal(name)} this session, '
+                                         f'{counters.windowTotal(name, TALLY_WINDOW)} in the last hour')
+    window['-Tally Session Text-'].update(f'Session {counters.session()} of {counters.total("session_count")}')
+
+# list the snapshots and what Undo and Redo would do next
+def updateSnapshots(window):
+    window['-Snapshots-'].update(values = [name for name, taken in snapshotNames()])
+    undo, redo = openCampaign().history()
+    window['-Snapshot History-'].update(f'Undo: {undo[0] if undo else "nothing"} ({len(undo)} step(s))\n'
+                                        f'Redo: {redo[0] if redo else "nothing"} ({len(redo)} step(s))')
+
+# redraw the Diagnostics panel from the latest measurements
+def diagnosticsLogic(window):
+    window['-Diagnostics Text-'].update('\n'.join(instrument.formatDiagnostics()))
+
+# start a cProfile capture, or stop the running one and save it as a .pstats file
+def diagnosticsProfileLogic(window):
+    if instrument.profiling():
+        path = instrument.stopProfile()
+        print(f'Profile saved to {path}, view it with: python -m pstats {path}')
+        window['-Diag Profile-'].update('Start Profile')
     else:
-        print("You are missing fields in enemy")
+        instrument.startProfile()
+        print('Profiling... press Stop Profile to save it.')
+        window['-Diag Profile-'].update('Stop Profile')
+
+# mouse down or drag on the battleboard: paint terrain, or preview a move, measurement or area from the pressed cell
+def boardDragLogic(values):
+    if values['-Board-'] is None:
+        return
+    board = BOARD_VIEW.board()
+    cell = (int(values['-Board-'][0]), int(values['-Board-'][1]))
+    if not board.inside(*cell):
+        return
+    tool = values['-Board Tool-']
+    start = BOARD_VIEW.press(cell)
+    if tool in BOARD_TERRAIN:
+        board.setTerrain(*cell, BOARD_TERRAIN[tool])
+        BOARD_VIEW.redraw()
+    elif tool in ('Move', 'Measure') and start != cell:
+        mover = board.tokenAt(*start)
+        if tool == 'Move' and mover is None:
+            return
+        path = board.movementCost(start, cell, mover.side if mover is not None else None)
+        BOARD_VIEW.highlight(path[1] if path is not None else [])
+    elif tool in ('Sphere', 'Cube', 'Cone', 'Line') and (start != cell or tool in ('Sphere', 'Cube')):
+        area = boardAreaCells(board, tool, start, cell, values['-Board Area-'])
+        BOARD_VIEW.highlight(area if area is not None else [])
+
+# mouse let go on the battleboard: finish the move, measurement or area, or place/remove a token where it was clicked
+def boardReleaseLogic(values):
+    board = BOARD_VIEW.board()
+    start = BOARD_VIEW.release()
+    if start is None:
+        return
+    cell = (int(values['-Board-'][0]), int(values['-Board-'][1])) if values['-Board-'] is not None else start
+    tool = values['-Board Tool-']
+    mover = board.tokenAt(*start)
+    if tool == 'Add Token':
+        name = values['-Board Token-'].strip() or values['-Board Side-'].title()
+        if board.addToken(name, values['-Board Side-'], *start) is None:
+            print('Tokens need an empty cell without a wall.')
+    elif tool == 'Remove Token' and mover is not None:
+        board.removeToken(mover.id)
+    elif tool in ('Move', 'Measure') and start != cell:
+        path = board.movementCost(start, cell, mover.side if mover is not None else None)
+        if path is None:
+            print(f'No way from {start} to {cell}.')
+        else:
+            sight = 'in' if board.lineOfSight(start, cell) else 'out of'
+            if tool == 'Move' and mover is not None:
+                board.moveToken(mover.id, *cell)
+                print(f'{mover.name} moved {path[0] * FEET_PER_CELL} ft.')
+            else:
+                print(f'{path[0] * FEET_PER_CELL} ft of movement, {sight} line of sight.')
+    elif tool in ('Sphere', 'Cube', 'Cone', 'Line'):
+        area = boardAreaCells(board, tool, start, cell, values['-Board Area-'])
+        if area is not None:
+            hit = board.tokensIn(area)
+            print(f'{tool} covers {len(area)} cells' + (': ' + ', '.join(token.name for token in hit) if hit else ', no tokens') + '.')
+            BOARD_VIEW.highlight(area)
+            BOARD_VIEW.redraw()
+            return
+    BOARD_VIEW.clearHighlight()
+    BOARD_VIEW.redraw()
+
+# the cells of an area tool from start towards cell, the size typed in feet; None when it cannot be drawn
+def boardAreaCells(board, tool, start, cell, feet):
+    if not feet.strip().isnumeric() or (tool in ('Cone', 'Line') and start == cell):
+        return None
+    return board.areaOfEffect(tool.lower(), start, max(1, int(feet) // FEET_PER_CELL), cell if cell != start else None)
 
 def diceMenuLogic(window, values):
-    if(str(values['-Dice Sides-']).isnumeric() == False or str(values['-Dice Numbers-']).isnumeric() == False):
+    if values['-Dice Expression-'].strip():
+        try:
+            result = DICE.roll(values['-Dice Expression-'])
+        except ValueError as e:
+            print(e)
+            window['-Output-'].update(" ")
+            return
+        print(result.describe())
+        window['-Output-'].update(str(result.total) + (' - CRIT!' if result.crit else ''))
+    elif(str(values['-Dice Sides-']).isnumeric() == False or str(values['-Dice Numbers-']).isnumeric() == False):
         print("Please enter Numbers.")
         window['-Output-'].update(" ")
     else:
-        sides = int(values['-Dice Sides-'])
-        numOfDie = int(values['-Dice Numbers-'])
-        finalValue = 0
-        for x in range(0, numOfDie):
-            numberRolled = random.randrange(1, sides+1)
-            finalValue = finalValue + numberRolled
-        if numberRolled == sides and sides == 20:
+        try:
+            finalValue, crit = rollDice(int(values['-Dice Numbers-']), int(values['-Dice Sides-']))
+        except ValueError as e:
+            print(e)
+            window['-Output-'].update(" ")
+            return
+        if crit:
             window['-Output-'].update(str(finalValue) + ' - CRIT!')
         else:
             window['-Output-'].update(finalValue)
 
-def searchMenuInventoryLogic(values):
-    input_value = values['-Search-'].lower()  # Convert input to lowercase
-    inventory_items = loadJsonFile(INVENTORY_JSON) # Load inventory data from JSON
-    matching_items = [] # Create a list to store matching items
-
-    # Iterate over inventory items and check if the input matches item names
-    for item in inventory_items:
-        if item['name'].lower() == input_value:
-            matching_items.append(item)
-
-    # Display matching items or inform user if no match is found
-    if matching_items:
-        for item in matching_items:
-            print(f"Item Name: {item['name']}")
-            print(f"Description: {item['desc']}")
-            print(f"Count: {item['count']}")
-            print(f"Active/Passive: {item['activeOrPassive']}")
-            print(f"Key/Not Key: {item['key']}")
-            print('-' * 30)
-    else:
-        print('Item not found in database')
+# works out the odds of the dice in the Roller panel on a background job, printed by printDiceOdds when it is done
+def diceOddsLogic(values):
+    expression = values['-Dice Expression-'].strip() or f"{values['-Dice Numbers-'].strip()}d{values['-Dice Sides-'].strip()}"
+    dc = int(values['-Dice DC-']) if values['-Dice DC-'].strip().lstrip('-').isnumeric() else None
+    JOBS.submit('dice odds', diceOddsJob, expression, dc)
+
+# background job: the distribution of expression, with the expression and DC to print it with
+def diceOddsJob(expression, dc):
+    return expression, dc, distribution(expression)
+
+# prints the odds of the dice, and the chance to meet the DC if one is given
+def printDiceOdds(expression, dc, dist):
+    print(f'{expression}: mean {dist.mean():.2f}, variance {dist.variance():.2f}, std dev {dist.stdev():.2f}'
+          + ('' if dist.exact else ' (approximate, too many dice to work out exactly)'))
+    if dc is not None:
+        print(f'Chance to meet DC {dc}: {dist.chanceAtLeast(dc) * 100:.2f}%')
+    for line in formatDistribution(dist):
+        print(line)
 
 # all program logic
 def runApplication(window):
     while True:
-        event, values = window.read() # when program is interacted with, capture that action as a variable
+        # when program is interacted with, capture that action as a variable; the Diagnostics panel also redraws on a timer
+        event, values = window.read(timeout = DIAGNOSTICS_REFRESH_MS if CURRENT_WINDOW == 'Diagnostics' else None)
 
         # if 'X' button is pressed, close program and break from while loop
         if event == sg.WIN_CLOSED or event == 'Quit':
             break
+        if event == sg.TIMEOUT_EVENT:
+            diagnosticsLogic(window)
+            continue
+        start = time.perf_counter()
 
-        # if 'Inventory' is selected in the Menu
-        if event == 'Inventory':
-            window.close()
-            window = makeInventoryWindow()
-            CURRENT_WINDOW = 'Inventory'
-
-        # if 'Enemy' is selected in the Menu
-        if event == 'Enemies':
-            window.close()
-            window = makeEnemyWindow()
-            CURRENT_WINDOW = 'Enemies'
-
-        # if 'Dice -> Roller' is selected in the Menu
-        if event == 'Roller':
-            window.close()
-            window = makeDiceWindow()
-            CURRENT_WINDOW = 'Roller'
-
-        # if 'Search -> Find' is selected in the Menu
-        if event == 'Search':
-            window.close()
-            window = makeSearchWindow()
-            CURRENT_WINDOW = 'Search'
-
-        # logic for each window: Inventory, Enemies
-        if event == 'Enter' and CURRENT_WINDOW == 'Inventory':
+        # if 'Inventory', 'Enemies', 'Dice -> Roller' or 'Search -> Find' is selected in the Menu
+        if event in PANELS:
+            showPanel(window, event)
+
+        # logic for each panel: Inventory, Enemies, Roller, Search
+        if event == '-Inv Enter-':
             invMenuAddLogic(values)
-        elif event == 'Enter' and CURRENT_WINDOW == 'Enemies':
+            clearInputs(window, 'Inventory')
+        elif event == '-Enemy Enter-':
             enemiesMenuLogic(values)
-        elif event == 'Roll' and CURRENT_WINDOW == 'Roller': #Large piece for rolling, took a lot more lines than I thought
+            clearInputs(window, 'Enemies')
+        elif event == 'Roll': #Large piece for rolling, took a lot more lines than I thought
             diceMenuLogic(window, values)
-        elif event == 'Enter' and CURRENT_WINDOW == 'Search':
-            searchMenuInventoryLogic(values)
+            clearInputs(window, 'Roller')
+        elif event == 'Odds':
+            diceOddsLogic(values)
+        elif event == '-Search Enter-':
+            JOBS.submit('search', searchJob, values['-Search-']) # results come back as a '-Job Done-' event
+            clearInputs(window, 'Search')
         elif event == 'Remove':
             invMenuRemoveLogic(values)
-
-
-window = makeMainMenuWindow() # create the first initial window
-runApplication(window) # start running program logic
-window.close() # when the while loop in `runApplication` is broken, close the application
+            clearInputs(window, 'Inventory')
+        elif event in SUGGESTED_INPUTS:
+            suggestionLogic(window, event, values[event])
+        elif event in ('-Search Suggestions-', '-Item Name Suggestions-'):
+            pickSuggestionLogic(window, event, values[event])
+        elif event == '-Job Done-':
+            jobDoneLogic(window, *values[event])
+        elif event == '-Print-':
+            print(values[event], end='')
+        elif event in ('-Results Prev-', '-Results Next-') or (isinstance(event, tuple) and event[0] == '-Results-'):
+            resultsLogic(window, event)
+        elif str(event).startswith('-Tally '):
+            tallyLogic(window, event)
+        elif event == '-Board-':
+            boardDragLogic(values)
+        elif event == '-Board-+UP':
+            boardReleaseLogic(values)
+        elif event == '-Diag Refresh-':
+            diagnosticsLogic(window)
+        elif event == '-Diag Reset-':
+            instrument.reset()
+            diagnosticsLogic(window)
+        elif event in ('Undo', 'Redo'):
+            if event == 'Undo':
+                undoLogic()
+            else:
+                redoLogic()
+            if CURRENT_WINDOW == 'Snapshots':
+                updateSnapshots(window)
+        elif event == '-Snapshot Take-':
+            snapshotTakeLogic(values)
+            clearInputs(window, 'Snapshots')
+            updateSnapshots(window)
+        elif event == '-Snapshot Restore-':
+            snapshotRestoreLogic(values)
+            updateSnapshots(window)
+        elif event == '-Diag Profile-':
+            diagnosticsProfileLogic(window)
+
+        updateStatus(window)
+        instrument.record('event ' + str(event[0] if isinstance(event, tuple) else event), (time.perf_counter() - start) * 1000)
+
+# start the GUI: PySimpleGUI (and with it Tk) is imported here, not when the module is imported
+def main():
+    global sg, BOARD_SIZE, BOARD_CELL_PIXELS, BOARD_VIEW
+    import PySimpleGUI as sg # library needed for graphical elements, website: https://www.pysimplegui.org/en/latest/
+    openCampaign() # load settings and open the databases in the current directory
+    config = loadConfig()
+    BOARD_SIZE = (config.getint('Battleboard', 'width', fallback = BOARD_SIZE[0]), config.getint('Battleboard', 'height', fallback = BOARD_SIZE[1]))
+    BOARD_CELL_PIXELS = config.getint('Battleboard', 'cell_pixels', fallback = BOARD_CELL_PIXELS)
+    stdout = sys.stdout
+    window = makeMainMenuWindow() # create the first initial window
+    BOARD_VIEW = BattleboardView(window['-Board-'], Battleboard(*BOARD_SIZE))
+    startJobs(window)
+    runApplication(window) # start running program logic
+    if instrument.profiling():
+        print(f'Profile saved to {instrument.stopProfile()}')
+    stopJobs() # let running saves finish while the window can still receive their events
+    window.close() # when the while loop in `runApplication` is broken, close the application
+    sys.stdout = stdout
+    closeCampaign() # write any unsaved changes back to the databases
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+'''
+Scribble core - everything Scribble does with campaign data, without any GUI
+
+Import this from scripts, tests and benchmarks; the GUI lives in scribble.py and is the only place PySimpleGUI is loaded.
+'''
+from .config import CONFIG, CONFIG_PATH, INVENTORY_JSON, ENEMY_JSON, LOCATION_JSON, loadConfig
+from .instrument import timed, formatDiagnostics, startProfile, stopProfile, profiling
+from .models import STAT_FIELDS, Item, Stats, Enemy
+from .persistent import PersistentMap, CollectionVersion
+from .storage import (StorageBackend, JsonBackend, JournalBackend, SqliteBackend, CampaignStore,
+                      normalizeName, saveToJson, loadJsonFile, makeBackend, migrateJsonToSqlite)
+from .stream import iterJsonArray, streamSearch, findFilter, exportRecords
+from .search import SearchIndex
+from .results import RESULT_COLUMNS, RESULT_PAGE_ROWS, ResultCursor, formatRow
+from .columns import MISSING, RecordColumns, ColumnCache, loadColumns
+from .query import QueryEngine, ColumnIndex, isQuery
+from .suggest import NameSuggester
+from .dice import DiceGroup, DiceExpression, RollResult, DiceRoller, DICE, parseDice, rollDice
+from .probability import Distribution, distribution, formatDistribution
+from .jobs import JobExecutor
+from .importer import ImportReport, importFile, mapRecord
+from .battleboard import WALL, FLOOR, DIFFICULT, FEET_PER_CELL, Token, SpatialHash, Battleboard
+from .encounter import PARTY_JSON, Combatant, EncounterReport, findCombatants, simulateEncounter
+from .tally import TALLY_COUNTERS, TallyCounters
+from .logic import (openCampaign, closeCampaign, tallies, isStreamed, findRecords, search, findRecordsOrSuggest, findResults, findResultsOrSuggest,
+                    suggestNames, printSuggestions, printSearchResults, invMenuAddLogic, invMenuRemoveLogic, enemiesMenuLogic, searchMenuInventoryLogic,
+                    takeSnapshot, restoreSnapshot, snapshotNames, undoLogic, redoLogic, snapshotTakeLogic, snapshotRestoreLogic)
+
+# names of modules that are slow to import (sync pulls in asyncio), imported the first time one of them is used
+LAZY_NAMES = {name: 'sync' for name in ('SYNC_HOST', 'SYNC_PORT', 'SyncServer', 'RemoteStore', 'serve')}
+
+# called for names not set above: import their module and keep the name, so this runs once per name
+def __getattr__(name):
+    if name not in LAZY_NAMES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    import importlib
+    value = getattr(importlib.import_module('.' + LAZY_NAMES[name], __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,87 @@
+'''
+Scribble command line - campaign chores that are too big for the forms
+
+    python -m scribblecore import monsters.csv --into enemies.json
+    python -m scribblecore import items.jsonl --into inventory.json --replace
+    python -m scribblecore export compendium.json dragons.jsonl --find dragon --limit 100
+    python -m scribblecore simulate --party Aria Borin --enemies "Goblin x4" "Goblin Boss" --trials 20000
+    python -m scribblecore serve --port 8765
+'''
+import argparse # parse the command line
+import sys # progress goes to stderr so the output can be piped
+
+from .config import ENEMY_JSON, loadConfig
+from .storage import CampaignStore, makeBackend
+from .logic import openCampaign, closeCampaign
+from .importer import importFile
+from .stream import exportRecords, findFilter
+from .sync import SYNC_HOST, SYNC_PORT, serve
+from .encounter import PARTY_FILES, ENEMY_FILES, SIMULATION_TRIALS, findCombatants, simulateEncounter
+
+# progress line that rewrites itself, e.g. 'enemies.json: 45% - Read 50000 records: ...'
+def printProgress(fileName, report, fraction):
+    done = f'{fraction * 100:3.0f}%' if fraction is not None else '...'
+    print(f'\r{fileName}: {done} - {report}', end = '', file = sys.stderr, flush = True)
+
+def importCommand(args):
+    store = openCampaign()
+    try:
+        report = importFile(store, args.path, args.into, args.format, args.replace, args.workers,
+                            lambda report, fraction: printProgress(args.into, report, fraction))
+    finally:
+        closeCampaign()
+    print(file = sys.stderr)
+    print(report)
+
+def exportCommand(args):
+    keep = findFilter(args.find) if args.find else None
+    print(f'Exported {exportRecords(args.source, args.destination, keep, args.limit)} records to {args.destination}')
+
+def simulateCommand(args):
+    store = openCampaign()
+    try:
+        party = findCombatants(store, args.party, PARTY_FILES)
+        enemies = findCombatants(store, args.enemies, ENEMY_FILES)
+    finally:
+        closeCampaign()
+    print(simulateEncounter(party, enemies, args.trials, args.workers, args.seed))
+
+# the server always opens the campaign itself, whatever [Sync] mode says
+def serveCommand(args):
+    serve(CampaignStore(makeBackend(loadConfig())), args.host, args.port)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = 'python -m scribblecore', description = 'Scribble campaign tools')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+    importer = commands.add_parser('import', help = 'add every record of a .csv, .jsonl or .json file to a database')
+    importer.add_argument('path')
+    importer.add_argument('--into', default = ENEMY_JSON, help = f'database to add the records to (default {ENEMY_JSON})')
+    importer.add_argument('--format', choices = ('csv', 'jsonl', 'json'), help = 'file format, guessed from the extension if left out')
+    importer.add_argument('--replace', action = 'store_true', help = 'overwrite records that already exist instead of skipping them')
+    importer.add_argument('--workers', type = int, help = 'worker processes (default: one per processor)')
+    importer.set_defaults(run = importCommand)
+    exporter = commands.add_parser('export', help = 'copy records of a .json database to a .json or .jsonl file, reading it record by record')
+    exporter.add_argument('source')
+    exporter.add_argument('destination')
+    exporter.add_argument('--find', help = 'only records whose name or description holds every one of these words')
+    exporter.add_argument('--limit', type = int, help = 'stop after this many records')
+    exporter.set_defaults(run = exportCommand)
+    simulator = commands.add_parser('simulate', help = 'fight an encounter many times and report how it tends to go')
+    simulator.add_argument('--party', nargs = '+', required = True, help = 'names from party.json or enemies.json, "Name x2" for two')
+    simulator.add_argument('--enemies', nargs = '+', required = True, help = 'names from enemies.json, "Goblin x4" for four')
+    simulator.add_argument('--trials', type = int, default = SIMULATION_TRIALS, help = f'fights to run (default {SIMULATION_TRIALS})')
+    simulator.add_argument('--workers', type = int, help = 'worker processes (default: one per processor)')
+    simulator.add_argument('--seed', type = int, help = 'the same seed gives the same report')
+    simulator.set_defaults(run = simulateCommand)
+    server = commands.add_parser('serve', help = 'share the campaign in this folder with apps running in [Sync] mode = client')
+    server.add_argument('--host', default = SYNC_HOST, help = f'address to listen on (default {SYNC_HOST}, this machine only)')
+    server.add_argument('--port', type = int, default = SYNC_PORT, help = f'(default {SYNC_PORT})')
+    server.set_defaults(run = serveCommand)
+    args = parser.parse_args(argv)
+    try:
+        args.run(args)
+    except (OSError, ValueError) as e:
+        parser.exit(1, f'{e}\n')
+
+if __name__ == '__main__':
+    main()
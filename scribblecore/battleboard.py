@@ -0,0 +1,338 @@
+'''
+Scribble battleboard - the tiled grid a fight happens on: terrain, tokens, movement, sight and spell areas
+
+Cells are (x, y) with (0, 0) the top left corner, one cell is FEET_PER_CELL feet. Every cell has a terrain cost:
+WALL blocks movement and sight, FLOOR costs one move to enter and DIFFICULT two. Tokens sit one per cell and are kept
+in a SpatialHash, so finding the tokens in an area only looks at the buckets it overlaps.
+
+Movement (A*), line of sight and areas of effect are cached until the terrain (or, for movement, a token) changes.
+Every change marks the cells it touched as dirty; a renderer calls takeDirty() and only redraws those.
+'''
+import heapq # the A* open list
+import math # cone angles and sphere distances
+
+WALL = 0
+FLOOR = 1
+DIFFICULT = 2
+FEET_PER_CELL = 5
+SPATIAL_BUCKET_CELLS = 8 # a bucket of the spatial hash is this many cells wide and high
+QUERY_CACHE_SIZE = 1024 # results kept per cache (movement, sight, areas)
+CONE_HALF_ANGLE = math.atan(0.5) # a cone is as wide as it is long
+NEIGHBOURS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)) # diagonals cost the same, as in the PHB
+
+# Token - a character, ally or enemy on the board
+class Token:
+    __slots__ = ('id', 'name', 'side', 'x', 'y')
+
+    def __init__(self, tokenId, name, side, x, y):
+        self.id = tokenId
+        self.name = name
+        self.side = side # 'party', 'ally' or 'enemy'; tokens of another side block movement
+        self.x = x
+        self.y = y
+
+# SpatialHash - tokens bucketed by position, for 'which tokens are in this rectangle' without looking at every token
+class SpatialHash:
+    __buckets = None # (bucket x, bucket y) -> {token id: Token}
+    __bucketCells = None
+
+    def __init__(self, bucketCells = SPATIAL_BUCKET_CELLS):
+        self.__buckets = {}
+        self.__bucketCells = bucketCells
+
+    def __key(self, x, y):
+        return (x // self.__bucketCells, y // self.__bucketCells)
+
+    def add(self, token):
+        self.__buckets.setdefault(self.__key(token.x, token.y), {})[token.id] = token
+
+    def remove(self, token):
+        key = self.__key(token.x, token.y)
+        bucket = self.__buckets[key]
+        del bucket[token.id]
+        if not bucket:
+            del self.__buckets[key]
+
+    # the token in cell (x, y), or None
+    def at(self, x, y):
+        for token in self.__buckets.get(self.__key(x, y), {}).values():
+            if token.x == x and token.y == y:
+                return token
+        return None
+
+    # every token inside the rectangle, corners included
+    def query(self, left, top, right, bottom):
+        (bucketLeft, bucketTop), (bucketRight, bucketBottom) = self.__key(left, top), self.__key(right, bottom)
+        found = []
+        for bucketX in range(bucketLeft, bucketRight + 1):
+            for bucketY in range(bucketTop, bucketBottom + 1):
+                for token in self.__buckets.get((bucketX, bucketY), {}).values():
+                    if left <= token.x <= right and top <= token.y <= bottom:
+                        found.append(token)
+        return found
+
+# Battleboard - terrain and tokens of one map, plus the cached movement, sight and area queries
+class Battleboard:
+    __terrain = None # bytearray, width * height terrain costs, row by row
+    __tokens = None # token id -> Token
+    __spatial = None
+    __nextId = 1
+    __dirty = None # cells changed since the last takeDirty
+    __terrainVersion = 0 # bumped on every terrain change, sight and areas depend only on this
+    __tokenVersion = 0 # bumped whenever a token is added, moved or removed
+    __pathCache = None
+    __sightCache = None
+    __areaCache = None
+    __regions = None # per cell the number of the walled-off region it is in, worked out again after terrain changes
+    __cacheVersions = None # (terrain version, token version) the caches were filled at
+    width = 0
+    height = 0
+
+    def __init__(self, width, height):
+        if width <= 0 or height <= 0:
+            raise ValueError('A battleboard needs at least one cell')
+        self.width = width
+        self.height = height
+        self.__terrain = bytearray([FLOOR]) * (width * height)
+        self.__tokens = {}
+        self.__spatial = SpatialHash()
+        self.__dirty = set()
+        self.__pathCache = {}
+        self.__sightCache = {}
+        self.__areaCache = {}
+        self.__cacheVersions = (0, 0)
+
+    def inside(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def terrain(self, x, y):
+        return self.__terrain[y * self.width + x]
+
+    # set the terrain cost of a cell: WALL, FLOOR or DIFFICULT
+    def setTerrain(self, x, y, cost):
+        if not self.inside(x, y):
+            return
+        if cost not in (WALL, FLOOR, DIFFICULT):
+            raise ValueError(f'Unknown terrain {cost}')
+        if cost == WALL and self.__spatial.at(x, y) is not None:
+            return # never wall a token in
+        if self.__terrain[y * self.width + x] != cost:
+            self.__terrain[y * self.width + x] = cost
+            self.__terrainVersion += 1
+            self.__dirty.add((x, y))
+
+    # put a new token on a free, open cell; returns it, or None when the cell cannot take it
+    def addToken(self, name, side, x, y):
+        if not self.inside(x, y) or self.terrain(x, y) == WALL or self.__spatial.at(x, y) is not None:
+            return None
+        token = Token(self.__nextId, name, side, x, y)
+        self.__nextId += 1
+        self.__tokens[token.id] = token
+        self.__spatial.add(token)
+        self.__tokenVersion += 1
+        self.__dirty.add((x, y))
+        return token
+
+    def removeToken(self, tokenId):
+        token = self.__tokens.pop(tokenId)
+        self.__spatial.remove(token)
+        self.__tokenVersion += 1
+        self.__dirty.add((token.x, token.y))
+
+    # move a token to a free, open cell (no pathing, see movementCost); returns False when it cannot go there
+    def moveToken(self, tokenId, x, y):
+        token = self.__tokens[tokenId]
+        if (token.x, token.y) == (x, y):
+            return True
+        if not self.inside(x, y) or self.terrain(x, y) == WALL or self.__spatial.at(x, y) is not None:
+            return False
+        self.__spatial.remove(token)
+        self.__dirty.add((token.x, token.y))
+        token.x, token.y = x, y
+        self.__spatial.add(token)
+        self.__dirty.add((x, y))
+        self.__tokenVersion += 1
+        return True
+
+    def token(self, tokenId):
+        return self.__tokens.get(tokenId)
+
+    def tokenAt(self, x, y):
+        return self.__spatial.at(x, y)
+
+    def tokens(self):
+        return list(self.__tokens.values())
+
+    # tokens on any of cells, looked up through the spatial hash over the cells' bounding box
+    def tokensIn(self, cells):
+        if not cells:
+            return []
+        xs = [x for x, y in cells]
+        ys = [y for x, y in cells]
+        return [token for token in self.__spatial.query(min(xs), min(ys), max(xs), max(ys)) if (token.x, token.y) in cells]
+
+    # the cells changed since the last call, for a renderer that only redraws those
+    def takeDirty(self):
+        dirty, self.__dirty = self.__dirty, set()
+        return dirty
+
+    # empty the caches when the board changed since they were filled; sight and areas only care about terrain
+    def __checkCaches(self):
+        versions = (self.__terrainVersion, self.__tokenVersion)
+        if versions != self.__cacheVersions:
+            self.__pathCache.clear()
+            if versions[0] != self.__cacheVersions[0]:
+                self.__sightCache.clear()
+                self.__areaCache.clear()
+                self.__regions = None
+            self.__cacheVersions = versions
+
+    def __remember(self, cache, key, value):
+        if len(cache) >= QUERY_CACHE_SIZE:
+            del cache[next(iter(cache))] # the oldest entry
+        cache[key] = value
+        return value
+
+    # (cost in moves, [cells from start to goal]) of the cheapest way there, or None if there is none
+    # side is the mover's side: tokens of other sides block, friends can be passed through but not stopped on
+    def movementCost(self, start, goal, side = None):
+        self.__checkCaches()
+        key = (start, goal, side)
+        if key not in self.__pathCache:
+            self.__remember(self.__pathCache, key, self.__aStar(start, goal, side))
+        return self.__pathCache[key]
+
+    def __aStar(self, start, goal, side):
+        if not self.inside(*goal) or self.terrain(*goal) == WALL:
+            return None
+        occupant = self.__spatial.at(*goal)
+        if occupant is not None and goal != start:
+            return None
+        width, terrain, spatial = self.width, self.__terrain, self.__spatial
+        goalX, goalY = goal
+        best = {start: 0}
+        cameFrom = {}
+        if self.__region(start) != self.__region(goal):
+            return None # behind walls, no need to search the whole board to find that out
+        # ties go to the cell that has come furthest, otherwise open floor has many equally good cells to look at
+        openList = [(max(abs(goalX - start[0]), abs(goalY - start[1])), 0, start)]
+        while openList:
+            estimate, cost, cell = heapq.heappop(openList)
+            cost = -cost
+            if cell == goal:
+                path = [cell]
+                while cell in cameFrom:
+                    cell = cameFrom[cell]
+                    path.append(cell)
+                return cost, path[::-1]
+            if cost > best[cell]:
+                continue
+            x, y = cell
+            for stepX, stepY in NEIGHBOURS:
+                nextX, nextY = x + stepX, y + stepY
+                if not (0 <= nextX < self.width and 0 <= nextY < self.height):
+                    continue
+                step = terrain[nextY * width + nextX]
+                if step == WALL:
+                    continue
+                if stepX and stepY and (terrain[y * width + nextX] == WALL or terrain[nextY * width + x] == WALL):
+                    continue # no squeezing diagonally past a wall corner
+                blocker = spatial.at(nextX, nextY)
+                if blocker is not None and (side is None or blocker.side != side) and (nextX, nextY) != start:
+                    continue
+                nextCost = cost + step
+                if nextCost < best.get((nextX, nextY), nextCost + 1):
+                    best[(nextX, nextY)] = nextCost
+                    cameFrom[(nextX, nextY)] = cell
+                    heapq.heappush(openList, (nextCost + max(abs(goalX - nextX), abs(goalY - nextY)), -nextCost, (nextX, nextY)))
+        return None
+
+    # region number of a cell, cells in different regions can never reach each other whatever the tokens do
+    def __region(self, cell):
+        if self.__regions is None:
+            width, terrain = self.width, self.__terrain
+            regions = [0] * len(terrain)
+            region = 0
+            for first in range(len(terrain)):
+                if regions[first] or terrain[first] == WALL:
+                    continue
+                region += 1
+                regions[first] = region
+                stack = [first]
+                while stack:
+                    index = stack.pop()
+                    x = index % width
+                    # moving diagonally needs both straight neighbours open, so straight steps reach every region
+                    for neighbour in (index - width, index + width, index - 1 if x else -1, index + 1 if x + 1 < width else -1):
+                        if 0 <= neighbour < len(terrain) and not regions[neighbour] and terrain[neighbour] != WALL:
+                            regions[neighbour] = region
+                            stack.append(neighbour)
+            self.__regions = regions
+        return self.__regions[cell[1] * self.width + cell[0]]
+
+    # True when nothing but open cells lie between the centres of a and b (walls at either end do not count)
+    def lineOfSight(self, a, b):
+        self.__checkCaches()
+        key = (a, b) if a <= b else (b, a) # traced the same way in both directions, so sight is symmetric
+        if key not in self.__sightCache:
+            self.__remember(self.__sightCache, key, all(self.terrain(x, y) != WALL for x, y in _line(*key)[1:-1]))
+        return self.__sightCache[key]
+
+    # frozenset of the cells a spell covers, limited to cells the origin can see
+    # shape 'sphere' (size is the radius), 'cube' (size is the side, origin a corner), 'cone' and 'line' (size is the length,
+    # towards is the cell it points at); sizes are in cells, divide feet by FEET_PER_CELL
+    def areaOfEffect(self, shape, origin, size, towards = None):
+        self.__checkCaches()
+        key = (shape, origin, size, towards)
+        if key not in self.__areaCache:
+            cells = [cell for cell in self.__shapeCells(shape, origin, size, towards) if self.inside(*cell)]
+            visible = frozenset(cell for cell in cells if self.terrain(*cell) != WALL and (cell == origin or self.lineOfSight(origin, cell)))
+            self.__remember(self.__areaCache, key, visible)
+        return self.__areaCache[key]
+
+    def __shapeCells(self, shape, origin, size, towards):
+        originX, originY = origin
+        if shape == 'sphere':
+            return [(x, y) for x in range(originX - size, originX + size + 1) for y in range(originY - size, originY + size + 1)
+                    if math.hypot(x - originX, y - originY) <= size + 0.5]
+        if shape == 'cube':
+            stepX = -1 if towards is not None and towards[0] < originX else 1
+            stepY = -1 if towards is not None and towards[1] < originY else 1
+            return [(originX + stepX * x, originY + stepY * y) for x in range(size) for y in range(size)]
+        if towards is None or towards == origin:
+            raise ValueError(f'A {shape} needs a direction')
+        if shape == 'line':
+            distance = max(abs(towards[0] - originX), abs(towards[1] - originY))
+            end = (originX + round((towards[0] - originX) * size / distance), originY + round((towards[1] - originY) * size / distance))
+            return _line(origin, end)[1:]
+        if shape == 'cone':
+            direction = math.atan2(towards[1] - originY, towards[0] - originX)
+            cells = []
+            for x in range(originX - size, originX + size + 1):
+                for y in range(originY - size, originY + size + 1):
+                    if (x, y) == origin or math.hypot(x - originX, y - originY) > size + 0.5:
+                        continue
+                    angle = abs((math.atan2(y - originY, x - originX) - direction + math.pi) % (2 * math.pi) - math.pi)
+                    if angle <= CONE_HALF_ANGLE:
+                        cells.append((x, y))
+            return cells
+        raise ValueError(f'Unknown area shape "{shape}", use sphere, cube, cone or line')
+
+# the cells from a to b, both included (Bresenham)
+def _line(a, b):
+    (x, y), (endX, endY) = a, b
+    stepX = 1 if endX > x else -1
+    stepY = 1 if endY > y else -1
+    dx, dy = abs(endX - x), -abs(endY - y)
+    error = dx + dy
+    cells = [(x, y)]
+    while (x, y) != (endX, endY):
+        double = 2 * error
+        if double >= dy:
+            error += dy
+            x += stepX
+        if double <= dx:
+            error += dx
+            y += stepY
+        cells.append((x, y))
+    return cells
@@ -0,0 +1,287 @@
+'''
+Scribble columns - a whole collection stored column by column instead of as a list of dictionaries
+
+Numbers (count and the six Stats abilities plus health) live in typed arrays and repeated strings are interned,
+so filters, sums and averages run over flat arrays instead of looking into every record.
+A ColumnCache keeps the columns of the store's collections for the query engine and changes only the rows of records
+edited since. The store still holds its own records, so the columns come on top of them: they save time, not memory.
+'''
+import sys # sys.intern, one copy of every repeated string
+from array import array # typed number columns
+
+from .models import STAT_FIELDS
+from .storage import loadJsonFile
+
+TEXT_FIELDS = ('name', 'desc', 'activeOrPassive', 'key')
+NUMBER_FIELDS = ('count',) + STAT_FIELDS
+FIELDS = TEXT_FIELDS + NUMBER_FIELDS
+MISSING = -2 ** 63 # kept in a number column when the record has no usable value there
+
+# RecordColumns - column store for one collection; rows go in as database records and come back out as the same dictionaries
+class RecordColumns:
+    __texts = None # field -> list of (interned) strings
+    __numbers = None # field -> array('q')
+    __missing = None # field -> how many MISSING values the number column holds
+    __present = None # array('Q'), per row one bit per field in FIELDS: was the field in the record at all
+    __nested = None # bytearray, per row 1 if the stats were saved under 'stats' (enemies) instead of at the top level
+    __extras = None # row -> {field: value} for anything the columns do not cover, most rows have none
+    __length = 0
+
+    def __init__(self, records = ()):
+        self.__texts = {field: [] for field in TEXT_FIELDS}
+        self.__numbers = {field: array('q') for field in NUMBER_FIELDS}
+        self.__missing = {field: 0 for field in NUMBER_FIELDS}
+        self.__present = array('Q')
+        self.__nested = bytearray()
+        self.__extras = {}
+        self.extend(records)
+
+    def __len__(self):
+        return self.__length
+
+    # add one database record
+    def append(self, record):
+        texts, numbers, present, nested, extra = _split(record)
+        for field, value in zip(TEXT_FIELDS, texts):
+            self.__texts[field].append(value)
+        for field, number in zip(NUMBER_FIELDS, numbers):
+            self.__numbers[field].append(number)
+            self.__missing[field] += number == MISSING
+        if extra:
+            self.__extras[self.__length] = extra
+        self.__present.append(present)
+        self.__nested.append(nested)
+        self.__length += 1
+
+    # put record in row index instead of the record there now
+    def replace(self, index, record):
+        texts, numbers, present, nested, extra = _split(record)
+        for field, value in zip(TEXT_FIELDS, texts):
+            self.__texts[field][index] = value
+        for field, number in zip(NUMBER_FIELDS, numbers):
+            column = self.__numbers[field]
+            self.__missing[field] += (number == MISSING) - (column[index] == MISSING)
+            column[index] = number
+        if extra:
+            self.__extras[index] = extra
+        else:
+            self.__extras.pop(index, None)
+        self.__present[index] = present
+        self.__nested[index] = nested
+
+    # drop row index by moving the last row into its place, so no other row number changes
+    def remove(self, index):
+        last = self.__length - 1
+        for field, column in self.__texts.items():
+            column[index] = column[last]
+            column.pop()
+        for field, column in self.__numbers.items():
+            self.__missing[field] -= column[index] == MISSING
+            column[index] = column[last]
+            column.pop()
+        self.__extras.pop(index, None)
+        moved = self.__extras.pop(last, None)
+        if moved is not None and index != last:
+            self.__extras[index] = moved
+        self.__present[index] = self.__present[last]
+        self.__present.pop()
+        self.__nested[index] = self.__nested[last]
+        self.__nested.pop()
+        self.__length -= 1
+
+    def extend(self, records):
+        for record in records:
+            if isinstance(record, dict):
+                self.append(record)
+
+    # the record at index, as the dictionary it was loaded from
+    def row(self, index):
+        present = self.__present[index]
+        extra = self.__extras.get(index, {})
+        record = {}
+        stats = {}
+        nested = self.__nested[index]
+        for bit, field in enumerate(FIELDS):
+            if field in extra:
+                value = extra[field]
+            elif not present >> bit & 1:
+                continue
+            elif field in self.__texts:
+                value = self.__texts[field][index]
+            else:
+                value = self.__numbers[field][index]
+                value = None if value == MISSING else value
+            if nested and field in STAT_FIELDS:
+                stats[field] = value
+            else:
+                record[field] = value
+        for field, value in extra.items():
+            if field.startswith('stats.') and nested:
+                stats[field[len('stats.'):]] = value
+            elif field not in FIELDS:
+                record[field] = value
+        if nested:
+            record['stats'] = stats
+        return record
+
+    def rows(self):
+        for index in range(self.__length):
+            yield self.row(index)
+
+    # the raw column: a list for text fields, an array('q') holding MISSING for gaps for number fields
+    def column(self, field):
+        if field in self.__texts:
+            return self.__texts[field]
+        return self.__numbers[field]
+
+    # the number values of field without the gaps
+    def values(self, field):
+        numbers = self.__numbers[field]
+        if not self.__missing[field]:
+            return numbers
+        return array('q', (value for value in numbers if value != MISSING))
+
+    def sum(self, field):
+        return sum(self.values(field))
+
+    def mean(self, field):
+        values = self.values(field)
+        return sum(values) / len(values) if values else None
+
+    def minimum(self, field):
+        values = self.values(field)
+        return min(values) if values else None
+
+    def maximum(self, field):
+        values = self.values(field)
+        return max(values) if values else None
+
+# ColumnCache - columns of the store's collections; records edited through the store change their own row, a collection
+# is only read again when it was reloaded (e.g. edited outside the app). Row numbers stay put except that removing a
+# record moves the last row into its place, rowListeners hear about both (see addRowListener)
+class ColumnCache:
+    __store = None
+    __built = None # fileName -> [store version, RecordColumns, store key of every row, {store key: row}]
+    __rowListeners = None
+    __lock = None
+
+    def __init__(self, store):
+        self.__store = store
+        self.__built = {}
+        self.__rowListeners = []
+        self.__lock = store.lock()
+        store.addListener(self)
+
+    def get(self, fileName):
+        return self.__entry(fileName)[1]
+
+    # the store keys of rows of fileName's columns, which get(fileName) must have returned
+    def keys(self, fileName, rows):
+        keys = self.__entry(fileName)[2]
+        return [keys[row] for row in rows]
+
+    def __entry(self, fileName):
+        with self.__lock:
+            version = self.__store.version(fileName)
+            built = self.__built.get(fileName)
+            if built is None or built[0] != version:
+                items = [(key, record) for key, record in self.__store.items(fileName) if isinstance(record, dict)]
+                keys = [key for key, record in items]
+                built = [version, RecordColumns(record for key, record in items), keys, {key: row for row, key in enumerate(keys)}]
+                self.__built[fileName] = built
+            return built
+
+    # listener.rowsChanging(fileName, columns, rows) is called before those rows change or go,
+    # listener.rowsChanged(fileName, columns, rows) after, with the rows that hold new records
+    def addRowListener(self, listener):
+        with self.__lock:
+            self.__rowListeners.append(listener)
+
+    # store listener: change the row of the edited record
+    def recordChanged(self, fileName, key, record):
+        with self.__lock:
+            built = self.__built.get(fileName)
+            if built is None:
+                return
+            built[0] += 1 # the store bumped its version for this change as well
+            version, columns, keys, rows = built
+            row = rows.get(key)
+            if record is not None and not isinstance(record, dict):
+                record = None
+            if record is None and row is None:
+                return
+            if record is None:
+                last = len(keys) - 1
+                self.__rowsChanging(fileName, columns, [row, last] if row != last else [row])
+                columns.remove(row)
+                del rows[key]
+                moved = keys.pop()
+                if row != last:
+                    keys[row] = moved
+                    rows[moved] = row
+                self.__rowsChanged(fileName, columns, [row] if row != last else [])
+            elif row is None:
+                columns.append(record)
+                rows[key] = len(keys)
+                keys.append(key)
+                self.__rowsChanged(fileName, columns, [len(keys) - 1])
+            else:
+                self.__rowsChanging(fileName, columns, [row])
+                columns.replace(row, record)
+                self.__rowsChanged(fileName, columns, [row])
+
+    def collectionSaved(self, fileName):
+        pass
+
+    def __rowsChanging(self, fileName, columns, rows):
+        for listener in self.__rowListeners:
+            listener.rowsChanging(fileName, columns, rows)
+
+    def __rowsChanged(self, fileName, columns, rows):
+        for listener in self.__rowListeners:
+            listener.rowsChanged(fileName, columns, rows)
+
+# the values of record in each column: (texts in TEXT_FIELDS order, numbers in NUMBER_FIELDS order, present bits,
+# nested, extras)
+def _split(record):
+    stats = record.get('stats') if isinstance(record.get('stats'), dict) else None
+    texts = []
+    numbers = []
+    extra = {}
+    present = 0
+    for bit, field in enumerate(FIELDS):
+        source = stats if stats is not None and field in STAT_FIELDS else record
+        if field in source:
+            present |= 1 << bit
+        value = source.get(field)
+        if field in TEXT_FIELDS:
+            texts.append(sys.intern(value) if isinstance(value, str) else value)
+            continue
+        number = _toNumber(value)
+        if number is None:
+            number = MISSING
+        if value is not None and not (isinstance(value, int) and number == value):
+            extra[field] = value # e.g. '1d4' or '12' in a number field, kept as it was
+        numbers.append(number)
+    for field, value in record.items():
+        if field not in FIELDS and not (field == 'stats' and stats is not None):
+            extra[field] = value
+    if stats is not None:
+        for field, value in stats.items():
+            if field not in STAT_FIELDS:
+                extra['stats.' + field] = value
+    return texts, numbers, present, stats is not None, extra
+
+# whole numbers (and strings holding them, like the counts older versions saved) or None
+def _toNumber(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value if MISSING < value < 2 ** 63 else None
+    if isinstance(value, str) and value.strip().lstrip('-').isdigit():
+        return _toNumber(int(value))
+    return None
+
+# load a .json database straight into columns
+def loadColumns(fileName):
+    return RecordColumns(loadJsonFile(fileName))
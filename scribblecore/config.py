@@ -0,0 +1,17 @@
+'''
+Scribble settings - database file names and the 'config.ini' file located in 'settings'
+'''
+import configparser # library needed to parse the 'config.ini' file located in 'settings'
+import os # interact with the file system and other operating system features
+
+CONFIG = 'config.ini'
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'settings', CONFIG)
+INVENTORY_JSON = 'inventory.json'
+ENEMY_JSON = 'enemies.json'
+LOCATION_JSON = 'locations.json'
+
+# returns the parsed settings/config.ini
+def loadConfig():
+    config = configparser.ConfigParser()
+    config.read(CONFIG_PATH)
+    return config
@@ -0,0 +1,173 @@
+'''
+Scribble dice - DND dice rolls written in standard dice notation
+
+Notation, groups and whole numbers joined with + or -:
+- 3d6, d20, d%        N dice with S sides (N defaults to 1, % is 100)
+- 4d6kh3, 2d20kl1     keep the highest / lowest N dice (k is short for kh)
+- 4d6dl1, 3d8dh1      drop the lowest / highest N dice
+- 2d6r2               reroll, once, every die showing 2 or lower (great weapon fighting)
+- 3d6!                exploding: every max roll adds another die
+e.g. '4d6kh3+2', '2d20kl1', '1d8+1d6!+3'
+'''
+import random # library needed for the randomness of a dice roller
+import re # parse dice notation
+
+MAX_DICE = 10000 # per group, so a typo like 1000000d6 cannot freeze the app
+MAX_SIDES = 1000
+EXPLODE_LIMIT = 100 # a die explodes at most this many times
+GROUP_PATTERN = re.compile(r'(\d*)d(\d+|%)(?:r(\d+))?(!)?(?:(kh|kl|k|dh|dl)(\d+))?')
+TERM_PATTERN = re.compile(r'([+-]?)([^+-]+)')
+
+# DiceGroup - one 'NdS' part of an expression with its modifiers
+class DiceGroup:
+    __slots__ = ('count', 'sides', 'reroll', 'explode', 'keepHighest', 'keep', 'text')
+
+    def __init__(self, count, sides, reroll = 0, explode = False, keepHighest = True, keep = None, text = ''):
+        self.count = count
+        self.sides = sides
+        self.reroll = reroll # reroll once when a die shows this or lower, 0 for never
+        self.explode = explode
+        self.keepHighest = keepHighest
+        self.keep = keep if keep is not None else count # how many dice count towards the total
+        self.text = text
+
+# DiceExpression - parsed dice notation: signed dice groups plus a flat modifier
+class DiceExpression:
+    __slots__ = ('groups', 'modifier', 'text')
+
+    def __init__(self, groups, modifier, text):
+        self.groups = groups # [(sign, DiceGroup)], sign is 1 or -1
+        self.modifier = modifier
+        self.text = text
+
+# RollResult - one roll of an expression: the total and which dice were kept or dropped
+class RollResult:
+    __slots__ = ('total', 'details', 'modifier', 'crit')
+
+    def __init__(self, total, details, modifier, crit):
+        self.total = total
+        self.details = details # [(sign, group text, kept dice, dropped dice)]
+        self.modifier = modifier
+        self.crit = crit # a kept d20 came up 20
+
+    # e.g. '4d6kh3 [6, 5, 3] (dropped 1) + 2 = 16'
+    def describe(self):
+        parts = []
+        for sign, text, kept, dropped in self.details:
+            part = f'{text} {sorted(kept, reverse = True)}'
+            if dropped:
+                part += f' (dropped {", ".join(str(die) for die in sorted(dropped, reverse = True))})'
+            parts.append(('- ' if sign < 0 else '+ ') + part)
+        if self.modifier:
+            parts.append(('- ' if self.modifier < 0 else '+ ') + str(abs(self.modifier)))
+        return ' '.join(parts).lstrip('+ ') + f' = {self.total}'
+
+# DiceRoller - rolls expressions from its own seedable random stream
+# rollMany samples every die of a group for every repeat in one call, instead of one randrange per die
+class DiceRoller:
+    __random = None
+    __seed = None
+
+    def __init__(self, seed = None):
+        self.__seed = seed
+        self.__random = random.Random(seed)
+
+    # an independent stream, e.g. one per worker process; for a seeded roller the same seed and number give the same
+    # rolls, an unseeded one seeds its streams from its own rolls so they differ from run to run
+    def stream(self, number):
+        if self.__seed is None:
+            return DiceRoller(self.__random.getrandbits(64))
+        return DiceRoller(f'{self.__seed}:{number}')
+
+    # rolls expression (text or DiceExpression) once
+    def roll(self, expression):
+        expression = parseDice(expression) if isinstance(expression, str) else expression
+        total = expression.modifier
+        details = []
+        crit = False
+        for sign, group in expression.groups:
+            row = self.__rollGroup(group, 1)[0]
+            kept, dropped = _keepDice(group, row)
+            total += sign * sum(kept)
+            details.append((sign, group.text, kept, dropped))
+            if group.sides == 20 and any(die >= 20 for die in kept):
+                crit = True
+        return RollResult(total, details, expression.modifier, crit)
+
+    # rolls expression times times, returns the list of totals
+    def rollMany(self, expression, times):
+        expression = parseDice(expression) if isinstance(expression, str) else expression
+        totals = [expression.modifier] * times
+        for sign, group in expression.groups:
+            rows = self.__rollGroup(group, times)
+            if group.keep >= group.count:
+                sums = map(sum, rows)
+            else:
+                sums = (sum(_keepDice(group, row)[0]) for row in rows)
+            totals = [total + sign * value for total, value in zip(totals, sums)]
+        return totals
+
+    # returns times tuples of group.count dice, rerolls and explosions applied
+    def __rollGroup(self, group, times):
+        faces = range(1, group.sides + 1)
+        dice = self.__random.choices(faces, k = group.count * times)
+        if group.reroll:
+            low = [index for index, die in enumerate(dice) if die <= group.reroll]
+            for index, die in zip(low, self.__random.choices(faces, k = len(low))):
+                dice[index] = die
+        if group.explode and group.sides > 1:
+            exploding = [index for index, die in enumerate(dice) if die == group.sides]
+            for x in range(EXPLODE_LIMIT):
+                if not exploding:
+                    break
+                extra = self.__random.choices(faces, k = len(exploding))
+                for index, die in zip(exploding, extra):
+                    dice[index] += die
+                exploding = [index for index, die in zip(exploding, extra) if die == group.sides]
+        return list(zip(*[iter(dice)] * group.count)) if group.count else [()] * times
+
+# splits one row of dice into (kept, dropped)
+def _keepDice(group, row):
+    if group.keep >= group.count:
+        return list(row), []
+    ordered = sorted(row, reverse = group.keepHighest)
+    return ordered[:group.keep], ordered[group.keep:]
+
+# parses dice notation like '4d6kh3+2' into a DiceExpression, raises ValueError on anything it does not understand
+def parseDice(text):
+    compact = re.sub(r'\s+', '', str(text).lower())
+    if not compact or TERM_PATTERN.sub('', compact):
+        raise ValueError(f'Could not read dice expression "{text}"')
+    groups = []
+    modifier = 0
+    for signText, term in TERM_PATTERN.findall(compact):
+        sign = -1 if signText == '-' else 1
+        if term.isdigit():
+            modifier += sign * int(term)
+            continue
+        match = GROUP_PATTERN.fullmatch(term)
+        if match is None:
+            raise ValueError(f'Could not read dice "{term}" in "{text}"')
+        count = int(match.group(1)) if match.group(1) else 1
+        sides = 100 if match.group(2) == '%' else int(match.group(2))
+        if count > MAX_DICE or not 1 <= sides <= MAX_SIDES:
+            raise ValueError(f'"{term}" needs at most {MAX_DICE} dice of 1 to {MAX_SIDES} sides')
+        keepHighest = True
+        keep = count
+        if match.group(5):
+            amount = min(int(match.group(6)), count)
+            mode = match.group(5)
+            keepHighest = mode in ('kh', 'k', 'dl')
+            keep = amount if mode in ('kh', 'k', 'kl') else count - amount
+        reroll = int(match.group(3)) if match.group(3) else 0
+        if reroll >= sides:
+            raise ValueError(f'"{term}" would reroll every face')
+        groups.append((sign, DiceGroup(count, sides, reroll, bool(match.group(4)), keepHighest, keep, term)))
+    return DiceExpression(groups, modifier, compact)
+
+DICE = DiceRoller() # shared roller for the GUI and quick scripts
+
+# rolls numOfDie dice with the given number of sides, returns (total, crit) - crit when any die is a natural 20 on a d20
+def rollDice(numOfDie, sides):
+    result = DICE.roll(f'{numOfDie}d{sides}')
+    return result.total, result.crit
@@ -0,0 +1,216 @@
+'''
+Scribble encounters - Monte Carlo fights between the party and a group of enemies, to balance an encounter before the session
+
+Every combatant is a record with 'stats' (anyone in enemies.json or party.json). Its health is its hit points, and its
+armor class, attack bonus and damage come from the record's 'ac', 'attack' and 'damage' fields when it has them:
+- armor class  10 + dexterity modifier
+- attack       d20 + the better of the strength and dexterity modifiers + PROFICIENCY
+- damage       1d8 + the same modifier, a natural 20 rolls the damage dice twice, a natural 1 always misses
+Everyone rolls initiative (d20 + dexterity modifier) and then attacks the living opponent with the fewest hit points left.
+
+The trials are cut into chunks of SIMULATION_CHUNK_TRIALS, each rolled from its own DiceRoller stream (see DiceRoller.stream),
+and the chunks are spread over a pool of worker processes. The same seed gives the same report on any number of workers.
+'''
+import os # how many processors there are
+import random # a seed for a run that was not given one
+from collections import Counter # rounds, hit points lost and deaths of every trial
+
+from . import instrument
+from .config import ENEMY_JSON
+from .dice import DiceRoller, parseDice
+from .probability import Distribution, formatDistribution
+
+PARTY_JSON = 'party.json' # where the player characters' stats are kept
+PARTY_FILES = (PARTY_JSON, ENEMY_JSON) # where party members are looked up, allies can live in enemies.json too
+ENEMY_FILES = (ENEMY_JSON,)
+SIMULATION_TRIALS = 10000
+SIMULATION_CHUNK_TRIALS = 1000 # trials rolled from one dice stream, by one worker
+MAX_ROUNDS = 100 # a fight still going after this many rounds is a draw
+PROFICIENCY = 2
+DRAW_BLOCK = 1024 # dice totals drawn at a time with DiceRoller.rollMany
+
+# Combatant - what a fight needs to know about one party member or enemy
+class Combatant:
+    __slots__ = ('name', 'hp', 'ac', 'attack', 'damage', 'initiative')
+
+    def __init__(self, name, hp, ac, attack, damage, initiative):
+        self.name = name
+        self.hp = hp
+        self.ac = ac
+        self.attack = attack # added to the d20
+        self.damage = damage # dice expression text, e.g. '1d8+3'
+        self.initiative = initiative # added to the initiative d20
+
+    # build a Combatant from a database record, raises ValueError when it has no stats or health
+    @classmethod
+    def fromRecord(cls, record):
+        stats = record.get('stats') if isinstance(record.get('stats'), dict) else {}
+        if not isinstance(stats.get('health'), int) or stats['health'] <= 0:
+            raise ValueError(f'{record.get("name")} has no health in its stats, so it cannot fight')
+        dexterity = _modifier(stats.get('dexterity'))
+        best = max(_modifier(stats.get('strength')), dexterity)
+        damage = str(record.get('damage') or f'1d8{best:+d}')
+        parseDice(damage) # fail here, not in a worker
+        return cls(record['name'], stats['health'], int(record.get('ac', 10 + dexterity)), int(record.get('attack', best + PROFICIENCY)),
+                   damage, dexterity)
+
+    # the tuple handed to the worker processes
+    def toTuple(self):
+        return (self.name, self.hp, self.ac, self.attack, self.damage, self.initiative)
+
+# EncounterReport - the outcome of every trial of one encounter
+class EncounterReport:
+    __slots__ = ('party', 'enemies', 'trials', 'wins', 'draws', 'rounds', 'hpLost', 'deaths')
+
+    def __init__(self, party, enemies):
+        self.party = party # [Combatant]
+        self.enemies = enemies
+        self.trials = 0
+        self.wins = 0 # every enemy down
+        self.draws = 0 # both sides still standing after MAX_ROUNDS
+        self.rounds = Counter() # rounds fought -> trials
+        self.hpLost = Counter() # hit points the whole party lost -> trials
+        self.deaths = Counter() # party members down at the end -> trials
+
+    def add(self, chunk):
+        wins, draws, rounds, hpLost, deaths = chunk
+        self.trials += sum(rounds.values())
+        self.wins += wins
+        self.draws += draws
+        self.rounds.update(rounds)
+        self.hpLost.update(hpLost)
+        self.deaths.update(deaths)
+
+    def winRate(self):
+        return self.wins / self.trials if self.trials else 0.0
+
+    def expectedRounds(self):
+        return self.roundsDistribution().mean()
+
+    def roundsDistribution(self):
+        return _toDistribution(self.rounds, self.trials)
+
+    def hpLostDistribution(self):
+        return _toDistribution(self.hpLost, self.trials)
+
+    def deathsDistribution(self):
+        return _toDistribution(self.deaths, self.trials)
+
+    # text report: win rate, rounds and a chart of the party's hit point loss
+    def describe(self):
+        partyHp = sum(combatant.hp for combatant in self.party)
+        hpLost = self.hpLostDistribution()
+        deaths = self.deathsDistribution()
+        unharmed = self.deaths[0] / max(1, self.trials)
+        lines = [f'{", ".join(c.name for c in self.party)} vs {", ".join(c.name for c in self.enemies)}: {self.trials} fights',
+                 f'Party wins {self.winRate() * 100:.1f}%, loses {(self.trials - self.wins - self.draws) / max(1, self.trials) * 100:.1f}%, '
+                 f'draws {self.draws / max(1, self.trials) * 100:.1f}%',
+                 f'Rounds: mean {self.expectedRounds():.2f}, std dev {self.roundsDistribution().stdev():.2f}',
+                 f'Party hit points lost: mean {hpLost.mean():.1f} of {partyHp}, std dev {hpLost.stdev():.1f}',
+                 f'Party members down: mean {deaths.mean():.2f}, nobody down in {unharmed * 100:.1f}% of fights',
+                 'Hit points lost:']
+        return lines + formatDistribution(hpLost, maxRows = 15)
+
+    def __str__(self):
+        return '\n'.join(self.describe())
+
+# finds every name in the first of fileNames that has it; 'Goblin x3' is three goblins. Raises ValueError for unknown names
+def findCombatants(store, names, fileNames):
+    existing = store.collectionNames()
+    fileNames = [fileName for fileName in fileNames if fileName in existing] # do not create party.json just by looking
+    combatants = []
+    for name in names:
+        base, times = name, 1
+        head, x, count = name.rpartition(' x')
+        if head and count.isdigit():
+            base, times = head, int(count)
+        record = next((found for found in (store.get(fileName, base) for fileName in fileNames) if found is not None), None)
+        if record is None:
+            raise ValueError(f'Could not find {base} in {" or ".join(fileNames) or "any database"}')
+        combatants.extend([Combatant.fromRecord(record)] * times)
+    return combatants
+
+# runs trials fights of party against enemies ([Combatant] or records) on workers processes, returns an EncounterReport
+@instrument.timed('encounter simulation')
+def simulateEncounter(party, enemies, trials = SIMULATION_TRIALS, workers = None, seed = None):
+    party = [c if isinstance(c, Combatant) else Combatant.fromRecord(c) for c in party]
+    enemies = [c if isinstance(c, Combatant) else Combatant.fromRecord(c) for c in enemies]
+    if not party or not enemies:
+        raise ValueError('An encounter needs at least one party member and one enemy')
+    seed = seed if seed is not None else random.randrange(2 ** 32)
+    sides = ([c.toTuple() for c in party], [c.toTuple() for c in enemies])
+    chunks = [(sides, seed, number, min(SIMULATION_CHUNK_TRIALS, trials - start))
+              for number, start in enumerate(range(0, trials, SIMULATION_CHUNK_TRIALS))]
+    report = EncounterReport(party, enemies)
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    if workers <= 1:
+        for chunk in chunks:
+            report.add(_runChunk(*chunk))
+    else:
+        from concurrent.futures import ProcessPoolExecutor # run the chunks on every processor; only here, it is slow to import
+        with ProcessPoolExecutor(workers) as pool:
+            for chunk in pool.map(_runChunk, *zip(*chunks)):
+                report.add(chunk)
+    return report
+
+# runs in a worker: trials fights rolled from dice stream number of seed, returns (wins, draws, rounds, hpLost, deaths)
+def _runChunk(sides, seed, number, trials):
+    roller = DiceRoller(seed).stream(number)
+    fighters = sides[0] + sides[1]
+    partySize = len(sides[0])
+    startHp = [fighter[1] for fighter in fighters]
+    armor = [fighter[2] for fighter in fighters]
+    attack = [fighter[3] for fighter in fighters]
+    initiative = [fighter[5] for fighter in fighters]
+    damage = [parseDice(fighter[4]) for fighter in fighters]
+    d20 = _draws(roller, parseDice('1d20'))
+    damageRolls = [_draws(roller, expression) for expression in damage]
+    opponents = [range(partySize, len(fighters))] * partySize + [range(partySize)] * (len(fighters) - partySize)
+    wins = draws = 0
+    rounds, hpLost, deaths = Counter(), Counter(), Counter()
+    for trial in range(trials):
+        hp = list(startHp)
+        standing = [partySize, len(fighters) - partySize]
+        order = sorted(range(len(fighters)), key = lambda index: (next(d20) + initiative[index], initiative[index]), reverse = True)
+        fought = 0
+        while standing[0] and standing[1] and fought < MAX_ROUNDS:
+            fought += 1
+            for index in order:
+                if hp[index] <= 0:
+                    continue
+                target = min((other for other in opponents[index] if hp[other] > 0), key = hp.__getitem__, default = None)
+                if target is None:
+                    break
+                roll = next(d20)
+                if roll == 1 or (roll < 20 and roll + attack[index] < armor[target]):
+                    continue
+                dealt = next(damageRolls[index])
+                if roll == 20: # a critical hit rolls the damage dice again, without the modifier
+                    dealt += next(damageRolls[index]) - damage[index].modifier
+                hp[target] -= max(0, dealt)
+                if hp[target] <= 0:
+                    standing[target >= partySize] -= 1
+        if not standing[1]:
+            wins += 1
+        elif standing[0]:
+            draws += 1
+        rounds[fought] += 1
+        hpLost[sum(start - max(0, left) for start, left in zip(startHp[:partySize], hp))] += 1
+        deaths[partySize - standing[0]] += 1
+    return wins, draws, rounds, hpLost, deaths
+
+# endless totals of expression, rolled DRAW_BLOCK at a time
+def _draws(roller, expression):
+    while True:
+        yield from roller.rollMany(expression, DRAW_BLOCK)
+
+# ability score -> modifier, 10 or missing is +0
+def _modifier(score):
+    return (score - 10) // 2 if isinstance(score, int) else 0
+
+# Counter of outcome -> trials as a Distribution, so it can be charted like dice odds
+def _toDistribution(counts, trials):
+    if not counts:
+        return Distribution(0, (1.0,))
+    low, high = min(counts), max(counts)
+    return Distribution(low, tuple(counts.get(value, 0) / trials for value in range(low, high + 1)))
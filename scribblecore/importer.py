@@ -0,0 +1,179 @@
+'''
+Scribble import - bring a whole compendium (CSV, JSON lines or a JSON list, e.g. an SRD monster list) into a database
+
+The file is cut into chunks in this process and the chunks are parsed and turned into Item/Enemy records by a pool
+of worker processes. A JSON list is the exception: finding where one record ends means decoding it, so it is decoded
+here by the streaming reader and the workers only map its records. Records whose name is already in the database (or earlier in the file) are skipped, and everything
+left is handed to the store as one batch and written with a single save.
+'''
+import csv # read .csv compendiums
+import io # parse a chunk of csv text
+import json # read .jsonl and .json compendiums
+import os # file sizes for the progress report, how many processors there are
+from collections import deque # chunks handed to the workers, oldest first
+
+from .config import INVENTORY_JSON
+from .models import STAT_FIELDS, Item, Stats, Enemy
+from .storage import normalizeName
+from .stream import iterJsonArray
+
+IMPORT_CHUNK_RECORDS = 5000 # records (or lines) per chunk handed to a worker
+IMPORT_FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.json': 'json'}
+# column names seen in the wild -> our field, compared lowercased with spaces and dashes as underscores
+FIELD_ALIASES = {'name': 'name', 'title': 'name',
+                 'desc': 'desc', 'description': 'desc', 'text': 'desc',
+                 'count': 'count', 'quantity': 'count', 'qty': 'count',
+                 'activeorpassive': 'activeOrPassive', 'active_or_passive': 'activeOrPassive', 'active/passive': 'activeOrPassive',
+                 'key': 'key',
+                 'health': 'health', 'hp': 'health', 'hit_points': 'health', 'hitpoints': 'health',
+                 'strength': 'strength', 'str': 'strength', 'dexterity': 'dexterity', 'dex': 'dexterity',
+                 'constitution': 'constitution', 'con': 'constitution', 'intelligence': 'intelligence', 'int': 'intelligence',
+                 'wisdom': 'wisdom', 'wis': 'wisdom', 'charisma': 'charisma', 'cha': 'charisma'}
+
+# ImportReport - what an import did
+class ImportReport:
+    __slots__ = ('read', 'added', 'duplicates', 'rejected')
+
+    def __init__(self):
+        self.read = 0 # rows found in the file
+        self.added = 0
+        self.duplicates = 0 # already in the database or earlier in the file
+        self.rejected = 0 # no name, or a count that is not a number
+
+    def __str__(self):
+        return f'Read {self.read} records: {self.added} added, {self.duplicates} duplicates skipped, {self.rejected} rejected'
+
+# imports path into fileName of store; progress(report, fraction of the file read or None) is called after every chunk
+# replace overwrites records that already exist instead of skipping them
+def importFile(store, path, fileName, fileFormat = None, replace = False, workers = None, progress = None):
+    fileFormat = fileFormat or IMPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+    if fileFormat not in ('csv', 'jsonl', 'json'):
+        raise ValueError(f'Cannot tell the format of {path}, use a .csv, .jsonl or .json file')
+    kind = 'item' if fileName == INVENTORY_JSON else 'enemy'
+    seen = set() if replace else {normalizeName(record.get('name', '')) for record in store.records(fileName)}
+    records = []
+    report = ImportReport()
+    size = max(1, os.path.getsize(path))
+    for (chunkRecords, chunkRejected, chunkRead), position in _parseChunks(path, fileFormat, kind, workers):
+        report.read += chunkRead
+        report.rejected += chunkRejected
+        for record in chunkRecords:
+            key = normalizeName(record['name'])
+            if key in seen:
+                report.duplicates += 1
+                continue
+            seen.add(key)
+            records.append(record)
+        report.added = len(records)
+        if progress is not None:
+            progress(report, min(1.0, position / size) if position is not None else None)
+    store.upsertMany(fileName, records)
+    store.flush(fileName)
+    return report
+
+# yields (parsed chunk, file position reached) in file order, parsing up to two chunks per worker at a time
+def _parseChunks(path, fileFormat, kind, workers):
+    workers = workers or os.cpu_count() or 1
+    chunks = _readChunks(path, fileFormat)
+    if workers == 1:
+        for payload, position in chunks:
+            yield _parseChunk(fileFormat, kind, payload), position
+        return
+    from concurrent.futures import ProcessPoolExecutor # parse chunks on every processor; only here, it is slow to import
+    with ProcessPoolExecutor(workers) as pool:
+        running = deque()
+        for payload, position in chunks:
+            running.append((pool.submit(_parseChunk, fileFormat, kind, payload), position))
+            if len(running) >= workers * 2:
+                future, reached = running.popleft()
+                yield future.result(), reached
+        while running:
+            future, reached = running.popleft()
+            yield future.result(), reached
+
+# cuts the file into (payload, file position) chunks: csv and jsonl as raw text for the workers to parse,
+# a JSON list as decoded records (it has to be decoded to find where one record ends)
+def _readChunks(path, fileFormat):
+    if fileFormat == 'json':
+        chunk = []
+        for record in iterJsonArray(path):
+            chunk.append(record)
+            if len(chunk) >= IMPORT_CHUNK_RECORDS:
+                yield chunk, None # the position in the file is not known while streaming
+                chunk = []
+        yield chunk, os.path.getsize(path)
+        return
+    with open(path, 'r', encoding = 'utf-8-sig', newline = '') as importFile:
+        header = importFile.readline() if fileFormat == 'csv' else ''
+        lines = []
+        quotes = 0
+        for line in importFile:
+            lines.append(line)
+            quotes += line.count('"')
+            # a csv value in quotes can hold line breaks, so only cut where every quote is closed
+            if len(lines) >= IMPORT_CHUNK_RECORDS and quotes % 2 == 0:
+                yield header + ''.join(lines), _position(importFile)
+                lines = []
+        yield header + ''.join(lines), _position(importFile)
+
+# how far into the file reading got (the raw file runs a little ahead of the lines handed out)
+def _position(openFile):
+    try:
+        return openFile.buffer.raw.tell()
+    except (AttributeError, OSError):
+        return 0
+
+# runs in a worker: parse one chunk and map every row onto a record, returns (records, rejected, rows read)
+def _parseChunk(fileFormat, kind, payload):
+    if fileFormat == 'csv':
+        rows = list(csv.DictReader(io.StringIO(payload)))
+    elif fileFormat == 'jsonl':
+        rows = []
+        for line in payload.split('\n'):
+            if line.strip():
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    rows.append(None)
+    else:
+        rows = payload
+    records = []
+    for row in rows:
+        record = mapRecord(row, kind) if isinstance(row, dict) else None
+        if record is not None:
+            records.append(record)
+    return records, len(rows) - len(records), len(rows)
+
+# turns one row of a compendium into an inventory ('item') or enemies ('enemy') record, None if it cannot be used
+def mapRecord(row, kind):
+    fields = {}
+    stats = row.get('stats') if isinstance(row.get('stats'), dict) else {}
+    for column, value in list(row.items()) + list(stats.items()):
+        field = FIELD_ALIASES.get(str(column).strip().lower().replace(' ', '_').replace('-', '_'))
+        if field is not None and field not in fields and value not in (None, ''):
+            fields[field] = value.strip() if isinstance(value, str) else value
+    if not isinstance(fields.get('name'), str) or not fields['name']:
+        return None
+    if kind == 'item':
+        try:
+            item = Item.fromDict({'name': fields['name'], 'desc': str(fields.get('desc', '')), 'count': fields.get('count', 1),
+                                  'activeOrPassive': str(fields.get('activeOrPassive', 'Active')).title(),
+                                  'key': 'Key' if str(fields.get('key', '')).lower() in ('key', 'yes', 'true', '1') else 'Not Key'})
+        except (TypeError, ValueError):
+            return None
+        return item.toDict()
+    values = {field: _toInt(fields.get(field)) for field in STAT_FIELDS}
+    stats = Stats.fromDict(values) if any(value is not None for value in values.values()) else None
+    return Enemy(fields['name'], str(fields.get('desc', '')), stats).toDict()
+
+# '12', 12 and '12 (2d8+3)' -> 12, anything else None
+def _toInt(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value)
+    if isinstance(value, str) and value.split(' ', 1)[0].lstrip('-').isdigit():
+        return int(value.split(' ', 1)[0])
+    return None
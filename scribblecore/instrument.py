@@ -0,0 +1,159 @@
+'''
+Scribble instrumentation - timers, counters and byte counts for the slow paths, switched on under [Diagnostics] in config.ini
+
+While switched off, a timed function costs one extra call and a flag check. While on, every operation keeps its call count,
+total time, bytes and its most recent latencies, which the Diagnostics panel turns into histograms.
+A cProfile capture of the GUI thread can be started and stopped from the same panel and is written as a .pstats file.
+'''
+import cProfile # the optional profile capture
+import functools # keep the name and docstring of timed functions
+import threading # timed functions run on the GUI thread and the background workers
+import time # timers
+from collections import deque # the rolling window of latencies
+
+HISTORY = 512 # latencies kept per operation for the histograms
+PROFILE_FILE = 'scribble.pstats'
+HISTOGRAM_BUCKETS = (0.1, 1, 10, 100, 1000) # upper bounds in milliseconds, the last bucket is everything slower
+ENABLED = False # set from config.ini by configure, or by enable
+METRICS = {} # operation name -> _Metric
+LOCK = threading.Lock()
+PROFILER = None # the running cProfile.Profile, if any
+
+# _Metric - what has been measured for one operation
+class _Metric:
+    __slots__ = ('calls', 'totalMs', 'bytes', 'recent')
+
+    def __init__(self, history):
+        self.calls = 0
+        self.totalMs = 0.0
+        self.bytes = 0
+        self.recent = deque(maxlen = history) # latest latencies in milliseconds
+
+def _metric(name):
+    metric = METRICS.get(name)
+    if metric is None:
+        metric = METRICS[name] = _Metric(HISTORY)
+    return metric
+
+# reads [Diagnostics] from config: enabled, history, profile_file
+def configure(config):
+    global HISTORY, PROFILE_FILE
+    HISTORY = config.getint('Diagnostics', 'history', fallback = HISTORY)
+    PROFILE_FILE = config.get('Diagnostics', 'profile_file', fallback = PROFILE_FILE)
+    enable(config.getboolean('Diagnostics', 'enabled', fallback = False))
+
+def enable(on = True):
+    global ENABLED
+    ENABLED = on
+
+# decorator: time every call of the function as operation name (the function's own name if not given)
+def timed(name = None):
+    def decorate(function):
+        operation = name or function.__qualname__
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(operation, (time.perf_counter() - start) * 1000)
+        return wrapper
+    return decorate
+
+# add one measured call of name that took milliseconds (and moved amount bytes)
+def record(name, milliseconds, amount = 0):
+    if not ENABLED:
+        return
+    with LOCK:
+        metric = _metric(name)
+        metric.calls += 1
+        metric.totalMs += milliseconds
+        metric.bytes += amount
+        metric.recent.append(milliseconds)
+
+# count amount events (calls without a time, e.g. cache misses) of name
+def count(name, amount = 1):
+    if not ENABLED:
+        return
+    with LOCK:
+        _metric(name).calls += amount
+
+# add amount bytes read or written to name
+def countBytes(name, amount):
+    if not ENABLED:
+        return
+    with LOCK:
+        _metric(name).bytes += amount
+
+def reset():
+    with LOCK:
+        METRICS.clear()
+
+# [(name, calls, total ms, p50 ms, p99 ms, max ms, bytes, histogram counts)] sorted by total time, slowest first
+# the percentiles and histogram are over the most recent calls only
+def snapshot():
+    with LOCK:
+        metrics = [(name, metric.calls, metric.totalMs, metric.bytes, sorted(metric.recent)) for name, metric in METRICS.items()]
+    rows = []
+    for name, calls, totalMs, amount, recent in sorted(metrics, key = lambda metric: -metric[2]):
+        if recent:
+            p50, p99, slowest = recent[len(recent) // 2], recent[min(len(recent) - 1, len(recent) * 99 // 100)], recent[-1]
+        else:
+            p50 = p99 = slowest = None
+        histogram = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        bucket = 0
+        for latency in recent: # already sorted, so the bucket only moves forward
+            while bucket < len(HISTOGRAM_BUCKETS) and latency >= HISTOGRAM_BUCKETS[bucket]:
+                bucket += 1
+            histogram[bucket] += 1
+        rows.append((name, calls, totalMs, p50, p99, slowest, amount, histogram))
+    return rows
+
+# the snapshot as text lines for the Diagnostics panel, one histogram bar per latency bucket
+def formatDiagnostics(width = 30):
+    if not ENABLED:
+        return ['Instrumentation is off, set enabled = true under [Diagnostics] in settings/config.ini']
+    labels = [f'<{bound:g}ms' for bound in HISTOGRAM_BUCKETS] + [f'>={HISTOGRAM_BUCKETS[-1]:g}ms']
+    lines = []
+    for name, calls, totalMs, p50, p99, slowest, amount, histogram in snapshot():
+        line = f'{name}: {calls} calls'
+        if p50 is not None:
+            line += f', {totalMs:.0f} ms total, p50 {p50:.2f} ms, p99 {p99:.2f} ms, max {slowest:.2f} ms'
+        if amount:
+            line += f', {_formatBytes(amount)}'
+        lines.append(line)
+        peak = max(histogram)
+        for label, value in zip(labels, histogram):
+            if value:
+                lines.append(f'    {label:>9} {value:5} ' + '#' * max(1, round(value / peak * width)))
+    return lines or ['Nothing measured yet']
+
+def _formatBytes(amount):
+    for unit in ('B', 'KB', 'MB'):
+        if amount < 1024:
+            return f'{amount:.0f} {unit}'
+        amount /= 1024
+    return f'{amount:.1f} GB'
+
+# start capturing a cProfile of the calling thread (the GUI thread when started from the panel)
+def startProfile():
+    global PROFILER
+    if PROFILER is None:
+        PROFILER = cProfile.Profile()
+        PROFILER.enable()
+
+# stop the capture and write it to path (PROFILE_FILE if not given), returns the path; open it with pstats or snakeviz
+def stopProfile(path = None):
+    global PROFILER
+    if PROFILER is None:
+        return None
+    PROFILER.disable()
+    path = path or PROFILE_FILE
+    PROFILER.dump_stats(path)
+    PROFILER = None
+    return path
+
+def profiling():
+    return PROFILER is not None
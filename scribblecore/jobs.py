@@ -0,0 +1,57 @@
+'''
+Scribble jobs - runs storage and search work on background threads so the GUI never waits on the disk
+'''
+import threading # the lock guarding the queued/pending bookkeeping
+from concurrent.futures import ThreadPoolExecutor # the worker threads
+
+JOB_WORKERS = 2 # enough to save and search at the same time, more only fights over the disk
+
+# JobExecutor - thread pool for disk and search work; notify(name, result, error) is called from the worker when a job ends
+class JobExecutor:
+    __pool = None
+    __notify = None
+    __queued = None # name -> token of a coalescing job that has not started yet
+    __pending = 0 # jobs submitted but not finished
+    __lock = None
+
+    def __init__(self, notify, maxWorkers = JOB_WORKERS):
+        self.__pool = ThreadPoolExecutor(maxWorkers, thread_name_prefix = 'scribble-job')
+        self.__notify = notify
+        self.__queued = {}
+        self.__lock = threading.Lock()
+
+    # run function(*args) in the background; with coalesce, a job with the same name that has not started yet
+    # already covers this one (e.g. saving a collection twice), so nothing new is queued and False is returned
+    def submit(self, name, function, *args, coalesce = False):
+        with self.__lock:
+            if coalesce and name in self.__queued:
+                return False
+            token = object()
+            if coalesce:
+                self.__queued[name] = token
+            self.__pending += 1
+        self.__pool.submit(self.__run, name, token, function, args)
+        return True
+
+    def __run(self, name, token, function, args):
+        with self.__lock:
+            if self.__queued.get(name) is token:
+                del self.__queued[name] # from now on a new save of this collection needs its own job
+        result = None
+        error = None
+        try:
+            result = function(*args)
+        except Exception as e:
+            error = e
+        with self.__lock:
+            self.__pending -= 1
+        self.__notify(name, result, error)
+
+    # how many jobs are queued or running
+    def pending(self):
+        with self.__lock:
+            return self.__pending
+
+    # wait for every submitted job to finish
+    def shutdown(self):
+        self.__pool.shutdown(wait = True)
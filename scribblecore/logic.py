@@ -0,0 +1,276 @@
+'''
+Scribble campaign logic - what happens when the inventory, enemy or search forms are submitted
+
+Handlers take the same values dictionary the GUI reads from its window, so scripts can call them directly
+'''
+import os # database file sizes, to pick the ones that are searched by streaming
+import time # when a snapshot was taken
+
+from . import instrument
+from .config import INVENTORY_JSON, ENEMY_JSON, LOCATION_JSON, loadConfig
+from .models import Item, Enemy
+from .storage import CampaignStore, makeBackend, JOURNAL_SUFFIX
+from .search import SearchIndex
+from .query import QueryEngine, isQuery
+from .suggest import NameSuggester
+from .stream import streamSearch
+from .results import ResultCursor
+from .tally import TallyCounters
+
+RECORD_LABELS = {'name': 'Name', 'desc': 'Description', 'count': 'Count', 'activeOrPassive': 'Active/Passive', 'key': 'Key/Not Key'}
+STORE = None # every database read and write goes through the in-memory store, see openCampaign
+SEARCH_INDEX = None # word index over every database, kept up to date by the store
+QUERY_ENGINE = None # field queries like 'enemies where dexterity >= 14', see scribblecore/query.py
+SUGGESTER = None # as-you-type name suggestions, see scribblecore/suggest.py
+TALLIES = None # the [Campaign] counters of config.ini, see scribblecore/tally.py
+STREAM_BYTES = 64 * 1024 * 1024 # other .json databases bigger than this are searched straight from the file, see config.ini
+STREAM_SEARCH_LIMIT = 50 # stop reading a streamed database after this many matches
+SNAPSHOTS = {} # name -> (time taken, store snapshot), named versions of the campaign kept while it is open
+
+# open the databases in the current directory with the backend selected in config.ini, done on first use
+def openCampaign(config = None):
+    global STORE, SEARCH_INDEX, QUERY_ENGINE, SUGGESTER, TALLIES, STREAM_BYTES
+    if STORE is None:
+        config = config if config is not None else loadConfig()
+        STREAM_BYTES = config.getint('Storage', 'stream_bytes', fallback = STREAM_BYTES)
+        instrument.configure(config)
+        if config.get('Sync', 'mode', fallback = 'local') == 'client':
+            from .sync import SYNC_HOST, SYNC_PORT, RemoteStore # only here, the sync module pulls in asyncio
+            STORE = RemoteStore(config.get('Sync', 'host', fallback = SYNC_HOST), config.getint('Sync', 'port', fallback = SYNC_PORT))
+        else:
+            STORE = CampaignStore(makeBackend(config))
+        SEARCH_INDEX = SearchIndex(STORE, skip = isStreamed)
+        QUERY_ENGINE = QueryEngine(STORE)
+        SUGGESTER = NameSuggester(STORE, skip = isStreamed)
+        TALLIES = TallyCounters(config)
+    return STORE
+
+# write any unsaved changes and the search index, call when the application shuts down
+def closeCampaign():
+    global STORE, SEARCH_INDEX, QUERY_ENGINE, SUGGESTER, TALLIES
+    if STORE is not None:
+        SNAPSHOTS.clear()
+        STORE.close() # write any unsaved changes back to the databases
+        SEARCH_INDEX.save() # so the next start only re-indexes databases that changed
+        TALLIES.close()
+        TALLIES = None
+        STORE = None
+        SEARCH_INDEX = None
+        QUERY_ENGINE = None
+        SUGGESTER = None
+
+# the campaign counters (deaths, beers, ...), opened with the campaign
+def tallies():
+    openCampaign()
+    return TALLIES
+
+# True for a database that is searched by reading it record by record instead of loading it: a big .json file
+# (an imported compendium, say) that is not one of the databases the app edits and has no journal
+def isStreamed(fileName):
+    if fileName in (INVENTORY_JSON, ENEMY_JSON, LOCATION_JSON) or os.path.exists(fileName + JOURNAL_SUFFIX):
+        return False
+    try:
+        return os.path.getsize(fileName) > STREAM_BYTES
+    except OSError:
+        return False
+
+# returns [(fileName, record)] from every database whose name or description matches find, best match first
+# find can also be a query like 'enemies where health < 50 order by strength desc'; one that cannot be read is searched
+# for as a name instead ('Enemies order of battle')
+@instrument.timed('search')
+def findRecords(find):
+    store = openCampaign()
+    if isQuery(find, store.collectionNames()):
+        try:
+            return QUERY_ENGINE.run(find)
+        except ValueError:
+            pass # not a query after all, search for it as a name
+    streamed = [fileName for fileName in store.collectionNames() if isStreamed(fileName)]
+    return SEARCH_INDEX.query(find) + list(streamSearch(find, streamed, STREAM_SEARCH_LIMIT))
+
+# like findRecords, but returns a ResultCursor that fetches the records a page at a time, for the Search panel's table;
+# streamed databases are read only as far as the pages asked for, so there is no STREAM_SEARCH_LIMIT
+@instrument.timed('search')
+def findResults(find):
+    store = openCampaign()
+    if isQuery(find, store.collectionNames()):
+        try:
+            fileName, keys = QUERY_ENGINE.selectKeys(find)
+            return ResultCursor(_fetchResult, [(fileName, key) for key in keys])
+        except ValueError:
+            pass # not a query after all, search for it as a name
+    streamed = [fileName for fileName in store.collectionNames() if isStreamed(fileName)]
+    return ResultCursor(_fetchResult, SEARCH_INDEX.rank(find), streamSearch(find, streamed) if streamed else None)
+
+# a ResultCursor reference is (fileName, key) from the search index or a query, or (fileName, record) read from a streamed database
+def _fetchResult(ref):
+    fileName, found = ref
+    if isinstance(found, dict):
+        return ref
+    record = STORE.get(fileName, found)
+    return (fileName, record) if record is not None else None
+
+# returns (findResults(find), close names when nothing matched), for the Search panel's background job
+def findResultsOrSuggest(find):
+    cursor = findResults(find)
+    return cursor, ([] if cursor.results(0, 1) else suggestNames(find))
+
+# same as findRecords, but tells the user when nothing matched
+def search(find):
+    results = findRecords(find)
+    if not results:
+        print('Search could not find item, does not exist?')
+        printSuggestions(suggestNames(find))
+    return results
+
+# returns (findRecords(find), close names when nothing matched), for the Search panel's background job
+def findRecordsOrSuggest(find):
+    results = findRecords(find)
+    return results, ([] if results else suggestNames(find))
+
+# names that start like text or are a typo or two away from it, from fileName only if given
+def suggestNames(text, fileName = None):
+    store = openCampaign()
+    if isQuery(text, store.collectionNames()):
+        return []
+    return SUGGESTER.suggest(text, fileName)
+
+def printSuggestions(names):
+    if names:
+        print(f'Did you mean: {", ".join(names)}?')
+
+# prints every search result, grouped by the database it was found in
+def printSearchResults(results, suggestions = ()):
+    # Display matching records or inform user if no match is found
+    if results:
+        for fileName, record in results:
+            print(f'Found in: {fileName}')
+            for field, value in record.items():
+                print(f'{RECORD_LABELS.get(field, field.title())}: {value}')
+            print('-' * 30)
+    else:
+        print('Item not found in database')
+        printSuggestions(suggestions)
+
+def invMenuAddLogic(values):
+    store = openCampaign()
+    item = Item(values)  # Create item object
+    existingItem = store.get(INVENTORY_JSON, item.getName())  # Single item we are looking to edit, if it is pre-existing
+
+    if existingItem:
+        # If item already exists in the inventory, update its count
+        store.adjustCount(INVENTORY_JSON, item.getName(), item.getCount())  # Increase count by new count
+        print("Successfully updated item count")
+    else:
+        # If item is not found in the inventory, add it
+        if item.allFieldsFilled():
+            store.upsert(INVENTORY_JSON, item.toDict())
+            print("Successfully added item to inventory")
+        else:
+            print("You are missing fields in item")
+
+def invMenuRemoveLogic(values):
+    store = openCampaign()
+    inputValue = values['-Item Name-'].strip()  # Get the name of the item to remove (trimmed)
+    count = int(values['-Item Count-'])  # Get the count of the item to remove
+    item = store.get(INVENTORY_JSON, inputValue)  # Look up the matching item by name
+    removed = False  # Flag to track if any item was removed
+
+    # Remove the matching item based on count
+    if item:
+        itemCount = int(item['count'])
+        if count < 0:
+            # Complete removal from database if count is negative and item is not a key
+            if item['key'] == 'Key':
+                print('Item is a key and cannot be removed completely.')
+            else:
+                store.remove(INVENTORY_JSON, inputValue)
+                removed = True
+        elif count > 0: # Decrease the count of the item by the specified amount
+            adjusted = store.adjustCount(INVENTORY_JSON, inputValue, -count) # None if someone else removed it meanwhile
+            if adjusted is None or adjusted['count'] == 0:
+                store.remove(INVENTORY_JSON, inputValue)
+                removed = True
+            else:
+                print(f'Successfully removed {count} of that item.')
+        else: # set equal to 0
+            store.adjustCount(INVENTORY_JSON, inputValue, -itemCount)
+            removed = True
+
+    if removed:
+        print('Successfully removed item(s).')
+    else:
+        print('No matching item found or count is invalid.')
+        if item is None:
+            printSuggestions(suggestNames(inputValue, INVENTORY_JSON))
+
+def enemiesMenuLogic(values):
+    store = openCampaign()
+    enemy = Enemy(values['-Enemy Name-'], values['-Enemy Desc-'])
+
+    # if enemy fields have data, add them to json
+    if bool(values['-Enemy Name-']) == True and bool(values['-Enemy Desc-']) == True:
+        store.append(ENEMY_JSON, enemy.toDict()) # enemies with the same name are separate enemies
+    else:
+        print("You are missing fields in enemy")
+
+def searchMenuInventoryLogic(values):
+    printSearchResults(*findRecordsOrSuggest(values['-Search-'])) # Ranked matches from every database
+
+# remember every database (except the streamed ones) as it is now under name, replacing an older snapshot of that name;
+# only the changes made after it cost memory. Raises ValueError while sharing a campaign
+def takeSnapshot(name):
+    store = openCampaign()
+    SNAPSHOTS[name] = (time.time(), store.snapshot([fileName for fileName in store.collectionNames() if not isStreamed(fileName)]))
+    return name
+
+# put the databases back the way they were when snapshot name was taken, as one step that can be undone;
+# returns how many records changed. Raises ValueError for an unknown name
+def restoreSnapshot(name):
+    if name not in SNAPSHOTS:
+        raise ValueError(f'There is no snapshot called {name}')
+    return openCampaign().restore(SNAPSHOTS[name][1], f'restore {name}')
+
+# [(name, time taken)] of every snapshot, oldest first
+def snapshotNames():
+    return [(name, taken) for name, (taken, snapshot) in SNAPSHOTS.items()]
+
+def undoLogic():
+    try:
+        label = openCampaign().undo()
+    except ValueError as e:
+        print(e)
+        return
+    print(f'Undone: {label}' if label is not None else 'Nothing to undo.')
+
+def redoLogic():
+    try:
+        label = openCampaign().redo()
+    except ValueError as e:
+        print(e)
+        return
+    print(f'Redone: {label}' if label is not None else 'Nothing to redo.')
+
+def snapshotTakeLogic(values):
+    name = values['-Snapshot Name-'].strip()
+    if not name:
+        print('Give the snapshot a name.')
+        return
+    try:
+        takeSnapshot(name)
+    except ValueError as e:
+        print(e)
+        return
+    print(f'Snapshot {name} taken.')
+
+def snapshotRestoreLogic(values):
+    if not values['-Snapshots-']:
+        print('Pick a snapshot to restore.')
+        return
+    name = values['-Snapshots-'][0]
+    try:
+        changed = restoreSnapshot(name)
+    except ValueError as e:
+        print(e)
+        return
+    print(f'Restored {name}, {changed} record(s) changed. Edit > Undo takes it back.')
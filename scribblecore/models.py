@@ -0,0 +1,144 @@
+'''
+Scribble data models - the records kept in the campaign databases
+
+The classes use __slots__, so a record is a handful of pointers instead of an object with its own __dict__.
+To filter or add up a whole collection by its fields, see RecordColumns in columns.py.
+'''
+
+STAT_FIELDS = ('health', 'strength', 'dexterity', 'constitution', 'intelligence', 'wisdom', 'charisma')
+
+class Item:
+    __slots__ = ('__name',
+                 '__desc',
+                 '__count', # how many of this item you have
+                 '__activeOrPassive', # is a consumable or a passive item
+                 '__key') # cannot be removed from inventory
+
+    def __init__(self, values):
+        self.__name = values['-Item Name-']
+        self.__desc = values['-Item Desc-']
+        self.__count = int(values['-Item Count-'])
+        self.__activeOrPassive = self.activeOrPassive(values)
+        self.__key = self.keyOrNotKey(values)
+
+    def getName(self):
+        return self.__name
+    def getDesc(self):
+        return self.__desc
+    def getCount(self):
+        return self.__count
+    def getActiveOrPassive(self):
+        return self.__activeOrPassive
+    def getKey(self):
+        return self.__key
+
+    def setName(self, a):
+        self.__name = a
+    def setDesc(self, a):
+        self.__desc = a
+    def setCount(self, a):
+        self.__count = int(a)
+    def setActiveOrPassive(self, a):
+        self.__activeOrPassive = a
+    def setKey(self, a):
+        self.__key = a
+
+    # determine weither or not the item is active or passive
+    def activeOrPassive(self, values):
+        if bool(values['-Item Passive-']) == True:
+            return 'Passive'
+        else:
+            return 'Active'
+
+    # determine weither or not the item is permanant to your inv.
+    def keyOrNotKey(self, values):
+        if bool(values['-Item Key-']) == True:
+            return 'Key'
+        else:
+            return 'Not Key'
+
+    # check if all variables have a value
+    def allFieldsFilled(self):
+        values = self.toDict()
+        for k in values.values():
+            if bool(k) == False:
+                return False
+        return True
+
+    # convert class data into dictionary and return
+    def toDict(self):
+        return {
+            'name': self.__name,
+            'desc': self.__desc,
+            'count': self.__count,
+            'activeOrPassive': self.__activeOrPassive,
+            'key': self.__key
+        }
+
+    # create an Item from a database record
+    @classmethod
+    def fromDict(cls, record):
+        return cls({'-Item Name-': record.get('name'), '-Item Desc-': record.get('desc'), '-Item Count-': record.get('count', 0),
+                    '-Item Passive-': record.get('activeOrPassive') == 'Passive', '-Item Key-': record.get('key') == 'Key'})
+
+# Stats - data container for statistical information about your character, enemies, allies
+class Stats:
+    __slots__ = ('__hp', '__str', '__dex', '__con', '__int', '__wis', '__cha')
+
+    def __init__(self, hp, strength = None, dexterity = None, constitution = None, intelligence = None, wisdom = None, charisma = None):
+        self.__hp = hp
+        self.__str = strength
+        self.__dex = dexterity
+        self.__con = constitution
+        self.__int = intelligence
+        self.__wis = wisdom
+        self.__cha = charisma
+
+    # convert class data into dictionary and return
+    def toDict(self):
+        return {
+            'health': self.__hp,
+            'strength': self.__str,
+            'dexterity': self.__dex,
+            'constitution': self.__con,
+            'intelligence': self.__int,
+            'wisdom': self.__wis,
+            'charisma': self.__cha
+        }
+
+    # create Stats from a dictionary like the one toDict returns
+    @classmethod
+    def fromDict(cls, stats):
+        return cls(*(stats.get(field) for field in STAT_FIELDS))
+
+# Enemy - their stats, dropped items, equipment, name and description, and optional .PNG photo of enemy for battleboard
+class Enemy:
+    __slots__ = ('__name', '__desc', '__stats')
+
+    def __init__(self, name, desc, stats = None):
+        self.__name = name
+        self.__desc = desc
+        self.__stats = stats
+
+    def getName(self):
+        return self.__name
+    def getDesc(self):
+        return self.__desc
+    def getStats(self):
+        return self.__stats
+
+    # convert class data into dictionary and return, stats are only saved once they are known
+    def toDict(self):
+        enemy = {
+            'name': self.__name,
+            'desc': self.__desc
+        }
+        if self.__stats is not None:
+            enemy['stats'] = self.__stats.toDict()
+        return enemy
+
+    # create an Enemy from a database record
+    @classmethod
+    def fromDict(cls, record):
+        stats = Stats.fromDict(record['stats']) if isinstance(record.get('stats'), dict) else None
+        return cls(record.get('name'), record.get('desc'), stats)
@@ -0,0 +1,314 @@
+'''
+Scribble persistent maps - a dictionary that is never changed in place, for undo history and snapshots
+
+PersistentMap is a hash array mapped trie: set and remove return a new map that shares every untouched branch with the
+old one, copying only the few nodes on the path to the changed key. Keeping an old version (an undo step, a snapshot)
+costs nothing more than holding on to it, and changes() walks only the branches two versions do not share, so comparing
+a snapshot with the current campaign takes time in the number of changes, not the number of records.
+Values are compared by identity, so records kept in a map must not be edited in place - store a changed copy instead.
+
+CollectionVersion is what the store keeps per collection: a frozen dict copy of the collection plus a PersistentMap of
+the changes made since. Taking it is one C-level dict copy, each change costs a path copy in the (small) change map, a
+big batch of changes takes a new copy that remembers which keys it changed, and versions compare through those only.
+'''
+HASH_BITS = 5 # bits of the key's hash used per level, 32 children per node
+HASH_MASK = (1 << HASH_BITS) - 1
+HASH_LIMIT = 64 # hashes are taken as unsigned 64-bit numbers, keys whose whole hash is equal share a _Collision
+HASH_WRAP = (1 << HASH_LIMIT) - 1
+
+# _Node - one level of the trie: bit n of bitmap is set when child n exists, children holds only the existing ones
+# a child is a (hash, key, value) tuple, a deeper _Node or a _Collision
+class _Node:
+    __slots__ = ('bitmap', 'children')
+
+    def __init__(self, bitmap, children):
+        self.bitmap = bitmap
+        self.children = children # tuple
+
+# _Collision - keys whose hashes are equal in every bit
+class _Collision:
+    __slots__ = ('hash', 'entries')
+
+    def __init__(self, hash, entries):
+        self.hash = hash
+        self.entries = entries # tuple of (hash, key, value)
+
+EMPTY_NODE = _Node(0, ())
+
+# PersistentMap - immutable mapping; set/remove/update return new maps that share structure with this one
+class PersistentMap:
+    __slots__ = ('_root', '_length')
+
+    def __init__(self, items = ()):
+        if isinstance(items, PersistentMap):
+            self._root, self._length = items._root, items._length
+            return
+        entries = {}
+        for key, value in (items.items() if isinstance(items, dict) else items):
+            entries[key] = (hash(key) & HASH_WRAP, key, value)
+        self._root = _build(list(entries.values()), 0) if entries else EMPTY_NODE
+        if not isinstance(self._root, _Node):
+            self._root = _Node(1 << (self._root[0] & HASH_MASK), (self._root,))
+        self._length = len(entries)
+
+    @classmethod
+    def _make(cls, root, length):
+        made = cls.__new__(cls)
+        made._root = root
+        made._length = length
+        return made
+
+    def __len__(self):
+        return self._length
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default = None):
+        keyHash = hash(key) & HASH_WRAP
+        node = self._root
+        shift = 0
+        while True:
+            bit = 1 << ((keyHash >> shift) & HASH_MASK)
+            if not node.bitmap & bit:
+                return default
+            child = node.children[(node.bitmap & (bit - 1)).bit_count()]
+            if type(child) is tuple:
+                return child[2] if child[0] == keyHash and child[1] == key else default
+            if type(child) is _Collision:
+                return next((entry[2] for entry in child.entries if entry[1] == key), default) if child.hash == keyHash else default
+            node = child
+            shift += HASH_BITS
+
+    def __iter__(self):
+        return (entry[1] for entry in _entries(self._root))
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        return (entry[2] for entry in _entries(self._root))
+
+    def items(self):
+        return ((entry[1], entry[2]) for entry in _entries(self._root))
+
+    # a map with key set to value; this map itself when key already holds that very value
+    def set(self, key, value):
+        keyHash = hash(key) & HASH_WRAP
+        root, added = _assoc(self._root, 0, (keyHash, key, value))
+        return self if root is self._root else PersistentMap._make(root, self._length + added)
+
+    # a map without key; this map itself when key is not in it
+    def remove(self, key):
+        root = _dissoc(self._root, 0, hash(key) & HASH_WRAP, key)
+        if root is self._root:
+            return self
+        return PersistentMap._make(root if root is not None else EMPTY_NODE, self._length - 1)
+
+    # a map with every (key, value) of items set, e.g. an import
+    def update(self, items):
+        updated = self
+        for key, value in (items.items() if isinstance(items, dict) else items):
+            updated = updated.set(key, value)
+        return updated
+
+    # (key, value here or None, value in other or None) for every key that differs between this map and other;
+    # branches both maps share are skipped without looking inside
+    def changes(self, other):
+        return _diff(self._root, other._root, 0)
+
+    def __repr__(self):
+        return f'PersistentMap({dict(self.items())!r})'
+
+_MISSING = object()
+
+# a node (or single entry) holding entries, which all agree on the hash bits below shift
+def _build(entries, shift):
+    if len(entries) == 1:
+        return entries[0]
+    if shift >= HASH_LIMIT:
+        return _Collision(entries[0][0], tuple(entries))
+    groups = {}
+    for entry in entries:
+        groups.setdefault((entry[0] >> shift) & HASH_MASK, []).append(entry)
+    bitmap = 0
+    for index in groups:
+        bitmap |= 1 << index
+    return _Node(bitmap, tuple(_build(groups[index], shift + HASH_BITS) for index in sorted(groups)))
+
+# node with entry added or replaced, and 1 if it was added; node itself when nothing changes
+def _assoc(node, shift, entry):
+    bit = 1 << ((entry[0] >> shift) & HASH_MASK)
+    position = (node.bitmap & (bit - 1)).bit_count()
+    if not node.bitmap & bit:
+        return _Node(node.bitmap | bit, node.children[:position] + (entry,) + node.children[position:]), 1
+    child = node.children[position]
+    if type(child) is tuple:
+        if child[1] == entry[1]:
+            if child[2] is entry[2]:
+                return node, 0
+            replaced, added = entry, 0
+        else:
+            replaced, added = _build([child, entry], shift + HASH_BITS), 1
+    elif type(child) is _Collision:
+        if child.hash != entry[0]:
+            replaced, added = _assoc(_Node(1 << ((child.hash >> (shift + HASH_BITS)) & HASH_MASK), (child,)), shift + HASH_BITS, entry)
+        else:
+            others = tuple(other for other in child.entries if other[1] != entry[1])
+            replaced, added = _Collision(child.hash, others + (entry,)), int(len(others) == len(child.entries))
+    else:
+        replaced, added = _assoc(child, shift + HASH_BITS, entry)
+        if replaced is child:
+            return node, 0
+    return _Node(node.bitmap, node.children[:position] + (replaced,) + node.children[position + 1:]), added
+
+# node without key, None when that leaves it empty; node itself when key is not there
+def _dissoc(node, shift, keyHash, key):
+    bit = 1 << ((keyHash >> shift) & HASH_MASK)
+    if not node.bitmap & bit:
+        return node
+    position = (node.bitmap & (bit - 1)).bit_count()
+    child = node.children[position]
+    if type(child) is tuple:
+        if child[1] != key:
+            return node
+        replaced = None
+    elif type(child) is _Collision:
+        others = tuple(entry for entry in child.entries if entry[1] != key)
+        if len(others) == len(child.entries):
+            return node
+        replaced = others[0] if len(others) == 1 else _Collision(child.hash, others)
+    else:
+        replaced = _dissoc(child, shift + HASH_BITS, keyHash, key)
+        if replaced is child:
+            return node
+        if type(replaced) is _Node and len(replaced.children) == 1 and type(replaced.children[0]) is not _Node:
+            replaced = replaced.children[0] # a lone entry moves up, so equal contents keep one shape
+    if replaced is None:
+        if len(node.children) == 1:
+            return None
+        return _Node(node.bitmap & ~bit, node.children[:position] + node.children[position + 1:])
+    return _Node(node.bitmap, node.children[:position] + (replaced,) + node.children[position + 1:])
+
+# every (hash, key, value) under child, a node, a collision or a single entry
+def _entries(child):
+    if type(child) is tuple:
+        yield child
+        return
+    if type(child) is _Collision:
+        yield from child.entries
+        return
+    stack = [iter(child.children)]
+    while stack:
+        for item in stack[-1]:
+            if type(item) is tuple:
+                yield item
+            elif type(item) is _Collision:
+                yield from item.entries
+            else:
+                stack.append(iter(item.children))
+                break
+        else:
+            stack.pop()
+
+# (key, old value or None, new value or None) for the entries that differ between old and new, children of the same level
+def _diff(old, new, shift):
+    if old is new:
+        return
+    if type(old) is _Node and type(new) is _Node:
+        for index in range(1 << HASH_BITS):
+            bit = 1 << index
+            oldChild = old.children[(old.bitmap & (bit - 1)).bit_count()] if old.bitmap & bit else None
+            newChild = new.children[(new.bitmap & (bit - 1)).bit_count()] if new.bitmap & bit else None
+            if oldChild is not newChild:
+                yield from _diff(oldChild, newChild, shift + HASH_BITS)
+        return
+    oldEntries = {entry[1]: entry[2] for entry in _entries(old)} if old is not None else {}
+    newEntries = {entry[1]: entry[2] for entry in _entries(new)} if new is not None else {}
+    for key, value in oldEntries.items():
+        if newEntries.get(key, _MISSING) is not value:
+            yield key, value, newEntries.get(key)
+    for key, value in newEntries.items():
+        if key not in oldEntries:
+            yield key, None, value
+
+_REMOVED = object() # change map value of a key removed since the base was taken
+
+# CollectionVersion - one version of a collection: base (a dict nobody changes) with the changes since on top
+class CollectionVersion:
+    __slots__ = ('_base', '_token', '_origin', '_changes', '_length')
+
+    # origin is the version the collection was at before, with changed the keys changed since, when it is known
+    def __init__(self, collection = None, origin = None, changed = ()):
+        self._base = dict(collection) if collection is not None else {}
+        self._token = object() # stands for the base in later versions' _origin without keeping it alive
+        self._origin = (origin._token, frozenset(changed).union(origin._changes)) if origin is not None else None
+        self._changes = PersistentMap()
+        self._length = len(self._base)
+
+    @classmethod
+    def _make(cls, version, changes, length):
+        made = cls.__new__(cls)
+        made._base, made._token, made._origin = version._base, version._token, version._origin
+        made._changes, made._length = changes, length
+        return made
+
+    def __len__(self):
+        return self._length
+
+    # how many changes sit on top of the base
+    def depth(self):
+        return len(self._changes)
+
+    def get(self, key, default = None):
+        value = self._changes.get(key, _MISSING)
+        if value is _MISSING:
+            return self._base.get(key, default)
+        return default if value is _REMOVED else value
+
+    def items(self):
+        for key, value in self._base.items():
+            changed = self._changes.get(key, _MISSING)
+            if changed is _MISSING:
+                yield key, value
+            elif changed is not _REMOVED:
+                yield key, changed
+        for key, value in self._changes.items():
+            if value is not _REMOVED and key not in self._base:
+                yield key, value
+
+    def set(self, key, value):
+        if self.get(key, _MISSING) is value:
+            return self
+        added = self.get(key, _MISSING) is _MISSING
+        changes = self._changes.remove(key) if self._base.get(key, _MISSING) is value else self._changes.set(key, value)
+        return CollectionVersion._make(self, changes, self._length + added)
+
+    def remove(self, key):
+        if self.get(key, _MISSING) is _MISSING:
+            return self
+        changes = self._changes.set(key, _REMOVED) if key in self._base else self._changes.remove(key)
+        return CollectionVersion._make(self, changes, self._length - 1)
+
+    # (key, value here or None, value in other or None) for every key that differs; versions with the same base compare
+    # their change maps only, a version whose base was taken from the other's base adds the keys changed in between,
+    # and only unrelated versions read every key
+    def changes(self, other):
+        if self._base is other._base:
+            keys = (key for key, mine, theirs in self._changes.changes(other._changes))
+        elif self._origin is not None and self._origin[0] is other._token:
+            keys = self._origin[1].union(self._changes, other._changes)
+        elif other._origin is not None and other._origin[0] is self._token:
+            keys = other._origin[1].union(self._changes, other._changes)
+        else:
+            keys = set(key for key, value in self.items()) | set(key for key, value in other.items())
+        for key in keys:
+            mine, theirs = self.get(key), other.get(key)
+            if mine is not theirs:
+                yield key, mine, theirs
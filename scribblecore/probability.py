@@ -0,0 +1,226 @@
+'''
+Scribble dice odds - exact probability distributions for dice expressions
+
+Distributions are built by convolving the distribution of a single die.
+Every group ('8d6', '4d6kh3', ...) is cached, so '8d6' followed by '8d6+5' reuses the work of the first.
+Groups too big to work out in a moment (about EXACT_WORK steps, e.g. 1000d20) are approximated instead: many dice
+summed follow a normal curve, anything else is simulated. Such a Distribution has exact set to False.
+'''
+import math # binomial coefficients and square roots
+import random # simulated rolls for groups too big to work out exactly
+from functools import lru_cache # the bounded caches of group distributions
+from itertools import accumulate # cumulative weights of a die's faces for simulated rolls
+
+from .dice import parseDice
+
+PMF_CACHE_SIZE = 256 # distributions kept per cache
+EXPLODE_CUTOFF = 1e-12 # exploding chains less likely than this are left out
+CHART_CUTOFF = 1e-5 # totals less likely than this at either end are not charted
+EXACT_WORK = 4000000 # about how many multiplications a group may take to work out exactly, bigger ones are approximated
+NORMAL_COUNT = 30 # a group this many dice or more, summed, is approximated by a normal curve; smaller ones are simulated
+NORMAL_SIGMAS = 8 # the normal curve is cut off this many standard deviations from its mean
+SIMULATION_WORK = 1000000 # dice rolled to simulate one group
+SIMULATION_ROLLS = 200 # the fewest simulated rolls of a group, however many dice it has
+SIMULATION_SEED = 0 # the same expression always shows the same simulated odds
+
+# Distribution - chance of every total of a dice expression
+class Distribution:
+    __slots__ = ('offset', 'probs', 'exact')
+
+    def __init__(self, offset, probs, exact = True):
+        self.offset = offset # the lowest total
+        self.probs = probs # probs[i] is the chance of rolling offset + i
+        self.exact = exact # False when part of it was approximated or simulated
+
+    # [(total, chance)] for every total that can happen
+    def items(self):
+        return [(self.offset + index, prob) for index, prob in enumerate(self.probs) if prob > 0]
+
+    def mean(self):
+        return sum((self.offset + index) * prob for index, prob in enumerate(self.probs))
+
+    def variance(self):
+        mean = self.mean()
+        return sum((self.offset + index - mean) ** 2 * prob for index, prob in enumerate(self.probs))
+
+    def stdev(self):
+        return math.sqrt(self.variance())
+
+    # chance of rolling dc or higher, e.g. to beat a save or hit an armor class
+    def chanceAtLeast(self, dc):
+        start = max(0, dc - self.offset)
+        return sum(self.probs[start:])
+
+# adds two independent distributions, each given as (offset, probs)
+def _convolve(a, b):
+    offsetA, probsA = a
+    offsetB, probsB = b
+    out = [0.0] * (len(probsA) + len(probsB) - 1)
+    for i, x in enumerate(probsA):
+        if x:
+            for j, y in enumerate(probsB):
+                out[i + j] += x * y
+    return (offsetA + offsetB, tuple(out))
+
+# one die after its reroll and explosion rules, as (offset, probs)
+@lru_cache(maxsize = PMF_CACHE_SIZE)
+def _diePmf(sides, reroll, explode):
+    single = 1.0 / sides
+    first = [0.0] * (sides + 1) # index is the face
+    for face in range(1, sides + 1):
+        first[face] = single * (face > reroll) + (reroll * single) * single # rerolled faces are re-rolled once
+    if not explode or sides == 1:
+        return (1, tuple(first[1:]))
+    # a max roll adds another (plain) die, which can explode again; chains below EXPLODE_CUTOFF are dropped
+    depth = max(1, math.ceil(math.log(EXPLODE_CUTOFF) / math.log(single)))
+    chain = [0.0] * (sides * (depth + 1) + 1)
+    weight = 1.0
+    for level in range(depth + 1):
+        faces = first if level == 0 else [0.0] + [single] * sides
+        base = level * sides
+        for face in range(1, sides):
+            chain[base + face] += weight * faces[face]
+        weight *= faces[sides]
+    return (1, tuple(chain[1:]))
+
+# the sum of count identical dice, halving the work each step; every step is cached and reused
+@lru_cache(maxsize = PMF_CACHE_SIZE)
+def _sumPmf(sides, reroll, explode, count):
+    if count == 0:
+        return (0, (1.0,))
+    if count == 1:
+        return _diePmf(sides, reroll, explode)
+    half = _sumPmf(sides, reroll, explode, count // 2)
+    total = _convolve(half, half)
+    if count % 2:
+        total = _convolve(total, _diePmf(sides, reroll, explode))
+    return total
+
+# keep the best keep of count dice: walk the faces from best to worst deciding how many dice show each face,
+# the first keep dice placed are the kept ones
+@lru_cache(maxsize = PMF_CACHE_SIZE)
+def _keepPmf(sides, reroll, explode, count, keep, keepHighest):
+    offset, probs = _diePmf(sides, reroll, explode)
+    faces = [(offset + index, prob) for index, prob in enumerate(probs) if prob > 0]
+    if keepHighest:
+        faces.reverse()
+    states = {(0, 0): 1.0} # (dice placed, kept total) -> probability
+    for face, prob in faces:
+        powers = [prob ** j for j in range(count + 1)]
+        nextStates = {}
+        for (placed, kept), weight in states.items():
+            remaining = count - placed
+            for j in range(remaining + 1):
+                keptHere = max(0, min(j, keep - placed))
+                state = (placed + j, kept + keptHere * face)
+                nextStates[state] = nextStates.get(state, 0.0) + weight * math.comb(remaining, j) * powers[j]
+        states = nextStates
+    totals = {}
+    for (placed, kept), weight in states.items():
+        if placed == count:
+            totals[kept] = totals.get(kept, 0.0) + weight
+    low = min(totals)
+    out = [0.0] * (max(totals) - low + 1)
+    for kept, weight in totals.items():
+        out[kept - low] = weight
+    return (low, tuple(out))
+
+# about how many multiplications working out group exactly takes
+def _exactWork(group):
+    span = len(_diePmf(group.sides, group.reroll, group.explode)[1])
+    if group.keep >= group.count:
+        return (group.count * span) ** 2 // 3 # the last convolution of two halves, and the ever smaller ones before it
+    return span * group.count ** 2 * group.keep * span # faces * dice placed * kept totals
+
+# distribution of one dice group with its modifiers, as (offset, probs, exact)
+def _groupPmf(group):
+    if _exactWork(group) > EXACT_WORK:
+        if group.keep >= group.count and group.count >= NORMAL_COUNT:
+            return _normalPmf(group.sides, group.reroll, group.explode, group.count) + (False,)
+        return _simulatedPmf(group.sides, group.reroll, group.explode, group.count, group.keep, group.keepHighest) + (False,)
+    if group.keep >= group.count:
+        return _sumPmf(group.sides, group.reroll, group.explode, group.count) + (True,)
+    return _keepPmf(group.sides, group.reroll, group.explode, group.count, group.keep, group.keepHighest) + (True,)
+
+# mean and variance of (offset, probs)
+def _moments(pmf):
+    offset, probs = pmf
+    mean = sum((offset + index) * prob for index, prob in enumerate(probs))
+    return mean, sum((offset + index - mean) ** 2 * prob for index, prob in enumerate(probs))
+
+# a normal curve with mean and variance over the whole totals from low to high, as (offset, probs)
+def _normal(mean, variance, low, high):
+    if variance <= 0:
+        return (round(mean), (1.0,))
+    scale = math.sqrt(2 * variance)
+    spread = NORMAL_SIGMAS * math.sqrt(variance)
+    low, high = max(low, math.floor(mean - spread)), min(high, math.ceil(mean + spread))
+    cdf = [math.erf((total - 0.5 - mean) / scale) for total in range(low, high + 2)]
+    probs = [upper - lower for lower, upper in zip(cdf, cdf[1:])]
+    norm = sum(probs)
+    return (low, tuple(prob / norm for prob in probs))
+
+# the sum of many dice, by the central limit theorem
+@lru_cache(maxsize = PMF_CACHE_SIZE)
+def _normalPmf(sides, reroll, explode, count):
+    offset, probs = _diePmf(sides, reroll, explode)
+    mean, variance = _moments((offset, probs))
+    return _normal(mean * count, variance * count, offset * count, (offset + len(probs) - 1) * count)
+
+# the group rolled over and over, seeded so the odds shown do not change
+@lru_cache(maxsize = PMF_CACHE_SIZE)
+def _simulatedPmf(sides, reroll, explode, count, keep, keepHighest):
+    offset, probs = _diePmf(sides, reroll, explode)
+    faces = range(offset, offset + len(probs))
+    weights = list(accumulate(probs))
+    rng = random.Random(SIMULATION_SEED)
+    rolls = max(SIMULATION_ROLLS, SIMULATION_WORK // count)
+    rolled = rng.choices(faces, cum_weights = weights, k = rolls * count)
+    counts = {}
+    for start in range(0, len(rolled), count):
+        dice = rolled[start:start + count]
+        if keep < count:
+            dice.sort(reverse = keepHighest)
+            dice = dice[:keep]
+        total = sum(dice)
+        counts[total] = counts.get(total, 0) + 1
+    low = min(counts)
+    out = [0.0] * (max(counts) - low + 1)
+    for total, count in counts.items():
+        out[total - low] = count / rolls
+    return (low, tuple(out))
+
+# distribution of a dice expression (text or DiceExpression), e.g. distribution('4d6kh3+2').chanceAtLeast(15);
+# exact unless a group is too big for that, see EXACT_WORK
+def distribution(expression):
+    expression = parseDice(expression) if isinstance(expression, str) else expression
+    total = (expression.modifier, (1.0,))
+    exact = True
+    for sign, group in expression.groups:
+        offset, probs, groupExact = _groupPmf(group)
+        exact = exact and groupExact
+        if sign < 0:
+            offset, probs = -(offset + len(probs) - 1), tuple(reversed(probs))
+        if len(total[1]) * len(probs) > EXACT_WORK: # two wide groups, add them up as normal curves
+            (meanA, varianceA), (meanB, varianceB) = _moments(total), _moments((offset, probs))
+            total = _normal(meanA + meanB, varianceA + varianceB, total[0] + offset, total[0] + offset + len(total[1]) + len(probs) - 2)
+            exact = False
+        else:
+            total = _convolve(total, (offset, probs))
+    return Distribution(total[0], total[1], exact)
+
+# text bar chart of a distribution, totals are grouped into at most maxRows rows and near-impossible tails are left off
+def formatDistribution(dist, width = 40, maxRows = 30):
+    items = dist.items()
+    likely = [index for index, (total, prob) in enumerate(items) if prob >= CHART_CUTOFF]
+    if likely:
+        items = items[likely[0]:likely[-1] + 1]
+    size = max(1, math.ceil(len(items) / maxRows))
+    rows = []
+    for start in range(0, len(items), size):
+        chunk = items[start:start + size]
+        low, high = chunk[0][0], chunk[-1][0]
+        rows.append((str(low) if low == high else f'{low}-{high}', sum(prob for total, prob in chunk)))
+    peak = max(prob for label, prob in rows)
+    labelWidth = max(len(label) for label, prob in rows)
+    return [f'{label.rjust(labelWidth)} {prob * 100:6.2f}% ' + '#' * round(prob / peak * width) for label, prob in rows]
@@ -0,0 +1,332 @@
+'''
+Scribble queries - filter and sort a database by its fields from the Search panel
+
+    enemies where dexterity >= 14 and health < 50 order by strength desc limit 20
+    inventory where key = Key and count > 0
+    enemies where (str > 15 or dex > 15) and not desc contains dragon order by name
+
+Fields are name, desc, count, activeOrPassive, key and the Stats fields (hp, str, dex, con, int, wis, cha work too).
+Every condition is checked against a whole column at once, and fields that get filtered often get a sorted index.
+Columns and indexes follow edits made through the store row by row, so a query after an edit does not rebuild them.
+'''
+import re # split a query into words, numbers and operators
+import bisect # range lookups in the sorted indexes
+import heapq # order by ... limit without sorting every match
+import operator # the comparisons, applied over whole columns with map
+from itertools import repeat, compress # column-at-a-time predicates
+
+from . import instrument
+from .columns import FIELDS, NUMBER_FIELDS, MISSING, ColumnCache
+from .config import INVENTORY_JSON, ENEMY_JSON, LOCATION_JSON
+
+INDEX_AFTER = 3 # build a sorted index for a field once it has been filtered on this many times
+FIELD_ALIASES = {'hp': 'health', 'str': 'strength', 'dex': 'dexterity', 'con': 'constitution', 'int': 'intelligence',
+                 'wis': 'wisdom', 'cha': 'charisma', 'description': 'desc', 'type': 'activeOrPassive'}
+COMPARISONS = {'=': operator.eq, '==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le,
+               '>': operator.gt, '>=': operator.ge}
+TOKEN_PATTERN = re.compile(r'\s*(?:(-?\d+)|\'([^\']*)\'|"([^"]*)"|(<=|>=|!=|==|=|<|>)|([()])|([\w.]+))')
+QUERY_PATTERN = re.compile(r'^\s*([\w.]+)\s+(where|order|limit)\b', re.IGNORECASE)
+
+# QueryEngine - runs queries against the store's collections through their columns
+class QueryEngine:
+    __columns = None # ColumnCache
+    __filterCounts = None # (fileName, field) -> how often it was filtered on
+    __indexes = None # (fileName, field) -> (columns it was built from, index)
+    __lock = None
+
+    def __init__(self, store):
+        self.__columns = ColumnCache(store)
+        self.__filterCounts = {}
+        self.__indexes = {}
+        self.__lock = store.lock()
+        self.__columns.addRowListener(self)
+
+    # runs query text, returns [(fileName, record)]; raises ValueError when the query cannot be read
+    def run(self, text):
+        with self.__lock:
+            fileName, columns, rows = self.select(text)
+            return [(fileName, columns.row(index)) for index in rows]
+
+    # runs query text, returns (fileName, [store key]) of the matches, which stay valid when the collection is edited
+    def selectKeys(self, text):
+        with self.__lock:
+            fileName, columns, rows = self.select(text)
+            return fileName, self.__columns.keys(fileName, rows)
+
+    # runs query text, returns (fileName, columns, [row]) so the caller can turn only the rows it needs into records;
+    # the rows hold those records until the collection is next edited, hold store.lock() while reading them
+    @instrument.timed('field query')
+    def select(self, text):
+        parsed = _Parser(text).parse()
+        with self.__lock:
+            columns = self.__columns.get(parsed['fileName'])
+            rows = range(len(columns))
+            if parsed['where'] is not None:
+                mask = self.__evaluate(parsed['fileName'], columns, parsed['where'])
+                rows = list(compress(rows, mask))
+            return parsed['fileName'], columns, _orderRows(columns, rows, parsed['orderBy'], parsed['descending'], parsed['limit'])
+
+    # turns a condition tree into a bytearray with a 1 for every matching row
+    def __evaluate(self, fileName, columns, node):
+        kind = node[0]
+        if kind == 'and':
+            return bytearray(map(operator.and_, self.__evaluate(fileName, columns, node[1]), self.__evaluate(fileName, columns, node[2])))
+        if kind == 'or':
+            return bytearray(map(operator.or_, self.__evaluate(fileName, columns, node[1]), self.__evaluate(fileName, columns, node[2])))
+        if kind == 'not':
+            return bytearray(map(operator.xor, self.__evaluate(fileName, columns, node[1]), repeat(1)))
+        field, op, value = node[1], node[2], node[3]
+        self.__filterCounts[(fileName, field)] = self.__filterCounts.get((fileName, field), 0) + 1
+        index = self.__index(fileName, columns, field)
+        if index is not None and op != '!=' and op != 'contains':
+            return index.match(len(columns), op, value)
+        return _scan(columns, field, op, value)
+
+    # the index for field, built once it has been filtered on INDEX_AFTER times and rebuilt when the columns are
+    def __index(self, fileName, columns, field):
+        if self.__filterCounts[(fileName, field)] < INDEX_AFTER:
+            return None
+        built = self.__indexes.get((fileName, field))
+        if built is None or built[0] is not columns:
+            built = (columns, ColumnIndex(columns, field))
+            self.__indexes[(fileName, field)] = built
+        return built[1]
+
+    # column cache listener: take the rows out of fileName's indexes before they change
+    def rowsChanging(self, fileName, columns, rows):
+        for index in self.__builtIndexes(fileName, columns):
+            for row in rows:
+                index.dropRow(columns, row)
+
+    # column cache listener: put the changed rows back in
+    def rowsChanged(self, fileName, columns, rows):
+        for index in self.__builtIndexes(fileName, columns):
+            for row in rows:
+                index.addRow(columns, row)
+
+    def __builtIndexes(self, fileName, columns):
+        return [index for (indexFile, field), (built, index) in self.__indexes.items() if indexFile == fileName and built is columns]
+
+# ColumnIndex - one column's row numbers sorted by value, so a comparison becomes two binary searches
+class ColumnIndex:
+    __keys = None # sorted values (numbers, or lowercased text)
+    __rows = None # row numbers in the same order
+    __field = None
+
+    def __init__(self, columns, field):
+        self.__field = field
+        column = columns.column(field)
+        if field in NUMBER_FIELDS:
+            rows = [index for index, value in enumerate(column) if value != MISSING]
+            keys = column
+        else:
+            rows = [index for index, value in enumerate(column) if isinstance(value, str)]
+            keys = [value.lower() if isinstance(value, str) else None for value in column]
+        rows.sort(key = keys.__getitem__)
+        self.__rows = rows
+        self.__keys = [keys[index] for index in rows]
+
+    # bytearray of rows where value op the query value holds
+    def match(self, length, op, value):
+        value = value.lower() if isinstance(value, str) else value
+        low = bisect.bisect_left(self.__keys, value)
+        high = bisect.bisect_right(self.__keys, value)
+        start, end = {'=': (low, high), '==': (low, high), '<': (0, low), '<=': (0, high),
+                      '>': (high, len(self.__keys)), '>=': (low, len(self.__keys))}[op]
+        mask = bytearray(length)
+        for index in self.__rows[start:end]:
+            mask[index] = 1
+        return mask
+
+    # take row out of the index, by the value columns holds for it now
+    def dropRow(self, columns, row):
+        key = self.__key(columns, row)
+        if key is None:
+            return
+        position = bisect.bisect_left(self.__keys, key)
+        while self.__rows[position] != row:
+            position += 1
+        del self.__keys[position]
+        del self.__rows[position]
+
+    # put row in the index, by the value columns holds for it now
+    def addRow(self, columns, row):
+        key = self.__key(columns, row)
+        if key is None:
+            return
+        position = bisect.bisect_right(self.__keys, key)
+        self.__keys.insert(position, key)
+        self.__rows.insert(position, row)
+
+    # the sort key of row, None when it has no value and is left out
+    def __key(self, columns, row):
+        value = columns.column(self.__field)[row]
+        if self.__field in NUMBER_FIELDS:
+            return value if value != MISSING else None
+        return value.lower() if isinstance(value, str) else None
+
+# _Parser - recursive descent over the query text; 'and' binds tighter than 'or'
+class _Parser:
+    __tokens = None
+    __position = 0
+    __text = None
+
+    def __init__(self, text):
+        self.__text = text
+        self.__tokens = []
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            match = TOKEN_PATTERN.match(text, position)
+            if match is None or match.end() == position:
+                raise ValueError(f'Could not read the query near "{text[position:]}"')
+            number, single, double, op, paren, word = match.groups()
+            if number is not None:
+                self.__tokens.append(('value', int(number)))
+            elif single is not None or double is not None:
+                self.__tokens.append(('value', single if single is not None else double))
+            elif op is not None or paren is not None:
+                self.__tokens.append(('symbol', op or paren))
+            else:
+                self.__tokens.append(('word', word))
+            position = match.end()
+
+    def __peek(self):
+        return self.__tokens[self.__position] if self.__position < len(self.__tokens) else (None, None)
+
+    def __next(self):
+        token = self.__peek()
+        self.__position += 1
+        return token
+
+    def __keyword(self, *words):
+        kind, value = self.__peek()
+        if kind == 'word' and value.lower() in words:
+            self.__position += 1
+            return value.lower()
+        return None
+
+    def __expect(self, word):
+        if self.__keyword(word) is None:
+            raise ValueError(f'Expected "{word}" in "{self.__text}"')
+
+    def parse(self):
+        kind, collection = self.__next()
+        if kind != 'word':
+            raise ValueError('A query starts with the database to look in, e.g. "enemies where hp > 20"')
+        parsed = {'fileName': collection if collection.lower().endswith('.json') else collection + '.json',
+                  'where': None, 'orderBy': None, 'descending': False, 'limit': None}
+        if self.__keyword('where'):
+            parsed['where'] = self.__or()
+        if self.__keyword('order'):
+            self.__expect('by')
+            parsed['orderBy'] = self.__field()
+            parsed['descending'] = self.__keyword('asc', 'desc') == 'desc'
+        if self.__keyword('limit'):
+            kind, limit = self.__next()
+            if kind != 'value' or not isinstance(limit, int) or limit < 0:
+                raise ValueError('limit needs a whole number')
+            parsed['limit'] = limit
+        if self.__peek()[0] is not None:
+            raise ValueError(f'Did not understand "{self.__peek()[1]}" in "{self.__text}"')
+        return parsed
+
+    def __or(self):
+        node = self.__and()
+        while self.__keyword('or'):
+            node = ('or', node, self.__and())
+        return node
+
+    def __and(self):
+        node = self.__not()
+        while self.__keyword('and'):
+            node = ('and', node, self.__not())
+        return node
+
+    def __not(self):
+        if self.__keyword('not'):
+            return ('not', self.__not())
+        if self.__peek() == ('symbol', '('):
+            self.__next()
+            node = self.__or()
+            if self.__next() != ('symbol', ')'):
+                raise ValueError(f'Missing ")" in "{self.__text}"')
+            return node
+        return self.__comparison()
+
+    def __comparison(self):
+        field = self.__field()
+        if self.__keyword('contains'):
+            if field in NUMBER_FIELDS:
+                raise ValueError(f'{field} is a number, contains only works on text fields')
+            op = 'contains'
+        else:
+            kind, op = self.__next()
+            if kind != 'symbol' or op not in COMPARISONS:
+                raise ValueError(f'Expected a comparison like >= after {field}')
+        kind, value = self.__next()
+        if kind not in ('value', 'word'):
+            raise ValueError(f'Expected a value after {field} {op}')
+        if field in NUMBER_FIELDS and not isinstance(value, int):
+            raise ValueError(f'{field} is compared with whole numbers')
+        if field not in NUMBER_FIELDS:
+            value = str(value)
+        return ('compare', field, op, value)
+
+    def __field(self):
+        kind, word = self.__next()
+        if kind != 'word':
+            raise ValueError(f'Expected a field name in "{self.__text}"')
+        for field in FIELDS:
+            if field.lower() == word.lower():
+                return field
+        if word.lower() in FIELD_ALIASES:
+            return FIELD_ALIASES[word.lower()]
+        raise ValueError(f'Unknown field "{word}", use one of: {", ".join(FIELDS)}')
+
+# compares every value in a column at once, rows without a value never match
+def _scan(columns, field, op, value):
+    column = columns.column(field)
+    if field in NUMBER_FIELDS:
+        matches = bytearray(map(COMPARISONS[op], column, repeat(value)))
+        if op in ('<', '<=', '!='):
+            return bytearray(map(operator.and_, matches, map(operator.ne, column, repeat(MISSING))))
+        return matches
+    value = value.lower()
+    texts = [text.lower() if isinstance(text, str) else None for text in column]
+    if op == 'contains':
+        return bytearray(text is not None and value in text for text in texts)
+    present = bytearray(map(operator.is_not, texts, repeat(None)))
+    if op in ('=', '==', '!='):
+        return bytearray(map(operator.and_, present, map(COMPARISONS[op], texts, repeat(value))))
+    return bytearray(text is not None and COMPARISONS[op](text, value) for text in texts)
+
+# sorts the matching rows by field (rows without a value last); with a limit only the best rows are kept
+def _orderRows(columns, rows, field, descending, limit):
+    if field is None:
+        return list(rows)[:limit] if limit is not None else list(rows)
+    column = columns.column(field)
+    if field in NUMBER_FIELDS:
+        missing = [index for index in rows if column[index] == MISSING]
+        rows = [index for index in rows if column[index] != MISSING]
+        key = column.__getitem__
+    else:
+        missing = [index for index in rows if not isinstance(column[index], str)]
+        rows = [index for index in rows if isinstance(column[index], str)]
+        key = lambda index: column[index].lower()
+    if limit is not None and limit < len(rows):
+        ordered = (heapq.nlargest if descending else heapq.nsmallest)(limit, rows, key = key)
+    else:
+        ordered = sorted(rows, key = key, reverse = descending)
+    ordered += missing
+    return ordered[:limit] if limit is not None else ordered
+
+# True when text looks like a query on one of collectionNames (default the app's own databases), like 'enemies where ...',
+# rather than a name to search for: 'Holy order' is a name unless there is a holy.json
+def isQuery(text, collectionNames = None):
+    match = QUERY_PATTERN.match(text)
+    if match is None:
+        return False
+    names = {name.lower() for name in (collectionNames if collectionNames is not None else (INVENTORY_JSON, ENEMY_JSON, LOCATION_JSON))}
+    collection = match.group(1).lower()
+    return collection in names or collection + '.json' in names
@@ -0,0 +1,122 @@
+'''
+Scribble results - search results handed out a page at a time, for the Search panel's result table
+
+A ResultCursor keeps references to its matches (index keys, query rows, records still being streamed from a big database)
+and only turns the rows asked for into records and table cells, so a search matching thousands of records shows its
+first page right away. Sorting by a column reads that column once for every match and keeps only the new order.
+'''
+import threading # one page or sort at a time, pages are fetched by background jobs
+
+from . import instrument
+
+RESULT_COLUMNS = ('Database', 'Name', 'Count', 'Health', 'Description')
+RESULT_PAGE_ROWS = 100 # rows fetched and put in the table at a time
+DESC_WIDTH = 60 # description characters shown in the table, the full record is printed when a row is clicked
+
+# ResultCursor - the matches of one search; fetch(ref) turns a reference into (fileName, record), or None once it is gone
+class ResultCursor:
+    __fetch = None
+    __refs = None # references known so far, in the order they were found
+    __more = None # iterator over the references not read yet, None once it ran out
+    __order = None # positions in __refs in the sorted order, None while unsorted
+    __sortColumn = None
+    __descending = False
+    __lock = None
+
+    def __init__(self, fetch, refs = (), more = None):
+        self.__fetch = fetch
+        self.__refs = list(refs)
+        self.__more = iter(more) if more is not None else None
+        self.__lock = threading.Lock()
+
+    # matches found so far; the final count once complete() is True
+    def count(self):
+        with self.__lock:
+            return len(self.__refs)
+
+    # True when every match has been found
+    def complete(self):
+        with self.__lock:
+            return self.__more is None
+
+    # every match, reading the rest of a streamed search if needed
+    def total(self):
+        with self.__lock:
+            self.__read(None)
+            return len(self.__refs)
+
+    def sortColumn(self):
+        return self.__sortColumn, self.__descending
+
+    # table rows for the matches from start on, at most count of them; a match deleted since the search shows as gone
+    @instrument.timed('result page')
+    def rows(self, start, count = RESULT_PAGE_ROWS):
+        return [formatRow(*found) if found is not None else ['', '(deleted)', '', '', ''] for found in self.results(start, count)]
+
+    # [(fileName, record) or None] for the matches from start on, at most count of them
+    def results(self, start, count = RESULT_PAGE_ROWS):
+        with self.__lock:
+            if self.__order is None:
+                self.__read(start + count)
+                refs = self.__refs[start:start + count]
+            else:
+                refs = [self.__refs[position] for position in self.__order[start:start + count]]
+        return [self.__fetch(ref) for ref in refs]
+
+    # (fileName, record) of the match at index in the current order, None if there is none
+    def result(self, index):
+        found = self.results(index, 1) if index >= 0 else []
+        return found[0] if found else None
+
+    # order every match by column (one of RESULT_COLUMNS), matches without a value last either way
+    @instrument.timed('result sort')
+    def sort(self, column, descending = False):
+        if column not in RESULT_COLUMNS:
+            raise ValueError(f'Unknown column {column}, use one of {", ".join(RESULT_COLUMNS)}')
+        index = RESULT_COLUMNS.index(column)
+        with self.__lock:
+            self.__read(None)
+            keys = []
+            for ref in self.__refs:
+                found = self.__fetch(ref)
+                keys.append(_sortKey(_cells(*found)[index]) if found is not None else None)
+            present = [position for position, key in enumerate(keys) if key is not None]
+            present.sort(key = keys.__getitem__, reverse = descending)
+            self.__order = present + [position for position, key in enumerate(keys) if key is None]
+            self.__sortColumn, self.__descending = column, descending
+
+    # read references from the iterator until there are wanted of them, all of them if wanted is None
+    def __read(self, wanted):
+        while self.__more is not None and (wanted is None or len(self.__refs) < wanted):
+            ref = next(self.__more, None)
+            if ref is None:
+                self.__more = None
+            else:
+                self.__refs.append(ref)
+
+# the table cells of one match, in RESULT_COLUMNS order
+def formatRow(fileName, record):
+    cells = _cells(fileName, record)
+    desc = cells[4] if cells[4] is not None else ''
+    return [cells[0], cells[1] or '', _text(cells[2]), _text(cells[3]), desc if len(desc) <= DESC_WIDTH else desc[:DESC_WIDTH - 3] + '...']
+
+# the values behind the cells of one match, None where the record has nothing
+def _cells(fileName, record):
+    stats = record.get('stats') if isinstance(record.get('stats'), dict) else record
+    desc = record.get('desc')
+    return [fileName, record.get('name'), record.get('count'), stats.get('health'), str(desc) if desc is not None else None]
+
+# numbers (also counts saved as text) before and apart from words, words without case; None when there is nothing to sort by
+def _sortKey(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, value, '')
+    text = str(value)
+    try:
+        return (0, int(text), '')
+    except ValueError:
+        return (1, 0, text.lower())
+
+def _text(value):
+    return '' if value is None else str(value)
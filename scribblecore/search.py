@@ -0,0 +1,155 @@
+'''
+Scribble search - finds records by name and description across every campaign database
+'''
+import json # library needed for .json parsing and manipulation
+import re # split names and descriptions into words for the search index
+
+from . import instrument
+from .storage import normalizeName
+
+SEARCH_INDEX_FILE = '.scribble_index.json' # hidden, so it is not picked up as a database itself
+NAME_WEIGHT = 3 # a search word found in a name counts more than one found in a description
+DESC_WEIGHT = 1
+EXACT_NAME_BONUS = 10 # the whole search matches the name exactly
+
+# SearchIndex - inverted index of the words in every database's names and descriptions
+# only files whose store signature changed are re-indexed, and edits made through the store are applied record by record
+class SearchIndex:
+    __store = None
+    __path = None
+    __files = None # fileName -> {'signature': store signature, 'docs': {key: [name words, desc words]}}
+    __postings = None # word -> {(fileName, key): weight}
+    __changed = False # True when the index differs from what is saved in __path
+    __lock = None
+    __skip = None # skip(fileName) is True for databases that are not indexed, e.g. ones too big to load
+
+    def __init__(self, store, path = SEARCH_INDEX_FILE, skip = None):
+        self.__store = store
+        self.__path = path
+        self.__skip = skip
+        self.__files = {}
+        self.__postings = {}
+        self.__lock = store.lock() # share the store's lock so store and index always lock in the same order
+        self.__load()
+        store.addListener(self)
+
+    # read the index saved by a previous run, an unreadable index is simply rebuilt
+    def __load(self):
+        try:
+            with open(self.__path, 'r') as indexFile:
+                saved = json.load(indexFile)
+            files = saved['files']
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        for fileName, entry in files.items():
+            self.__files[fileName] = {'signature': entry['signature'], 'docs': {}}
+            for key, (nameWords, descWords) in entry['docs'].items():
+                self.__addDoc(fileName, key, nameWords, descWords)
+
+    def __addDoc(self, fileName, key, nameWords, descWords):
+        self.__files[fileName]['docs'][key] = [nameWords, descWords]
+        for word in nameWords:
+            postings = self.__postings.setdefault(word, {})
+            postings[(fileName, key)] = postings.get((fileName, key), 0) + NAME_WEIGHT
+        for word in descWords:
+            postings = self.__postings.setdefault(word, {})
+            postings[(fileName, key)] = postings.get((fileName, key), 0) + DESC_WEIGHT
+
+    def __removeDoc(self, fileName, key):
+        doc = self.__files[fileName]['docs'].pop(key, None)
+        if doc is None:
+            return
+        for word in set(doc[0]) | set(doc[1]):
+            postings = self.__postings.get(word)
+            if postings is not None:
+                postings.pop((fileName, key), None)
+                if not postings:
+                    del self.__postings[word]
+
+    def __dropFile(self, fileName):
+        for key in list(self.__files[fileName]['docs']):
+            self.__removeDoc(fileName, key)
+        del self.__files[fileName]
+        self.__changed = True
+
+    def __indexFile(self, fileName, signature):
+        if fileName in self.__files:
+            self.__dropFile(fileName)
+        self.__files[fileName] = {'signature': signature, 'docs': {}}
+        for key, record in self.__store.items(fileName):
+            self.__addDoc(fileName, key, _tokenize(record.get('name', '')), _tokenize(record.get('desc', '')))
+        self.__changed = True
+
+    # re-index the databases that were added, removed or changed on disk since the last refresh
+    @instrument.timed('search refresh')
+    def refresh(self):
+        with self.__lock:
+            fileNames = [fileName for fileName in self.__store.collectionNames() if self.__skip is None or not self.__skip(fileName)]
+            for fileName in set(self.__files) - set(fileNames):
+                self.__dropFile(fileName)
+            for fileName in fileNames:
+                signature = _plainSignature(self.__store.signature(fileName))
+                entry = self.__files.get(fileName)
+                if entry is None or entry['signature'] != signature:
+                    self.__indexFile(fileName, signature)
+
+    # returns [(fileName, record)] for every record whose name or description holds every word of find, best match first
+    def query(self, find):
+        results = []
+        for fileName, key in self.rank(find):
+            record = self.__store.get(fileName, key)
+            if record is not None:
+                results.append((fileName, record))
+        return results
+
+    # returns [(fileName, key)] for every record holding every word of find, best match first, without fetching the records
+    @instrument.timed('search query')
+    def rank(self, find):
+        words = set(_tokenize(find))
+        if not words:
+            return []
+        with self.__lock:
+            self.refresh()
+            postings = sorted((self.__postings.get(word, {}) for word in words), key = len) # rarest word first
+            scores = dict(postings[0])
+            for others in postings[1:]:
+                scores = {ref: score + others[ref] for ref, score in scores.items() if ref in others}
+            exactKey = normalizeName(find)
+            for ref in scores:
+                if ref[1] == exactKey:
+                    scores[ref] += EXACT_NAME_BONUS
+            return sorted(scores, key = lambda ref: (-scores[ref], ref))
+
+    # store listener: keep the index in step with edits made through the app
+    def recordChanged(self, fileName, key, record):
+        with self.__lock:
+            if fileName not in self.__files:
+                return
+            self.__removeDoc(fileName, key)
+            if record is not None:
+                self.__addDoc(fileName, key, _tokenize(record.get('name', '')), _tokenize(record.get('desc', '')))
+            self.__changed = True
+
+    # store listener: the file on disk now matches the index, so remember its new signature
+    def collectionSaved(self, fileName):
+        with self.__lock:
+            if fileName in self.__files:
+                self.__files[fileName]['signature'] = _plainSignature(self.__store.signature(fileName))
+                self.__changed = True
+
+    # write the index to disk so the next run only re-indexes files that changed
+    def save(self):
+        with self.__lock:
+            if not self.__changed:
+                return
+            with open(self.__path, 'w') as indexFile:
+                json.dump({'files': self.__files}, indexFile)
+            self.__changed = False
+
+# signatures as they come back from json, so a saved index compares equal to a fresh one
+def _plainSignature(signature):
+    return json.loads(json.dumps(signature))
+
+# splits text into lowercase words for the search index
+def _tokenize(text):
+    return re.findall(r'\w+', str(text).lower())
@@ -0,0 +1,745 @@
+'''
+Scribble storage - reading and writing the campaign databases
+
+A CampaignStore keeps every database in memory and hands changes to one of the backends:
+- JsonBackend: one .json file per database, rewritten on save
+- JournalBackend: the same .json files plus an append-only .journal per database
+- SqliteBackend: every database in one sqlite file
+'''
+import hashlib # stable keys for records that share a name
+import json # library needed for .json parsing and manipulation
+import os # interact with the file system and other operating system features
+import glob # search for files with a specific pattern
+import threading # background timer used to write changed databases back to disk
+import sqlite3 # optional database backend, selected in 'config.ini'
+from collections import deque # undo steps, the oldest fall off
+
+from . import instrument
+from .config import INVENTORY_JSON, ENEMY_JSON, LOCATION_JSON
+from .persistent import CollectionVersion
+
+FLUSH_DELAY = 2.0 # seconds to wait after a change before writing the database back to disk
+JOURNAL_SUFFIX = '.journal' # inventory.json changes are appended to inventory.json.journal
+COMPACTING_SUFFIX = '.compacting' # journal that is being folded into a new snapshot
+JOURNAL_COMPACT_BYTES = 1024 * 1024 # journal size that triggers a compaction
+SQLITE_DATABASE = 'scribble.db'
+UNDO_DEPTH = 100 # changes that can be undone
+BULK_CHANGE_SHARE = 16 # a batch bigger than 1/16 of its collection takes a new copy instead of one change per record
+REBASE_DEPTH = 1000 # changes a collection version can gather before a new copy is taken, if more than its records
+DUPLICATE_SEPARATOR = '\x00' # 'goblin\x00<hash>' keys the second Goblin of a database, see keyRecords
+
+# StorageBackend - how CampaignStore reads and writes databases, databases are always named like 'inventory.json'
+class StorageBackend:
+    rewritesAll = True # commit is given every record of the database, not only the changes
+
+    # returns every record saved in fileName
+    def load(self, fileName):
+        raise NotImplementedError
+
+    # returns ({key: record}, number of entries that are not records) for fileName, keys as in keyRecords
+    def loadKeyed(self, fileName):
+        return keyRecords(self.load(fileName))
+
+    # persist a batch of changes {key: record or None}; records is the full collection after the changes in save order,
+    # or None for backends whose rewritesAll is False
+    def commit(self, fileName, changes, records):
+        raise NotImplementedError
+
+    # value that changes whenever fileName is changed on disk, or None if it does not exist
+    def signature(self, fileName):
+        raise NotImplementedError
+
+    # names of every database this backend can see
+    def collectionNames(self):
+        raise NotImplementedError
+
+    # finish any outstanding work before the application exits
+    def close(self):
+        pass
+
+# JsonBackend - stores each database as a plain .json list through loadJsonFile/saveToJson, rewriting the whole file on every save
+class JsonBackend(StorageBackend):
+    def load(self, fileName):
+        return loadJsonFile(fileName)
+
+    def commit(self, fileName, changes, records):
+        saveToJson(records, fileName)
+
+    def signature(self, fileName):
+        return _fileSignature(fileName)
+
+    @instrument.timed('find databases')
+    def collectionNames(self):
+        jsonFiles = glob.glob(os.path.join(os.getcwd(), '*.json'))
+        return [os.path.basename(file) for file in jsonFiles]
+
+# JournalBackend - appends every change to fileName.journal as one JSON line instead of rewriting fileName
+# once the journal passes compactBytes it is folded back into fileName in a background thread,
+# so fileName stays a normal .json list that other tools can read (it lags behind until the next compaction)
+# Only the changes are handed over, the compaction reads the snapshot and the moved journal back from disk
+class JournalBackend(JsonBackend):
+    rewritesAll = False
+
+    __compactBytes = None
+    __compactions = None # fileName -> running compaction thread
+    __lastWritten = None # fileName -> disk signature right after our own last write
+    __stable = None # fileName -> signature we keep reporting while only we have touched the files
+    __lock = None
+
+    def __init__(self, compactBytes = JOURNAL_COMPACT_BYTES):
+        self.__compactBytes = compactBytes
+        self.__compactions = {}
+        self.__lastWritten = {}
+        self.__stable = {}
+        self.__lock = threading.RLock()
+
+    # (snapshot, journal, journal being compacted) signatures as they are on disk right now
+    def __diskSignature(self, fileName):
+        journalPath = fileName + JOURNAL_SUFFIX
+        return (_fileSignature(fileName), _fileSignature(journalPath), _fileSignature(journalPath + COMPACTING_SUFFIX))
+
+    # our own appends and compactions must not look like the files were edited outside the app
+    def __rememberOwnWrite(self, fileName):
+        self.__lastWritten[fileName] = self.__diskSignature(fileName)
+        self.__stable.setdefault(fileName, self.__lastWritten[fileName])
+
+    def load(self, fileName):
+        return list(self.loadKeyed(fileName)[0].values())
+
+    # snapshot first, then the journal being compacted (left over if we crashed mid-compaction), then the live journal;
+    # the journal entries name records by the keys the store had, which keyRecords gives the snapshot's records again.
+    # A running compaction is waited for outside the lock, it needs the lock itself to finish
+    def loadKeyed(self, fileName):
+        while True:
+            self.__waitForCompaction(fileName)
+            with self.__lock:
+                if self.__compacting(fileName):
+                    continue # a commit started another compaction meanwhile
+                collection, skipped = keyRecords(loadJsonFile(fileName))
+                journalPath = fileName + JOURNAL_SUFFIX
+                for path in (journalPath + COMPACTING_SUFFIX, journalPath):
+                    _replayJournal(path, collection)
+                self.__lastWritten[fileName] = self.__diskSignature(fileName)
+                self.__stable[fileName] = self.__lastWritten[fileName]
+                return collection, skipped
+
+    # one appended line per change and one fsync for the whole batch
+    @instrument.timed('journal commit')
+    def commit(self, fileName, changes, records):
+        if not changes:
+            return
+        with self.__lock:
+            journalPath = fileName + JOURNAL_SUFFIX
+            with open(journalPath, 'a') as journalFile:
+                for key, record in changes.items():
+                    if record is None:
+                        entry = {'op': 'remove', 'key': key}
+                    else:
+                        entry = {'op': 'put', 'key': key, 'record': record}
+                    journalFile.write(json.dumps(entry) + '\n')
+                instrument.countBytes('journal commit', journalFile.tell())
+                journalFile.flush()
+                os.fsync(journalFile.fileno())
+            if os.path.getsize(journalPath) >= self.__compactBytes:
+                self.__startCompaction(fileName)
+            self.__rememberOwnWrite(fileName)
+
+    # move the journal aside and fold it into a new snapshot in the background
+    def __startCompaction(self, fileName):
+        if self.__compacting(fileName):
+            return
+        journalPath = fileName + JOURNAL_SUFFIX
+        compactingPath = journalPath + COMPACTING_SUFFIX
+        if os.path.exists(compactingPath):
+            # an earlier compaction never finished, keep its entries in front of the new ones
+            with open(compactingPath, 'a') as compactingFile, open(journalPath, 'r') as journalFile:
+                compactingFile.write(journalFile.read())
+                compactingFile.flush()
+                os.fsync(compactingFile.fileno())
+            os.remove(journalPath)
+        else:
+            os.replace(journalPath, compactingPath)
+        thread = threading.Thread(target = self.__compact, args = (fileName,), daemon = True)
+        self.__compactions[fileName] = thread
+        thread.start()
+
+    # the old snapshot plus the moved journal is what the new snapshot holds, later changes stay in the live journal
+    def __compact(self, fileName):
+        compactingPath = fileName + JOURNAL_SUFFIX + COMPACTING_SUFFIX
+        collection, skipped = keyRecords(loadJsonFile(fileName))
+        _replayJournal(compactingPath, collection)
+        _writeJsonAtomic(_saveOrder(collection), fileName)
+        with self.__lock:
+            os.remove(compactingPath)
+            self.__rememberOwnWrite(fileName)
+
+    def __compacting(self, fileName):
+        thread = self.__compactions.get(fileName)
+        return thread is not None and thread.is_alive()
+
+    def __waitForCompaction(self, fileName):
+        thread = self.__compactions.get(fileName)
+        if thread is not None:
+            thread.join()
+
+    # stays the same across our own writes, changes when someone else edits the snapshot or journal
+    def signature(self, fileName):
+        with self.__lock:
+            disk = self.__diskSignature(fileName)
+            if fileName in self.__lastWritten and disk == self.__lastWritten[fileName]:
+                return self.__stable[fileName]
+            return disk
+
+    # databases that only exist as a journal so far count too
+    def collectionNames(self):
+        journals = glob.glob(os.path.join(os.getcwd(), '*.json' + JOURNAL_SUFFIX))
+        names = [os.path.basename(file)[:-len(JOURNAL_SUFFIX)] for file in journals]
+        return sorted(set(JsonBackend.collectionNames(self)) | set(names))
+
+    # let running compactions finish so no snapshot is left half written
+    def close(self):
+        for thread in list(self.__compactions.values()):
+            thread.join()
+
+# SqliteBackend - keeps every database in one sqlite file, one row per record
+# each batch of changes is a single transaction; the sql strings never change, so sqlite3 reuses the prepared statements
+class SqliteBackend(StorageBackend):
+    rewritesAll = False
+    __conn = None
+
+    def __init__(self, path = SQLITE_DATABASE):
+        self.__conn = sqlite3.connect(path, check_same_thread = False) # the write-behind timer commits from its own thread
+        self.__conn.execute('PRAGMA journal_mode = WAL') # readers (other copies of Scribble too) never block a commit
+        with self.__conn:
+            # type is the database the record belongs to ('inventory', 'enemies', ...), the primary key indexes it
+            self.__conn.execute('CREATE TABLE IF NOT EXISTS records (type TEXT NOT NULL, key TEXT NOT NULL, name TEXT NOT NULL, '
+                                'data TEXT NOT NULL, PRIMARY KEY (type, key))')
+            self.__conn.execute('CREATE INDEX IF NOT EXISTS records_name ON records (name COLLATE NOCASE)')
+            # bumped with every commit, so other copies of Scribble notice changes without comparing rows
+            self.__conn.execute('CREATE TABLE IF NOT EXISTS versions (type TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+
+    def load(self, fileName):
+        rows = self.__conn.execute('SELECT data FROM records WHERE type = ? ORDER BY rowid', (_collectionType(fileName),))
+        return [json.loads(data) for (data,) in rows]
+
+    # the keys are stored with the rows, no need to work them out again
+    def loadKeyed(self, fileName):
+        rows = self.__conn.execute('SELECT key, data FROM records WHERE type = ? ORDER BY rowid', (_collectionType(fileName),))
+        return {key: json.loads(data) for key, data in rows}, 0
+
+    @instrument.timed('sqlite commit')
+    def commit(self, fileName, changes, records):
+        collectionType = _collectionType(fileName)
+        puts = [(collectionType, key, str(record.get('name', '')), json.dumps(record)) for key, record in changes.items() if record is not None]
+        removes = [(collectionType, key) for key, record in changes.items() if record is None]
+        with self.__conn:
+            self.__conn.executemany('INSERT INTO records (type, key, name, data) VALUES (?, ?, ?, ?) '
+                                    'ON CONFLICT (type, key) DO UPDATE SET name = excluded.name, data = excluded.data', puts)
+            self.__conn.executemany('DELETE FROM records WHERE type = ? AND key = ?', removes)
+            self.__conn.execute('INSERT INTO versions (type, version) VALUES (?, 1) '
+                                'ON CONFLICT (type) DO UPDATE SET version = version + 1', (collectionType,))
+
+    def signature(self, fileName):
+        row = self.__conn.execute('SELECT version FROM versions WHERE type = ?', (_collectionType(fileName),)).fetchone()
+        return row[0] if row is not None else None
+
+    def collectionNames(self):
+        return [collectionType + '.json' for (collectionType,) in self.__conn.execute('SELECT type FROM versions')]
+
+    def close(self):
+        self.__conn.close()
+
+# CampaignStore - loads each database once and keeps it in memory, keyed by normalized name
+# changes are handed to the backend after FLUSH_DELAY seconds (write-behind) or when the store is closed
+# A database can hold several records with one name (older versions appended enemies) or records without a name: they
+# are kept under extra keys and saved back, get/upsert/adjustCount/remove by name use the first of them.
+# Undo steps and snapshots hold CollectionVersions of the collections, see scribblecore/persistent.py: a collection
+# gets one (a plain dict copy) the first time it is changed or snapshotted, and from then on every change updates both.
+# Records are never edited in place (adjustCount saves a changed copy), so old versions keep their old records.
+class CampaignStore:
+    __backend = None
+    __collections = None # fileName -> {key: record}, the key is the normalized name (see keyRecords for duplicates)
+    __duplicates = None # fileName -> {normalized name: [keys of the other records with that name]}
+    __unsaved = None # fileNames holding entries that are not records, never written back so those are not lost
+    __signatures = None # fileName -> backend signature when we last read or wrote it
+    __pending = None # fileName -> {key: record, or None if removed} not handed to the backend yet
+    __saving = None # fileNames whose changes are being written right now
+    __versions = None # fileName -> counter bumped on every change or reload, for caches built from a collection
+    __flushDelay = None
+    __timer = None
+    __scheduler = None # runs the flushes the write-behind timer asks for, see setFlushScheduler
+    __lock = None
+    __flushLock = None # one flush at a time, so batches reach the backend in order
+    __listeners = None # objects told about every record change, see addListener
+    __persistent = None # fileName -> CollectionVersion with the same records as its collection, once history needed it
+    __undo = None # deque of (label, {fileName: CollectionVersion before the change})
+    __redo = None # [(label, {fileName: CollectionVersion before the undo})]
+
+    def __init__(self, backend = None, flushDelay = FLUSH_DELAY):
+        self.__backend = backend if backend is not None else JsonBackend()
+        self.__collections = {}
+        self.__duplicates = {}
+        self.__unsaved = set()
+        self.__signatures = {}
+        self.__listeners = []
+        self.__pending = {}
+        self.__saving = set()
+        self.__versions = {}
+        self.__persistent = {}
+        self.__undo = deque(maxlen = UNDO_DEPTH)
+        self.__redo = []
+        self.__flushDelay = flushDelay
+        self.__lock = threading.RLock()
+        self.__flushLock = threading.Lock()
+
+    # returns the in-memory collection for fileName, (re)loading it if it is new or was edited outside the app
+    def __collection(self, fileName):
+        with self.__lock:
+            signature = self.__backend.signature(fileName)
+            if fileName in self.__collections:
+                if signature == self.__signatures[fileName]:
+                    return self.__collections[fileName]
+                if fileName in self.__saving:
+                    return self.__collections[fileName] # our own save is still being written
+                if fileName in self.__pending:
+                    print(f'{fileName} was changed outside of Scribble, keeping unsaved changes.')
+                    return self.__collections[fileName]
+            instrument.count('store (re)load')
+            collection, skipped = self.__backend.loadKeyed(fileName)
+            if skipped:
+                print(f'{fileName} holds {skipped} entries that are not records, changes to it will not be saved.')
+                self.__unsaved.add(fileName)
+            else:
+                self.__unsaved.discard(fileName)
+            self.__collections[fileName] = collection
+            self.__duplicates[fileName] = {}
+            for key in collection:
+                if DUPLICATE_SEPARATOR in key:
+                    self.__duplicates[fileName].setdefault(key.split(DUPLICATE_SEPARATOR, 1)[0], []).append(key)
+            self.__signatures[fileName] = signature # from before the load, a change saved meanwhile makes the next read load again
+            self.__versions[fileName] = self.__versions.get(fileName, 0) + 1
+            self.__forgetHistory(fileName)
+            return collection
+
+    # the undo steps of a collection that was (re)loaded from disk would throw away what was loaded
+    def __forgetHistory(self, fileName):
+        self.__persistent.pop(fileName, None)
+        if any(fileName in roots for label, roots in self.__undo) or any(fileName in roots for label, roots in self.__redo):
+            self.__undo = deque(((label, roots) for label, roots in self.__undo if fileName not in roots), maxlen = UNDO_DEPTH)
+            self.__redo = [(label, roots) for label, roots in self.__redo if fileName not in roots]
+
+    # fileName as a CollectionVersion, copied from the collection the first time it is asked for and again once it holds
+    # more changes than records
+    def __persistentCopy(self, fileName):
+        collection = self.__collection(fileName)
+        persistent = self.__persistent.get(fileName)
+        if persistent is None:
+            persistent = self.__persistent[fileName] = CollectionVersion(collection)
+        elif persistent.depth() > max(len(collection), REBASE_DEPTH):
+            persistent = self.__persistent[fileName] = CollectionVersion(collection, persistent)
+        return persistent
+
+    # set key of fileName to record (remove it if record is None) in the collection and its persistent copy,
+    # after __remember made sure the collection is loaded and current
+    def __put(self, fileName, key, record):
+        self.__setKey(fileName, key, record)
+        persistent = self.__persistent.get(fileName)
+        if persistent is not None:
+            self.__persistent[fileName] = persistent.remove(key) if record is None else persistent.set(key, record)
+
+    # set key of fileName's collection to record, or remove it, keeping the index of duplicate names current
+    def __setKey(self, fileName, key, record):
+        collection = self.__collections[fileName]
+        if DUPLICATE_SEPARATOR in key:
+            keys = self.__duplicates[fileName].setdefault(key.split(DUPLICATE_SEPARATOR, 1)[0], [])
+            if record is None and key in keys:
+                keys.remove(key)
+            elif record is not None and key not in collection:
+                keys.append(key)
+        if record is None:
+            collection.pop(key, None)
+        else:
+            collection[key] = record
+
+    # start an undo step called label before fileNames are changed, anything undone before can no longer be redone
+    def __remember(self, label, fileNames):
+        self.__undo.append((label, {fileName: self.__persistentCopy(fileName) for fileName in fileNames}))
+        self.__redo.clear()
+
+    # make each collection in roots ({fileName: CollectionVersion}) equal to its version there; only the records that differ
+    # are touched, saved and passed to the listeners. Returns how many records changed
+    def __restoreRoots(self, roots):
+        changed = 0
+        for fileName, root in roots.items():
+            current = self.__persistentCopy(fileName)
+            changes = list(current.changes(root))
+            for key, old, record in changes:
+                self.__setKey(fileName, key, record)
+            self.__persistent[fileName] = root
+            for key, old, record in changes:
+                self.__recordChange(fileName, key, record)
+            if changes:
+                self.__scheduleFlush(fileName)
+            changed += len(changes)
+        return changed
+
+    # remember that fileName needs saving, tell the listeners and schedule a flush
+    def __markDirty(self, fileName, key, record):
+        self.__recordChange(fileName, key, record)
+        self.__scheduleFlush(fileName)
+
+    def __recordChange(self, fileName, key, record):
+        self.__pending.setdefault(fileName, {})[key] = record
+        self.__versions[fileName] += 1
+        for listener in self.__listeners:
+            listener.recordChanged(fileName, key, record)
+
+    def __scheduleFlush(self, fileName):
+        if self.__timer is None:
+            self.__timer = threading.Timer(self.__flushDelay, self.__flushDue)
+            self.__timer.daemon = True
+            self.__timer.start()
+
+    # the write-behind timer ran out: flush here, or hand each changed collection to the scheduler
+    def __flushDue(self):
+        with self.__lock:
+            self.__timer = None
+            scheduler = self.__scheduler
+            fileNames = sorted(self.__pending)
+        if scheduler is None:
+            self.flush()
+        else:
+            for fileName in fileNames:
+                scheduler(fileName)
+
+    # return the record called name, or None
+    def get(self, fileName, name):
+        with self.__lock:
+            return self.__collection(fileName).get(normalizeName(name))
+
+    # return every record in fileName as a list
+    def records(self, fileName):
+        with self.__lock:
+            return list(self.__collection(fileName).values())
+
+    # return [(key, record)] for every record in fileName, the keys the listeners are told about
+    def items(self, fileName):
+        with self.__lock:
+            return list(self.__collection(fileName).items())
+
+    # add a record, replacing any record with the same name
+    def upsert(self, fileName, record):
+        with self.__lock:
+            key = normalizeName(record['name'])
+            self.__remember(f'add {record["name"]}', [fileName])
+            self.__put(fileName, key, record)
+            self.__markDirty(fileName, key, record)
+            return record
+
+    # add many records at once (e.g. an import), replacing any with the same names; the whole batch is one save
+    def upsertMany(self, fileName, records):
+        records = list(records)
+        if not records:
+            return
+        with self.__lock:
+            self.__remember(f'add {len(records)} records to {fileName}', [fileName])
+            collection = self.__collections[fileName]
+            bulk = len(records) * BULK_CHANGE_SHARE > len(collection)
+            keys = []
+            for record in records:
+                key = normalizeName(record['name'])
+                if bulk:
+                    self.__setKey(fileName, key, record)
+                else:
+                    self.__put(fileName, key, record)
+                self.__recordChange(fileName, key, record)
+                keys.append(key)
+            if bulk: # one dict copy instead of a path copy per record
+                self.__persistent[fileName] = CollectionVersion(collection, self.__persistent[fileName], keys)
+            self.__scheduleFlush(fileName)
+
+    # add a record even if one with the same name exists already, the way enemies were always added
+    def append(self, fileName, record):
+        with self.__lock:
+            collection = self.__collection(fileName)
+            key = normalizeName(record['name'])
+            if key in collection:
+                key = _duplicateKey(collection, key, record)
+            self.__remember(f'add {record["name"]}', [fileName])
+            self.__put(fileName, key, record)
+            self.__markDirty(fileName, key, record)
+            return record
+
+    # remove the record called name, returns the removed record or None; the next record with that name (if any)
+    # takes its key, so the saved file still lists the named record first and loads back with the same keys
+    def remove(self, fileName, name):
+        with self.__lock:
+            key = normalizeName(name)
+            record = self.__collection(fileName).get(key)
+            if record is not None:
+                self.__remember(f'remove {record.get("name", key)}', [fileName])
+                self.__put(fileName, key, None)
+                self.__markDirty(fileName, key, None)
+                others = self.__duplicates[fileName].get(key.split(DUPLICATE_SEPARATOR, 1)[0]) if DUPLICATE_SEPARATOR not in key else None
+                if others:
+                    nextKey = others[0]
+                    nextRecord = self.__collections[fileName][nextKey]
+                    self.__put(fileName, key, nextRecord)
+                    self.__markDirty(fileName, key, nextRecord)
+                    self.__put(fileName, nextKey, None)
+                    self.__markDirty(fileName, nextKey, None)
+            return record
+
+    # add amount (can be negative) to the count of the record called name, never going below 0
+    def adjustCount(self, fileName, name, amount):
+        with self.__lock:
+            key = normalizeName(name)
+            record = self.__collection(fileName).get(key)
+            if record is None:
+                return None
+            self.__remember(f'count {record.get("name", key)} {int(amount):+d}', [fileName])
+            record = dict(record, count = max(0, int(record['count']) + int(amount))) # a copy, undo steps keep the old one
+            self.__put(fileName, key, record)
+            self.__markDirty(fileName, key, record)
+            return record
+
+    # take back the last change (or restore); returns its label, e.g. 'remove Rope', or None if there is nothing to undo
+    def undo(self):
+        with self.__lock:
+            if not self.__undo:
+                return None
+            label, roots = self.__undo.pop()
+            self.__redo.append((label, {fileName: self.__persistentCopy(fileName) for fileName in roots}))
+            self.__restoreRoots(roots)
+            return label
+
+    # make the last undone change again; returns its label, or None if there is nothing to redo
+    def redo(self):
+        with self.__lock:
+            if not self.__redo:
+                return None
+            label, roots = self.__redo.pop()
+            self.__undo.append((label, {fileName: self.__persistentCopy(fileName) for fileName in roots}))
+            self.__restoreRoots(roots)
+            return label
+
+    # labels of the changes that can be undone and redone, next one first
+    def history(self):
+        with self.__lock:
+            return [label for label, roots in reversed(self.__undo)], [label for label, roots in reversed(self.__redo)]
+
+    # {fileName: CollectionVersion} of fileNames, every collection in memory by default; keeping it costs nothing further,
+    # it shares everything with the live collections until they change
+    def snapshot(self, fileNames = None):
+        with self.__lock:
+            return {fileName: self.__persistentCopy(fileName) for fileName in (list(self.__collections) if fileNames is None else fileNames)}
+
+    # put the collections of a snapshot back as one undoable step; returns how many records changed
+    def restore(self, snapshot, label = 'restore snapshot'):
+        with self.__lock:
+            self.__remember(label, list(snapshot))
+            return self.__restoreRoots(snapshot)
+
+    # changes whenever the records of fileName change, so derived data (like columns) knows when to rebuild
+    def version(self, fileName):
+        with self.__lock:
+            self.__collection(fileName)
+            return self.__versions[fileName]
+
+    # names of every database the backend knows about plus any collection already in memory
+    def collectionNames(self):
+        with self.__lock:
+            return sorted(set(self.__backend.collectionNames()) | set(self.__collections))
+
+    # value that changes when fileName is changed on disk, or None if it does not exist
+    def signature(self, fileName):
+        return self.__backend.signature(fileName)
+
+    # the lock guarding the store, for objects that must stay consistent with it
+    def lock(self):
+        return self.__lock
+
+    # listener needs recordChanged(fileName, key, record) - record is None when removed - and collectionSaved(fileName)
+    def addListener(self, listener):
+        with self.__lock:
+            self.__listeners.append(listener)
+
+    # a failed save puts its batches back in front of any change made since, so the next flush retries them
+    def __restorePending(self, batches):
+        with self.__lock:
+            for name, changes, records in batches:
+                changes.update(self.__pending.get(name, {}))
+                self.__pending[name] = changes
+                self.__saving.discard(name)
+
+    # schedule(fileName) is called for each changed collection when the write-behind timer runs out, instead of
+    # flushing on the timer's thread; it should arrange for flush(fileName) to run soon, e.g. on a background worker
+    def setFlushScheduler(self, schedule):
+        with self.__lock:
+            self.__scheduler = schedule
+
+    # hand pending changes to the backend, one batch per collection - all collections, or only fileName
+    # the batches are taken under the lock but written outside it, so readers are not blocked by disk I/O
+    @instrument.timed('store flush')
+    def flush(self, fileName = None):
+        with self.__flushLock:
+            with self.__lock:
+                if fileName is None and self.__timer is not None:
+                    self.__timer.cancel()
+                    self.__timer = None
+                fileNames = sorted(self.__pending) if fileName is None else [name for name in [fileName] if name in self.__pending]
+                batches = []
+                for name in fileNames:
+                    if name in self.__unsaved:
+                        continue # writing it back would drop the entries that are not records
+                    records = _saveOrder(self.__collections[name]) if self.__backend.rewritesAll else None
+                    batches.append((name, self.__pending.pop(name), records))
+                    self.__saving.add(name)
+            for index, (name, changes, records) in enumerate(batches):
+                try:
+                    self.__backend.commit(name, changes, records)
+                except Exception:
+                    self.__restorePending(batches[index:])
+                    raise
+                with self.__lock:
+                    self.__signatures[name] = self.__backend.signature(name)
+                    self.__saving.discard(name)
+                    for listener in self.__listeners:
+                        listener.collectionSaved(name)
+
+    # flush pending changes, call when the application shuts down
+    def close(self):
+        self.flush()
+        self.__backend.close()
+
+# makes names comparable: 'Healing Potion ' and 'healing potion' are the same record
+def normalizeName(name):
+    return str(name).strip().lower()
+
+# ({key: record}, number of entries that are not records) for the records of a database, in order. The first record with
+# a name is keyed by normalizeName(name), records without a name count as named ''; every later record with the same name
+# gets 'name<DUPLICATE_SEPARATOR><hash of its contents>', which comes out the same each time the file is loaded
+def keyRecords(records):
+    collection = {}
+    skipped = 0
+    for record in records:
+        if not isinstance(record, dict):
+            skipped += 1
+            continue
+        key = normalizeName(record.get('name', ''))
+        if key in collection:
+            key = _duplicateKey(collection, key, record)
+        collection[key] = record
+    return collection, skipped
+
+# a free key for another record called name in collection, from the record's contents
+def _duplicateKey(collection, name, record):
+    digest = hashlib.sha1(json.dumps(record, sort_keys = True, default = str).encode()).hexdigest()[:12]
+    key = name + DUPLICATE_SEPARATOR + digest
+    number = 2
+    while key in collection:
+        key = f'{name}{DUPLICATE_SEPARATOR}{digest}{DUPLICATE_SEPARATOR}{number}'
+        number += 1
+    return key
+
+# the records of collection as they are saved: every name's first record ahead of the others with that name,
+# so keyRecords gives them the same keys when the file is read back
+def _saveOrder(collection):
+    first = [record for key, record in collection.items() if DUPLICATE_SEPARATOR not in key]
+    return first + [record for key, record in collection.items() if DUPLICATE_SEPARATOR in key]
+
+# returns (last modified time, size) of fileName, or None if it does not exist
+def _fileSignature(fileName):
+    try:
+        stat = os.stat(fileName)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+# 'inventory.json' -> 'inventory', the type column of the sqlite backend
+def _collectionType(fileName):
+    return os.path.splitext(os.path.basename(fileName))[0]
+
+# applies every entry of a journal file to collection, a torn last line from a crash is ignored
+def _replayJournal(path, collection):
+    try:
+        journalFile = open(path, 'r')
+    except FileNotFoundError:
+        return
+    with journalFile:
+        for line in journalFile:
+            try:
+                entry = json.loads(line)
+            except json.decoder.JSONDecodeError:
+                print(f'Skipping unreadable entry in {path}.')
+                continue
+            if entry['op'] == 'put':
+                collection[entry['key']] = entry['record']
+            elif entry['op'] == 'remove':
+                collection.pop(entry['key'], None)
+
+# writes info to a temporary file and swaps it in, so a crash never leaves fileName half written
+# returns the number of bytes written
+def _writeJsonAtomic(info, fileName):
+    tempName = fileName + '.tmp'
+    with open(tempName, 'w') as jsonFile:
+        json.dump(info, jsonFile, indent = 2)
+        written = jsonFile.tell()
+        jsonFile.flush()
+        os.fsync(jsonFile.fileno())
+    os.replace(tempName, fileName)
+    return written
+
+# takes a dictionary and string as input, saves data to fileName.json
+@instrument.timed()
+def saveToJson(info, fileName):
+    instrument.countBytes('saveToJson', _writeJsonAtomic(info, fileName))
+    print(f'Successfully entered info into {fileName}')
+
+# returns a dictionary containing all data from .json file
+@instrument.timed()
+def loadJsonFile(fileName):
+    try:
+        with open(fileName, 'r') as jsonFile:
+            # Attempt to load JSON data from the file
+            try:
+                dndItems = json.load(jsonFile)
+                instrument.countBytes('loadJsonFile', jsonFile.tell())
+                if not isinstance(dndItems, list):
+                    dndItems = []
+                return dndItems
+            except json.decoder.JSONDecodeError:
+                print(f"Error decoding JSON from {fileName}. Returning an empty list.")
+                return []
+    except FileNotFoundError:
+        print(f"{fileName} not found. Creating a new file.")
+        with open(fileName, 'w') as jsonFile:
+            json.dump([], jsonFile)
+        return []
+
+# returns the storage backend selected under [Storage] in config.ini
+def makeBackend(config):
+    backend = config.get('Storage', 'backend', fallback = 'json')
+    if backend == 'journal':
+        return JournalBackend(config.getint('Storage', 'journal_compact_bytes', fallback = JOURNAL_COMPACT_BYTES))
+    if backend == 'sqlite':
+        path = config.get('Storage', 'database', fallback = SQLITE_DATABASE)
+        if not os.path.exists(path):
+            migrateJsonToSqlite(path) # first start with sqlite, bring the existing .json databases along
+        return SqliteBackend(path)
+    if backend != 'json':
+        print(f'Unknown storage backend {backend}, using json.')
+    return JsonBackend()
+
+# one-shot copy of the .json databases into a sqlite database at path
+def migrateJsonToSqlite(path, fileNames = (INVENTORY_JSON, ENEMY_JSON, LOCATION_JSON)):
+    backend = SqliteBackend(path)
+    for fileName in fileNames:
+        if not os.path.exists(fileName):
+            continue
+        changes, skipped = keyRecords(loadJsonFile(fileName))
+        backend.commit(fileName, changes, None)
+        print(f'Migrated {len(changes)} records from {fileName} into {path}')
+        if skipped:
+            print(f'Left out {skipped} entries of {fileName} that are not records, {fileName} itself is unchanged.')
+    backend.close()
@@ -0,0 +1,128 @@
+'''
+Scribble streaming - read a .json database one record at a time
+
+iterJsonArray maps the file into memory and decodes one record of the top-level list at a time, so only the record being
+read and a small window of the file are held at once; huge imported compendiums can be searched or exported without loading them.
+'''
+import codecs # decode utf-8 a window at a time, a character may be split between two windows
+import json # decode each record
+import mmap # let the operating system page the file in and out instead of reading it into memory
+import os # file sizes, and swapping in the finished export
+import re # split the search text into words
+
+STREAM_CHUNK_BYTES = 1024 * 1024 # bytes decoded at a time, doubled while a single record is bigger than that
+WHITESPACE = re.compile(r'[ \t\n\r]*') # what JSON allows between values
+
+# yields every item of the JSON list in fileName, in order; raises ValueError when the file is not a JSON list,
+# json.JSONDecodeError when a record cannot be read; stop iterating at any time and the file is closed
+def iterJsonArray(fileName, chunkSize = STREAM_CHUNK_BYTES):
+    with open(fileName, 'rb') as jsonFile:
+        if os.fstat(jsonFile.fileno()).st_size == 0:
+            raise json.JSONDecodeError('Expecting value', '', 0)
+        with mmap.mmap(jsonFile.fileno(), 0, access = mmap.ACCESS_READ) as mapped:
+            yield from _iterArray(mapped, chunkSize)
+
+# expect is what may come next: '[' at the start, a record or ']' after it, a record after a comma, ',' or ']' after a record
+def _iterArray(mapped, chunkSize):
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer, index, offset = '', 0, 0
+    readSize = chunkSize
+    expect = '['
+    while True:
+        index = WHITESPACE.match(buffer, index).end()
+        char = buffer[index] if index < len(buffer) else None
+        value = char is not None and (expect == 'record' or expect == 'record]' and char != ']')
+        if value:
+            record, end = _decode(decoder, buffer, index)
+        if (char is None or value and (end is None or end == len(buffer))) and offset < len(mapped):
+            # the window ends before this record does (a number may even look complete): read on, doubling the
+            # window while the record does not fit so a huge record is not decoded from its start over and over
+            chunk = mapped[offset:offset + readSize]
+            offset += len(chunk)
+            buffer = buffer[index:] + utf8.decode(chunk, final = offset >= len(mapped))
+            index = 0
+            readSize *= 2
+            continue
+        if char is None:
+            raise json.JSONDecodeError('Unterminated list', buffer, index)
+        if value:
+            if end is None:
+                decoder.raw_decode(buffer, index) # raises the decoding error
+            yield record
+            readSize = chunkSize
+            index = end
+            expect = ',]'
+            if index > chunkSize: # keep the buffer to about one window
+                buffer = buffer[index:]
+                index = 0
+            continue
+        index += 1
+        if expect == '[':
+            if char != '[':
+                raise ValueError('File does not hold a JSON list')
+            expect = 'record]'
+        elif char == ']':
+            return
+        elif char == ',' and expect == ',]':
+            expect = 'record'
+        else:
+            raise json.JSONDecodeError("Expecting ',' delimiter", buffer, index - 1)
+
+# (record, index after it), or (None, None) when no whole record starts at index
+def _decode(decoder, buffer, index):
+    try:
+        return decoder.raw_decode(buffer, index)
+    except json.JSONDecodeError:
+        return None, None
+
+# yields (fileName, record) for records whose name or description holds every word of find, stops after limit matches
+def streamSearch(find, fileNames, limit = None):
+    keep = findFilter(find)
+    if keep is None or limit == 0:
+        return
+    found = 0
+    for fileName in fileNames:
+        for record in iterJsonArray(fileName):
+            if keep(record):
+                yield fileName, record
+                found += 1
+                if limit is not None and found >= limit:
+                    return
+
+# keep(record) that is True for records whose name or description holds every word of find, None if find has no words
+def findFilter(find):
+    words = _words(find)
+    if not words:
+        return None
+    def keep(record):
+        if not isinstance(record, dict):
+            return False
+        text = f"{record.get('name', '')} {record.get('desc', '')}".lower()
+        return all(word in text for word in words) and words <= _words(text) # cheap substring test first
+    return keep
+
+# copies the records of fileName that pass keep (every record if keep is None) into destination, at most limit of them,
+# as a JSON list or as one record per line if destination ends with .jsonl; returns how many were written
+def exportRecords(fileName, destination, keep = None, limit = None):
+    tempName = destination + '.tmp'
+    lines = destination.endswith('.jsonl')
+    written = 0
+    with open(tempName, 'w') as exportFile:
+        exportFile.write('' if lines else '[')
+        for record in iterJsonArray(fileName):
+            if limit is not None and written >= limit:
+                break
+            if keep is not None and not keep(record):
+                continue
+            if lines:
+                exportFile.write(json.dumps(record) + '\n')
+            else:
+                exportFile.write((',\n  ' if written else '\n  ') + json.dumps(record))
+            written += 1
+        exportFile.write('' if lines else '\n]\n')
+    os.replace(tempName, destination)
+    return written
+
+def _words(text):
+    return set(re.findall(r'\w+', str(text).lower()))
@@ -0,0 +1,163 @@
+'''
+Scribble suggestions - as-you-type name completion that forgives typos
+
+Names are kept in a prefix trie, which gives completions ('heal' -> 'Healing Potion') and, walked with an edit distance
+row per node, misspellings ('helaing pot' -> 'Healing Potion'); the trie is updated record by record through the store.
+'''
+from . import instrument
+from .storage import DUPLICATE_SEPARATOR, normalizeName
+
+SUGGESTION_LIMIT = 8
+FUZZY_MIN_LENGTH = 3 # shorter text only gets completions
+END = '' # trie key marking that a name ends at this node
+
+# NameSuggester - completions and close matches for record names across the store's databases
+class NameSuggester:
+    __store = None
+    __lock = None
+    __trie = None # nested dicts, one level per character of the normalized name; END -> normalized name
+    __names = None # normalized name -> {fileName: display name}
+    __versions = None # fileName -> store version the indexes match
+    __skip = None # skip(fileName) is True for databases left out, e.g. ones too big to load
+
+    def __init__(self, store, skip = None):
+        self.__store = store
+        self.__skip = skip
+        self.__lock = store.lock()
+        self.__trie = {}
+        self.__names = {}
+        self.__versions = {}
+        store.addListener(self)
+
+    def __add(self, fileName, key, name):
+        files = self.__names.get(key)
+        if files is None:
+            files = self.__names[key] = {}
+            node = self.__trie
+            for char in key:
+                node = node.setdefault(char, {})
+            node[END] = key
+        files[fileName] = name
+
+    def __remove(self, fileName, key):
+        files = self.__names.get(key)
+        if files is None or files.pop(fileName, None) is None or files:
+            return
+        del self.__names[key]
+        path = [self.__trie]
+        for char in key:
+            path.append(path[-1][char])
+        del path[-1][END]
+        for char, node in zip(reversed(key), reversed(path[:-1])): # prune the branch the name no longer needs
+            if node[char]:
+                break
+            del node[char]
+
+    # (re)index the databases that are new or changed outside of the store's listener calls (e.g. edited on disk)
+    def __refresh(self, fileNames):
+        for fileName in fileNames:
+            version = self.__store.version(fileName)
+            if self.__versions.get(fileName) == version:
+                continue
+            for key in [key for key, files in self.__names.items() if fileName in files]:
+                self.__remove(fileName, key)
+            for key, record in self.__store.items(fileName):
+                if str(record.get('name', '')).strip() and DUPLICATE_SEPARATOR not in key: # a name is suggested once
+                    self.__add(fileName, key, str(record['name']).strip())
+            self.__versions[fileName] = version
+
+    # up to limit names for text: names starting with it first, then names within a typo or two of it
+    # fileName limits the suggestions to one database, e.g. the inventory
+    @instrument.timed('suggest')
+    def suggest(self, text, fileName = None, limit = SUGGESTION_LIMIT):
+        key = normalizeName(text)
+        if not key:
+            return []
+        with self.__lock:
+            fileNames = [fileName] if fileName is not None else self.__store.collectionNames()
+            self.__refresh([name for name in fileNames if self.__skip is None or not self.__skip(name)])
+            keys = self.__complete(key, fileName, limit)
+            if len(keys) < limit and len(key) >= FUZZY_MIN_LENGTH:
+                chosen = set(keys)
+                keys += [match for match in self.__fuzzy(key, fileName, limit) if match not in chosen][:limit - len(keys)]
+            return [self.__display(match, fileName) for match in keys]
+
+    # normalized names starting with key, in alphabetical order
+    def __complete(self, key, fileName, limit):
+        node = self.__trie
+        for char in key:
+            node = node.get(char)
+            if node is None:
+                return []
+        return self.__walk(node, fileName, limit)
+
+    # the first limit normalized names at or below node, in alphabetical order
+    def __walk(self, node, fileName, limit):
+        found = []
+        stack = [node]
+        while stack and len(found) < limit:
+            node = stack.pop()
+            name = node.get(END)
+            if name is not None and (fileName is None or fileName in self.__names[name]):
+                found.append(name)
+            stack.extend(node[char] for char in sorted(node, reverse = True) if char != END)
+        return found
+
+    # normalized names within allowed typos of key or of the start of a name, closest first
+    # walks the trie keeping one edit distance row per node, so branches that are already too far off are never entered
+    def __fuzzy(self, key, fileName, limit):
+        allowed = 1 if len(key) <= 5 else 2
+        hits = []
+        stack = [(self.__trie, list(range(len(key) + 1)), None, END, 0)]
+        while stack:
+            node, previous, before, last, depth = stack.pop()
+            for char, child in node.items():
+                if char == END:
+                    continue
+                row = _nextRow(key, char, depth + 1, allowed, previous, before, last)
+                if row[-1] <= allowed:
+                    hits.append((row[-1], len(hits), child)) # every name below child is a match
+                if min(row) < min(row[-1], allowed + 1): # a longer prefix could still match, or match better
+                    stack.append((child, row, previous, char, depth + 1))
+        found = []
+        for distance, order, node in sorted(hits, key = lambda hit: hit[:2]):
+            found += [name for name in self.__walk(node, fileName, limit) if name not in found]
+            if len(found) >= limit:
+                break
+        return found[:limit]
+
+    def __display(self, key, fileName):
+        files = self.__names[key]
+        return files[fileName] if fileName is not None else next(iter(files.values()))
+
+    # store listener: keep the indexes in step with edits made through the app
+    def recordChanged(self, fileName, key, record):
+        with self.__lock:
+            if fileName not in self.__versions:
+                return
+            self.__remove(fileName, key)
+            if record is not None and str(record.get('name', '')).strip() and DUPLICATE_SEPARATOR not in key:
+                self.__add(fileName, key, str(record['name']).strip())
+            self.__versions[fileName] += 1 # the store bumped its version for this change as well
+
+    def collectionSaved(self, fileName):
+        pass
+
+# the edit distance row for one more character of a name, from the rows of the two characters before it
+# (Levenshtein, plus swapping two neighbouring letters counts as one typo); only cells that can still be within
+# allowed are computed, the rest hold allowed + 1
+def _nextRow(key, char, depth, allowed, previous, before, last):
+    over = allowed + 1
+    row = [over] * (len(key) + 1)
+    row[0] = min(depth, over)
+    for j in range(max(1, depth - allowed), min(len(key), depth + allowed) + 1):
+        keyChar = key[j - 1]
+        cost = previous[j - 1] + (keyChar != char)
+        if previous[j] + 1 < cost:
+            cost = previous[j] + 1
+        if row[j - 1] + 1 < cost:
+            cost = row[j - 1] + 1
+        if before is not None and j > 1 and keyChar == last and key[j - 2] == char and before[j - 2] + 1 < cost:
+            cost = before[j - 2] + 1
+        row[j] = cost
+    return row
@@ -0,0 +1,439 @@
+'''
+Scribble sync - several players on one shared campaign: a local server owns the databases, the apps are its clients
+
+    python -m scribblecore serve --port 8765       (in the campaign folder, on the machine that keeps the databases)
+    [Sync] mode = client in config.ini             (on every player's app)
+
+The server is an asyncio loop around an ordinary CampaignStore, so every change is applied one at a time and saved by the
+store's write-behind as usual. Each change (one record put or removed) gets the next version number and is pushed to every
+client as a delta; nobody reloads whole files. Count changes are sent as amounts ('adjust' +2), not as the resulting
+record, so two players adding potions at once both count.
+
+Messages are JSON objects, one per line. Requests carry an 'id' that the reply repeats:
+    {'op': 'load', 'file'}                      -> {'items', 'version', 'epoch'}      items are [key, record] pairs
+    {'op': 'names'}                             -> {'names'}
+    {'op': 'upsert', 'file', 'record'}          -> {'version', 'record'}
+    {'op': 'append', 'file', 'record'}          -> {'version', 'record'}   added even if the name exists
+    {'op': 'upsertMany', 'file', 'records'}     -> {'version'}
+    {'op': 'remove', 'file', 'name'}            -> {'version', 'record'}   the removed record or None
+    {'op': 'adjust', 'file', 'name', 'amount'}  -> {'version', 'record'}   None if there is no such record
+    {'op': 'since', 'version', 'epoch'}         -> {'changes'}, or {'reset': true} once the server no longer has them all
+and a request that fails gets {'error'}. Changes are pushed as {'op': 'change', 'version', 'file', 'key', 'record'},
+always before the reply to the request that made them. 'file' must be a plain *.json name of a database of the campaign
+(one the store knows, one in the server's folder, or one of the app's own); anything else is refused.
+A database edited outside the app on the server's machine is pushed as {'op': 'reload', 'version', 'file'}: the server
+looks for such edits every SYNC_RELOAD_CHECK seconds and before each request, and clients load the database again.
+'''
+import asyncio # the server
+import itertools # request ids
+import json # the messages
+import os # the server's epoch, databases in its folder
+import re # plain database file names
+import socket # the client's connection
+import threading # the client's reader thread and its waiting requests
+from collections import deque # the server's recent changes, for clients that reconnect
+
+from .config import INVENTORY_JSON, ENEMY_JSON, LOCATION_JSON
+from .storage import normalizeName
+
+SYNC_HOST = '127.0.0.1'
+SYNC_PORT = 8765
+SYNC_TIMEOUT = 10.0 # seconds a client waits for a reply
+SYNC_LOG_SIZE = 10000 # changes the server remembers for clients catching up after a reconnect
+SYNC_LINE_LIMIT = 64 * 1024 * 1024 # longest message the server reads, an upsertMany of a big import is one line
+SYNC_MAX_BACKLOG = 16 * 1024 * 1024 # bytes queued for a client that stopped reading before it is dropped
+SYNC_RELOAD_CHECK = 2.0 # seconds between the server's looks for databases edited outside the app
+SYNC_FILE_PATTERN = re.compile(r'[\w-][\w .-]*\.json') # a database file name without folders
+
+# SyncServer - serves one CampaignStore to every client that connects, see the module docstring for the protocol
+class SyncServer:
+    __store = None
+    __clients = None # StreamWriter of every connected client
+    __log = None # deque of recent change messages
+    __version = 0 # version of the latest change
+    __epoch = None # tells this run of the server apart from earlier ones, whose versions mean nothing now
+    __storeVersions = None # fileName -> store version the clients have, for every database a client loaded
+
+    def __init__(self, store):
+        self.__store = store
+        self.__epoch = os.urandom(8).hex()
+        self.__clients = set()
+        self.__log = deque(maxlen = SYNC_LOG_SIZE)
+        self.__storeVersions = {}
+        store.addListener(self)
+
+    # serve until cancelled; ready(port) is called once the server listens (port 0 picks a free one)
+    async def serve(self, host = SYNC_HOST, port = SYNC_PORT, ready = None):
+        server = await asyncio.start_server(self.__handle, host, port, limit = SYNC_LINE_LIMIT)
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[1])
+        watcher = asyncio.create_task(self.__watchReloads())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+
+    async def __watchReloads(self):
+        while True:
+            await asyncio.sleep(SYNC_RELOAD_CHECK)
+            self.checkReloads()
+
+    # push a reload of every database a client loaded that the store had to read again (it was edited outside the app)
+    def checkReloads(self, fileNames = None):
+        for fileName in list(self.__storeVersions) if fileNames is None else fileNames:
+            if fileName not in self.__storeVersions:
+                continue
+            version = self.__store.version(fileName)
+            if version != self.__storeVersions[fileName]:
+                self.__storeVersions[fileName] = version
+                self.__push({'op': 'reload', 'file': fileName})
+
+    async def __handle(self, reader, writer):
+        self.__clients.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = {}
+                try:
+                    request = json.loads(line)
+                    reply = self.__dispatch(request)
+                except Exception as e: # a bad request must not take the server down
+                    reply = {'error': str(e) or type(e).__name__}
+                reply['id'] = request.get('id') if isinstance(request, dict) else None
+                self.__send(writer, reply)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass # ValueError: a line longer than SYNC_LINE_LIMIT
+        finally:
+            self.__clients.discard(writer)
+            writer.close()
+
+    # runs the request against the store; the changes it makes reach every client through recordChanged
+    def __dispatch(self, request):
+        op = request['op']
+        store = self.__store
+        if 'file' in request:
+            request['file'] = self.__fileName(request['file'])
+            self.checkReloads([request['file']]) # clients load it again before they see this request's changes
+        if op == 'load':
+            items = store.items(request['file'])
+            self.__storeVersions[request['file']] = store.version(request['file'])
+            return {'items': items, 'version': self.__version, 'epoch': self.__epoch}
+        if op == 'names':
+            return {'names': store.collectionNames()}
+        if op == 'since':
+            since = request['version']
+            missed = since < self.__version and (not self.__log or self.__log[0]['version'] > since + 1)
+            if missed or since > self.__version or request.get('epoch') != self.__epoch:
+                return {'reset': True, 'version': self.__version, 'epoch': self.__epoch}
+            return {'changes': [change for change in self.__log if change['version'] > since]}
+        if op in ('upsert', 'append'):
+            record = request['record']
+            if not isinstance(record, dict) or not isinstance(record.get('name'), str):
+                raise ValueError('A record needs a name')
+            return {'record': (store.append if op == 'append' else store.upsert)(request['file'], record), 'version': self.__version}
+        if op == 'upsertMany':
+            records = request['records']
+            if not all(isinstance(record, dict) and isinstance(record.get('name'), str) for record in records):
+                raise ValueError('Every record needs a name')
+            store.upsertMany(request['file'], records)
+            return {'version': self.__version}
+        if op == 'remove':
+            return {'record': store.remove(request['file'], request['name']), 'version': self.__version}
+        if op == 'adjust':
+            return {'record': store.adjustCount(request['file'], request['name'], int(request['amount'])), 'version': self.__version}
+        raise ValueError(f'Unknown request {op}')
+
+    # fileName if it is a database of this campaign, see the module docstring
+    def __fileName(self, fileName):
+        if not isinstance(fileName, str) or not SYNC_FILE_PATTERN.fullmatch(fileName):
+            raise ValueError(f'{fileName!r} is not a database file name')
+        if fileName not in (INVENTORY_JSON, ENEMY_JSON, LOCATION_JSON) and not os.path.isfile(fileName) \
+                and fileName not in self.__store.collectionNames():
+            raise ValueError(f'{fileName} is not a database of this campaign')
+        return fileName
+
+    def __send(self, writer, message):
+        if writer.transport.get_write_buffer_size() > SYNC_MAX_BACKLOG:
+            writer.close() # it stopped reading, it catches up with 'since' when it reconnects
+            self.__clients.discard(writer)
+            return
+        writer.write(json.dumps(message).encode() + b'\n')
+
+    # store listener: number the change and push it to every client
+    def recordChanged(self, fileName, key, record):
+        if fileName in self.__storeVersions:
+            self.__storeVersions[fileName] += 1 # the store bumped its version for this change as well
+        self.__push({'op': 'change', 'file': fileName, 'key': key, 'record': record})
+
+    # give change the next version, remember it for clients catching up and send it to every client
+    def __push(self, change):
+        self.__version += 1
+        change['version'] = self.__version
+        self.__log.append(change)
+        for writer in list(self.__clients):
+            self.__send(writer, change)
+
+    # store listener: nothing to tell the clients, they never see files
+    def collectionSaved(self, fileName):
+        pass
+
+# RemoteStore - a CampaignStore look-alike for the app in client mode: reads come from a local copy of every database it
+# has used, kept current by the server's change feed; writes go to the server and are applied when their change comes back
+# The reader thread only queues what arrives; it is applied, in order, by whoever holds the lock next (the reader itself
+# if nobody does), so a request made while holding the lock never waits on a reader that waits on the lock
+class RemoteStore:
+    __address = None
+    __socket = None
+    __sendLock = None
+    __lock = None # guards the copies, shared with the search index and suggester like CampaignStore.lock
+    __inbox = None # deque of changes and replies not applied yet, in the order they arrived
+    __collections = None # fileName -> {key: record}, for every database loaded so far
+    __loadedAt = None # fileName -> server version it was loaded at, its signature
+    __versions = None # fileName -> counter bumped on every change, like CampaignStore.version
+    __version = 0 # version of the last change applied
+    __epoch = None # which run of the server the versions belong to, they start over when it restarts
+    __listeners = None
+    __waiting = None # request id -> [threading.Event, reply, request]
+    __ids = None
+    __connected = False
+
+    def __init__(self, host = SYNC_HOST, port = SYNC_PORT):
+        self.__address = (host, port)
+        self.__sendLock = threading.Lock()
+        self.__lock = threading.RLock()
+        self.__inbox = deque()
+        self.__collections = {}
+        self.__loadedAt = {}
+        self.__versions = {}
+        self.__listeners = []
+        self.__waiting = {}
+        self.__ids = itertools.count(1)
+        self.__connect()
+
+    def __connect(self):
+        self.__socket = socket.create_connection(self.__address, timeout = SYNC_TIMEOUT)
+        self.__socket.settimeout(None) # the reader waits for the server as long as it takes
+        self.__socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.__connected = True
+        threading.Thread(target = self.__read, args = (self.__socket,), daemon = True, name = 'scribble-sync').start()
+
+    # reader thread: queue pushed changes and replies, wake the requests waiting for their reply
+    def __read(self, connection):
+        try:
+            with connection.makefile('rb') as stream:
+                for line in stream:
+                    message = json.loads(line)
+                    waiter = self.__waiting.get(message.get('id')) if message.get('op') not in ('change', 'reload') else None
+                    if waiter is not None:
+                        message['request'] = waiter[2]
+                        waiter[1] = message
+                    self.__inbox.append(message)
+                    if waiter is not None:
+                        waiter[0].set()
+                    if self.__lock.acquire(blocking = False):
+                        try:
+                            self.__drain()
+                        finally:
+                            self.__lock.release()
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self.__sendLock:
+                if self.__socket is connection:
+                    self.__connected = False
+            for waiter in list(self.__waiting.values()):
+                waiter[0].set() # no reply is coming, let the requests fail instead of waiting out the timeout
+
+    # apply everything queued, in order; call with the lock held
+    def __drain(self):
+        while self.__inbox:
+            message = self.__inbox.popleft()
+            if message.get('op') in ('change', 'reload'):
+                self.__apply(message)
+            elif 'error' not in message and message.get('request') is not None:
+                self.__received(message['request'], message)
+
+    # apply a pushed change, or drop the copy of a database the server reloaded so it is loaded again on next use
+    def __apply(self, change):
+        if change['version'] <= self.__version:
+            return # already seen, e.g. replayed by 'since' after a reconnect
+        self.__version = change['version']
+        fileName = change['file']
+        collection = self.__collections.get(fileName)
+        if collection is None:
+            return # not loaded here, its load will include this change
+        if change['op'] == 'reload':
+            del self.__collections[fileName]
+            del self.__loadedAt[fileName] # a new signature makes the search index re-index it
+            self.__versions[fileName] += 1
+            return
+        key, record = change['key'], change['record']
+        if record is None:
+            collection.pop(key, None)
+        else:
+            collection[key] = record
+        self.__versions[fileName] += 1
+        for listener in self.__listeners:
+            listener.recordChanged(fileName, key, record)
+
+    # a reply is applied where it falls between the changes: a loaded database is current as of its place in the feed
+    def __received(self, request, reply):
+        if request['op'] == 'load' and request['file'] not in self.__collections:
+            fileName = request['file']
+            self.__collections[fileName] = {key: record for key, record in reply['items']}
+            self.__loadedAt[fileName] = [reply['epoch'], reply['version']]
+            self.__versions[fileName] = self.__versions.get(fileName, 0) + 1
+            if self.__epoch != reply['epoch']:
+                self.__epoch, self.__version = reply['epoch'], reply['version']
+        elif request['op'] == 'since':
+            if reply.get('reset'):
+                for fileName in self.__collections:
+                    self.__versions[fileName] += 1
+                self.__collections.clear() # reloaded on next use; a new signature makes the search index re-index them
+                self.__loadedAt.clear()
+                self.__epoch, self.__version = reply['epoch'], reply['version']
+            else:
+                for change in reply['changes']:
+                    self.__apply(change)
+
+    # send request and wait until its reply (and every change before it) has been applied; reconnects if the connection was lost
+    def __request(self, request):
+        if not self.__connected:
+            self.__reconnect()
+        requestId = next(self.__ids)
+        request['id'] = requestId
+        waiter = self.__waiting[requestId] = [threading.Event(), None, request]
+        try:
+            with self.__sendLock:
+                self.__socket.sendall(json.dumps(request).encode() + b'\n')
+            if not waiter[0].wait(SYNC_TIMEOUT) or waiter[1] is None:
+                raise ConnectionError(f'No answer from the sync server at {self.__address[0]}:{self.__address[1]}')
+        except OSError:
+            self.__connected = False
+            raise
+        finally:
+            del self.__waiting[requestId]
+        with self.__lock:
+            self.__drain()
+        if 'error' in waiter[1]:
+            raise ValueError(waiter[1]['error'])
+        return waiter[1]
+
+    # connect again and catch up with the changes missed meanwhile, or drop the copies if the server no longer has them
+    def __reconnect(self):
+        self.__connect()
+        self.__request({'op': 'since', 'version': self.__version, 'epoch': self.__epoch})
+
+    # the local copy of fileName, loaded from the server on first use
+    # after a lost connection, reads catch up first if they can, and use the copy as it is if the server is gone
+    def __collection(self, fileName):
+        with self.__lock:
+            if not self.__connected and fileName in self.__collections:
+                try:
+                    self.__reconnect()
+                except OSError:
+                    pass
+            self.__drain()
+            if fileName not in self.__collections:
+                self.__request({'op': 'load', 'file': fileName})
+            return self.__collections[fileName]
+
+    def get(self, fileName, name):
+        with self.__lock:
+            return self.__collection(fileName).get(normalizeName(name))
+
+    def records(self, fileName):
+        with self.__lock:
+            return list(self.__collection(fileName).values())
+
+    def items(self, fileName):
+        with self.__lock:
+            return list(self.__collection(fileName).items())
+
+    def upsert(self, fileName, record):
+        self.__collection(fileName)
+        return self.__request({'op': 'upsert', 'file': fileName, 'record': record})['record']
+
+    def append(self, fileName, record):
+        self.__collection(fileName)
+        return self.__request({'op': 'append', 'file': fileName, 'record': record})['record']
+
+    def upsertMany(self, fileName, records):
+        self.__collection(fileName)
+        self.__request({'op': 'upsertMany', 'file': fileName, 'records': list(records)})
+
+    def remove(self, fileName, name):
+        self.__collection(fileName)
+        return self.__request({'op': 'remove', 'file': fileName, 'name': name})['record']
+
+    # the server adds amount to the count it has, so concurrent changes from other players are never lost
+    def adjustCount(self, fileName, name, amount):
+        self.__collection(fileName)
+        return self.__request({'op': 'adjust', 'file': fileName, 'name': name, 'amount': int(amount)})['record']
+
+    # undo and snapshots would throw away other players' changes, they are only kept by a local CampaignStore
+    def undo(self):
+        raise ValueError('Undo is not available while sharing a campaign')
+
+    def redo(self):
+        raise ValueError('Redo is not available while sharing a campaign')
+
+    def history(self):
+        return [], []
+
+    def snapshot(self, fileNames = None):
+        raise ValueError('Snapshots are not available while sharing a campaign')
+
+    def restore(self, snapshot, label = 'restore snapshot'):
+        raise ValueError('Snapshots are not available while sharing a campaign')
+
+    def version(self, fileName):
+        with self.__lock:
+            self.__collection(fileName)
+            return self.__versions[fileName]
+
+    def collectionNames(self):
+        return self.__request({'op': 'names'})['names']
+
+    # stays the same while the copy is kept current by the feed, changes when it had to be loaded again
+    def signature(self, fileName):
+        with self.__lock:
+            return ['sync', self.__address[0], self.__address[1], self.__loadedAt.get(fileName)]
+
+    def lock(self):
+        return self.__lock
+
+    # listener needs recordChanged(fileName, key, record), called for changes from every client, this one included
+    def addListener(self, listener):
+        with self.__lock:
+            self.__listeners.append(listener)
+
+    # the server saves, nothing to schedule or flush here
+    def setFlushScheduler(self, schedule):
+        pass
+
+    def flush(self, fileName = None):
+        pass
+
+    def close(self):
+        with self.__sendLock:
+            self.__connected = False
+            try:
+                self.__socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.__socket.close()
+
+# run a sync server for store until interrupted, then save everything
+def serve(store, host = SYNC_HOST, port = SYNC_PORT):
+    server = SyncServer(store)
+    try:
+        asyncio.run(server.serve(host, port, lambda port: print(f'Scribble sync server listening on {host}:{port}, Ctrl+C to stop')))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
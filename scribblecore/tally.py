@@ -0,0 +1,223 @@
+'''
+Scribble tallies - the [Campaign] counters in config.ini (deaths, beers, enemies slain, sessions), counted during play
+
+Incrementing only touches memory. Changes are written after TALLY_FLUSH_DELAY seconds in one batch: the [Campaign] lines of
+config.ini are rewritten in place (comments and the other sections are left alone) and the new events are appended to a
+history file next to it, TALLY_RECORD bytes per event.
+Per counter the history is kept as sorted timestamps plus running totals, so the total of any time window or session is
+two binary searches instead of a pass over the history.
+'''
+import bisect # find the ends of a time window in the sorted timestamps
+import os # swap in the rewritten config.ini, history file sizes
+import re # find the counter lines in config.ini
+import struct # the fixed-size history records
+import threading # background timer used to write the counters back to disk
+import time # event timestamps
+from array import array # timestamps and running totals, 8 bytes per event each
+
+from . import instrument
+from .config import CONFIG_PATH
+
+TALLY_COUNTERS = ('session_count', 'total_deaths', 'beers_consumed', 'enemies_slain')
+TALLY_FLUSH_DELAY = 5.0 # seconds to wait after an increment before writing, so a burst of clicks is one write
+TALLY_HISTORY = os.path.join(os.path.dirname(CONFIG_PATH), 'tally_history.bin')
+TALLY_RECORD = struct.Struct('<IdBi') # session, unix time, counter index in TALLY_COUNTERS, amount
+TALLY_MAGIC = b'SCRTALY1' # first bytes of the history file
+TALLY_LINE = re.compile(r'^(\s*)(\w+)(\s*[=:]\s*)(.*)$')
+
+# _Series - one counter's history: sorted timestamps and the running total up to each of them
+class _Series:
+    __slots__ = ('times', 'totals', 'sessions')
+
+    def __init__(self):
+        self.times = array('d')
+        self.totals = array('q', [0]) # totals[i] is the sum of the first i amounts
+        self.sessions = {} # session -> total counted in it
+
+    def add(self, session, when, amount):
+        self.times.append(when)
+        self.totals.append(self.totals[-1] + amount)
+        self.sessions[session] = self.sessions.get(session, 0) + amount
+
+    # total of the events with start <= time < end
+    def between(self, start, end):
+        return self.totals[bisect.bisect_left(self.times, end)] - self.totals[bisect.bisect_left(self.times, start)]
+
+# TallyCounters - the campaign counters, their totals from config.ini and their history from the history file
+class TallyCounters:
+    __totals = None # counter -> total as written in config.ini
+    __series = None # counter -> _Series
+    __pending = None # [(session, time, counter index, amount)] not written yet
+    __session = 0 # session the events are counted in, session_count at startup or after startSession
+    __sessionStarts = None # session -> time it was started
+    __configPath = None
+    __historyPath = None
+    __flushDelay = None
+    __timer = None
+    __lock = None
+    __flushLock = None # one flush at a time, so events reach the history file in order
+
+    def __init__(self, config, configPath = CONFIG_PATH, historyPath = TALLY_HISTORY, flushDelay = TALLY_FLUSH_DELAY):
+        self.__totals = {name: config.getint('Campaign', name, fallback = 0) for name in TALLY_COUNTERS}
+        self.__series = {name: _Series() for name in TALLY_COUNTERS}
+        self.__pending = []
+        self.__session = self.__totals['session_count']
+        self.__sessionStarts = {}
+        self.__configPath = configPath
+        self.__historyPath = historyPath
+        self.__flushDelay = flushDelay
+        self.__lock = threading.RLock()
+        self.__flushLock = threading.Lock()
+        self.__loadHistory()
+
+    # read the history file once; anything after the last whole record (a crash mid-write) is ignored
+    def __loadHistory(self):
+        try:
+            with open(self.__historyPath, 'rb') as historyFile:
+                data = historyFile.read()
+        except FileNotFoundError:
+            return
+        if not data.startswith(TALLY_MAGIC):
+            print(f'{self.__historyPath} is not a tally history, ignoring it.')
+            return
+        end = len(TALLY_MAGIC) + (len(data) - len(TALLY_MAGIC)) // TALLY_RECORD.size * TALLY_RECORD.size
+        for session, when, index, amount in TALLY_RECORD.iter_unpack(data[len(TALLY_MAGIC):end]):
+            self.__addEvent(session, when, index, amount)
+
+    def __addEvent(self, session, when, index, amount):
+        name = TALLY_COUNTERS[index]
+        series = self.__series[name]
+        if series.times and when < series.times[-1]:
+            when = series.times[-1] # the clock went back, keep the timestamps sorted
+        series.add(session, when, amount)
+        if name == 'session_count':
+            self.__sessionStarts[session] = when
+        return when
+
+    # count amount more of counter name (e.g. 'total_deaths') in the current session; returns the new total
+    def increment(self, name, amount = 1):
+        if name not in self.__totals:
+            raise ValueError(f'Unknown counter {name}, use one of {", ".join(TALLY_COUNTERS)}')
+        with self.__lock:
+            self.__totals[name] += amount
+            when = self.__addEvent(self.__session, time.time(), TALLY_COUNTERS.index(name), amount)
+            self.__pending.append((self.__session, when, TALLY_COUNTERS.index(name), amount))
+            self.__scheduleFlush()
+            return self.__totals[name]
+
+    # start the next session: bumps session_count, later events are counted in the new session; returns its number
+    def startSession(self):
+        with self.__lock:
+            self.__session = self.__totals['session_count'] + 1
+            self.increment('session_count')
+            return self.__session
+
+    def session(self):
+        return self.__session
+
+    def total(self, name):
+        return self.__totals[name]
+
+    # what name counted in session (the current one if not given)
+    def sessionTotal(self, name, session = None):
+        with self.__lock:
+            return self.__series[name].sessions.get(self.__session if session is None else session, 0)
+
+    # what name counted in the last seconds seconds
+    def windowTotal(self, name, seconds, now = None):
+        now = time.time() if now is None else now
+        return self.between(name, now - seconds, now + 1)
+
+    # what name counted from start up to (not including) end, unix times
+    def between(self, name, start, end):
+        with self.__lock:
+            return self.__series[name].between(start, end)
+
+    # what name counted in each of buckets equal slices of start..end, e.g. for a chart of the evening
+    def buckets(self, name, start, end, buckets):
+        step = (end - start) / buckets
+        with self.__lock:
+            series = self.__series[name]
+            return [series.between(start + step * index, start + step * (index + 1)) for index in range(buckets)]
+
+    # when session was started, None for events counted before the first startSession
+    def sessionStart(self, session):
+        return self.__sessionStarts.get(session)
+
+    def __scheduleFlush(self):
+        if self.__timer is None:
+            self.__timer = threading.Timer(self.__flushDelay, self.flush)
+            self.__timer.daemon = True
+            self.__timer.start()
+
+    # write the totals into config.ini and append the new events to the history file, if anything changed
+    @instrument.timed('tally flush')
+    def flush(self):
+        with self.__flushLock:
+            with self.__lock:
+                if self.__timer is not None:
+                    self.__timer.cancel()
+                    self.__timer = None
+                pending, self.__pending = self.__pending, []
+                totals = dict(self.__totals)
+            if not pending:
+                return
+            try:
+                _writeCampaignTotals(self.__configPath, totals)
+                _appendHistory(self.__historyPath, pending)
+            except OSError:
+                with self.__lock:
+                    self.__pending[:0] = pending # try again with the next flush
+                raise
+
+    def close(self):
+        self.flush()
+
+# rewrites the values of the [Campaign] counter lines of the ini file at path, adding any that are missing
+def _writeCampaignTotals(path, totals):
+    try:
+        with open(path, 'r') as configFile:
+            lines = configFile.read().split('\n')
+    except FileNotFoundError:
+        lines = []
+    missing = dict(totals)
+    section = None
+    end = None # line after the last line of [Campaign]
+    for index, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped.startswith('[') and stripped.endswith(']'):
+            section = stripped[1:-1]
+            if section == 'Campaign':
+                end = index + 1
+            continue
+        if section != 'Campaign':
+            continue
+        match = TALLY_LINE.match(line)
+        if match is not None and match.group(2) in missing:
+            lines[index] = f'{match.group(1)}{match.group(2)}{match.group(3)}{missing.pop(match.group(2))}'
+        if stripped:
+            end = index + 1
+    if end is None:
+        lines += ['', '[Campaign]'] if lines and lines[-1] else ['[Campaign]']
+        end = len(lines)
+    lines[end:end] = [f'{name} = {value}' for name, value in missing.items()]
+    tempName = path + '.tmp'
+    with open(tempName, 'w') as configFile:
+        configFile.write('\n'.join(lines))
+        configFile.flush()
+        os.fsync(configFile.fileno())
+    os.replace(tempName, path)
+
+# appends events after the last whole record, so a record cut short by a crash is overwritten instead of shifting the rest
+def _appendHistory(path, events):
+    with open(path, 'ab') as historyFile:
+        size = historyFile.tell()
+        if size < len(TALLY_MAGIC):
+            historyFile.truncate(0)
+            historyFile.write(TALLY_MAGIC)
+        elif (size - len(TALLY_MAGIC)) % TALLY_RECORD.size:
+            historyFile.truncate(size - (size - len(TALLY_MAGIC)) % TALLY_RECORD.size)
+        historyFile.write(b''.join(TALLY_RECORD.pack(*event) for event in events))
+        instrument.countBytes('tally flush', len(events) * TALLY_RECORD.size)
+        historyFile.flush()
+        os.fsync(historyFile.fileno())
@@ -0,0 +1,21 @@
+'''
+Shared fixtures: every test runs in its own empty campaign folder, the databases it makes are thrown away afterwards
+'''
+import json
+
+import pytest
+
+# the current directory is a fresh campaign folder for the test
+@pytest.fixture
+def campaign(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+# write records to fileName in the campaign folder as a .json database
+def writeDatabase(fileName, records):
+    with open(fileName, 'w') as databaseFile:
+        json.dump(records, databaseFile)
+
+def readDatabase(fileName):
+    with open(fileName) as databaseFile:
+        return json.load(databaseFile)
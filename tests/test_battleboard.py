@@ -0,0 +1,107 @@
+'''
+Battleboard: A* movement over terrain and tokens, line of sight, spell areas, the spatial hash and dirty cells
+'''
+import pytest
+
+from scribblecore.battleboard import Battleboard, SpatialHash, Token, WALL, FLOOR, DIFFICULT
+
+def wall(board, cells, cost = WALL):
+    for x, y in cells:
+        board.setTerrain(x, y, cost)
+
+# diagonal steps cost the same as straight ones
+def testOpenFloor():
+    board = Battleboard(10, 10)
+    cost, path = board.movementCost((0, 0), (4, 2))
+    assert cost == 4 and path[0] == (0, 0) and path[-1] == (4, 2) and len(path) == 5
+    assert board.movementCost((3, 3), (3, 3)) == (0, [(3, 3)])
+
+# difficult terrain costs two to enter: crossing a band of it costs one extra, a way around is taken when cheaper
+def testDifficultTerrain():
+    board = Battleboard(5, 5)
+    wall(board, [(2, y) for y in range(5)], DIFFICULT)
+    cost, path = board.movementCost((0, 2), (4, 2))
+    assert cost == 5
+    assert sum(board.terrain(*cell) for cell in path[1:]) == cost
+    board.setTerrain(2, 0, FLOOR) # a gap: going through it diagonally is cheaper than wading
+    cost, path = board.movementCost((0, 2), (4, 2))
+    assert cost == 4 and (2, 0) in path
+    assert board.movementCost((0, 0), (4, 0)) == (4, [(0, 0), (1, 0), (2, 0), (3, 0), (4, 0)])
+
+# walls are walked around, cells behind a closed wall cannot be reached, corners cannot be cut
+def testWalls():
+    board = Battleboard(7, 7)
+    wall(board, [(3, y) for y in range(6)])
+    cost, path = board.movementCost((0, 0), (6, 0))
+    assert cost == 14 and (3, 6) in path # round the end, no cutting the corners
+    board.setTerrain(3, 6, WALL)
+    assert board.movementCost((0, 0), (6, 0)) is None
+    assert board.movementCost((0, 0), (3, 3)) is None # into a wall
+    corner = Battleboard(3, 3)
+    wall(corner, [(1, 0), (0, 1)])
+    assert corner.movementCost((0, 0), (1, 1)) is None # only diagonally past two wall corners
+
+# enemies block, friends can be passed but not stopped on; moving a token clears the cached paths
+def testTokensBlock():
+    board = Battleboard(5, 3)
+    wall(board, [(2, 0), (2, 2)])
+    hero = board.addToken('Hero', 'party', 0, 1)
+    orc = board.addToken('Orc', 'enemy', 2, 1)
+    assert board.movementCost((0, 1), (4, 1), 'party') is None
+    assert board.movementCost((0, 1), (4, 1), 'enemy')[0] == 4 # the orc's friends may pass it
+    assert board.movementCost((0, 1), (2, 1), 'enemy') is None
+    assert board.moveToken(orc.id, 2, 0) is False # a wall
+    assert board.moveToken(orc.id, 4, 2)
+    assert board.movementCost((0, 1), (4, 1), 'party')[0] == 4
+    assert board.addToken('Ghost', 'enemy', 0, 1) is None and board.addToken('Ghost', 'enemy', 2, 0) is None
+    board.setTerrain(0, 1, WALL) # never walls a token in
+    assert board.terrain(0, 1) == FLOOR and board.tokenAt(0, 1) is hero
+
+# a wall between two cells blocks sight both ways, walls at the ends do not, and removing it clears the cached answer
+def testLineOfSight():
+    board = Battleboard(9, 9)
+    assert board.lineOfSight((0, 0), (8, 5))
+    board.setTerrain(4, 4, WALL)
+    assert not board.lineOfSight((0, 0), (8, 8)) and not board.lineOfSight((8, 8), (0, 0))
+    assert board.lineOfSight((0, 3), (8, 3)) and board.lineOfSight((4, 4), (8, 8))
+    board.setTerrain(4, 4, FLOOR)
+    assert board.lineOfSight((0, 0), (8, 8))
+
+# spell areas stop at walls, shapes cover the cells the rules give them
+def testAreaOfEffect():
+    board = Battleboard(11, 11)
+    assert len(board.areaOfEffect('sphere', (5, 5), 1)) == 9
+    assert len(board.areaOfEffect('cube', (0, 0), 3)) == 9
+    assert board.areaOfEffect('line', (0, 0), 4, towards = (1, 0)) == {(1, 0), (2, 0), (3, 0), (4, 0)}
+    cone = board.areaOfEffect('cone', (5, 5), 3, towards = (10, 5))
+    assert (8, 5) in cone and (8, 6) in cone and (4, 5) not in cone and (5, 8) not in cone
+    wall(board, [(6, y) for y in range(11)])
+    behind = board.areaOfEffect('sphere', (5, 5), 3)
+    assert (7, 5) not in behind and (6, 5) not in behind and (4, 5) in behind
+    with pytest.raises(ValueError):
+        board.areaOfEffect('cone', (5, 5), 3)
+    with pytest.raises(ValueError):
+        board.areaOfEffect('blob', (5, 5), 3)
+
+# only the buckets a rectangle overlaps are looked at, the answer is the same as looking at every token
+def testSpatialHash():
+    spatial = SpatialHash(bucketCells = 4)
+    tokens = [Token(number, f'T{number}', 'enemy', number * 3 % 17, number * 5 % 13) for number in range(40)]
+    for token in tokens:
+        spatial.add(token)
+    found = {token.id for token in spatial.query(2, 3, 9, 11)}
+    assert found == {token.id for token in tokens if 2 <= token.x <= 9 and 3 <= token.y <= 11}
+    spatial.remove(tokens[5])
+    assert spatial.at(tokens[5].x, tokens[5].y) is None
+
+# every change marks the cells it touched, takeDirty hands them over once
+def testDirtyCells():
+    board = Battleboard(6, 6)
+    board.takeDirty()
+    token = board.addToken('Hero', 'party', 1, 1)
+    board.moveToken(token.id, 2, 2)
+    board.setTerrain(5, 5, DIFFICULT)
+    board.setTerrain(5, 5, DIFFICULT) # no change
+    assert board.takeDirty() == {(1, 1), (2, 2), (5, 5)}
+    assert board.takeDirty() == set()
+    assert board.tokensIn({(2, 2), (3, 3)}) == [token]
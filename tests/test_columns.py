@@ -0,0 +1,68 @@
+'''
+Columns: records go in and come back out unchanged, aggregates skip gaps, the cache follows store edits row by row
+'''
+import pytest
+
+from scribblecore.config import ENEMY_JSON
+from scribblecore.columns import RecordColumns, ColumnCache, MISSING
+from scribblecore.models import Item, Stats, Enemy
+from scribblecore.storage import CampaignStore, JsonBackend
+
+from conftest import writeDatabase
+
+RECORDS = [{'name': 'Rope', 'desc': 'hemp', 'count': 3, 'activeOrPassive': 'Passive', 'key': 'Not Key'},
+           {'name': 'Goblin', 'desc': 'small', 'stats': {'health': 7, 'strength': 8, 'dexterity': 14, 'constitution': 10,
+                                                         'intelligence': 10, 'wisdom': 8, 'charisma': 8}},
+           {'name': 'Ooze', 'stats': {'health': '3d8', 'strength': None, 'speed': 10}}, # a roll, a gap, a field of its own
+           {'name': 'Coins', 'count': '12', 'weight': 0.02}, # a count saved as text, and an extra field
+           {'name': 'Flag', 'count': True},
+           {'desc': 'no name'}]
+
+# every record comes back out as the very dictionary it went in as
+def testRoundTrip():
+    columns = RecordColumns(RECORDS + ['not a record'])
+    assert len(columns) == len(RECORDS)
+    assert list(columns.rows()) == RECORDS
+
+# number columns are typed: whole numbers saved as text count, anything else in a number field is a gap
+def testNumberColumns():
+    columns = RecordColumns(RECORDS)
+    assert list(columns.column('count')) == [3, MISSING, MISSING, 12, MISSING, MISSING]
+    assert columns.column('health')[2] == MISSING and columns.row(2)['stats']['health'] == '3d8'
+    assert (columns.sum('count'), columns.mean('count'), columns.minimum('count'), columns.maximum('count')) == (15, 7.5, 3, 12)
+    assert columns.mean('wisdom') == 8 and RecordColumns().mean('wisdom') is None
+
+# replace and remove keep every other row and the aggregates right
+def testReplaceAndRemove():
+    columns = RecordColumns(RECORDS)
+    columns.replace(0, {'name': 'Rope', 'count': 10})
+    assert columns.row(0) == {'name': 'Rope', 'count': 10} and columns.sum('count') == 22
+    columns.remove(0) # the last row moves into row 0
+    assert len(columns) == len(RECORDS) - 1
+    assert columns.row(0) == RECORDS[-1] and columns.sum('count') == 12
+    columns.remove(len(columns) - 1)
+    assert [row.get('name') for row in columns.rows()] == [None, 'Goblin', 'Ooze', 'Coins']
+
+# the slotted records turn into the same dictionaries the database holds
+def testSlottedModels():
+    item = Item.fromDict(RECORDS[0])
+    assert item.toDict() == RECORDS[0] and not hasattr(item, '__dict__')
+    enemy = Enemy.fromDict(RECORDS[1])
+    assert enemy.toDict() == {'name': 'Goblin', 'desc': 'small', 'stats': RECORDS[1]['stats']}
+    assert Stats.fromDict({'health': 4}).toDict()['health'] == 4 and not hasattr(enemy, '__dict__')
+    assert 'stats' not in Enemy('Bat', 'flies').toDict()
+
+# after edits through the store the cached columns hold what columns built from scratch hold
+def testCacheFollowsStore(campaign):
+    writeDatabase(ENEMY_JSON, RECORDS)
+    store = CampaignStore(JsonBackend(), flushDelay = 3600)
+    cache = ColumnCache(store)
+    columns = cache.get(ENEMY_JSON)
+    store.adjustCount(ENEMY_JSON, 'Coins', 5)
+    store.remove(ENEMY_JSON, 'Rope')
+    store.upsert(ENEMY_JSON, {'name': 'Troll', 'count': 2})
+    assert cache.get(ENEMY_JSON) is columns # changed row by row, not rebuilt
+    rows = {key: columns.row(row) for key, row in zip(cache.keys(ENEMY_JSON, range(len(columns))), range(len(columns)))}
+    assert rows == dict(store.items(ENEMY_JSON))
+    assert columns.sum('count') == 17 + 2
+    store.close()
@@ -0,0 +1,68 @@
+'''
+Dice notation: reading expressions, and rolling them from seedable streams
+'''
+import pytest
+
+from scribblecore.dice import DiceRoller, parseDice, MAX_DICE, EXPLODE_LIMIT
+
+# every part of the notation ends up in the groups, whole numbers add up into the modifier
+def testParse():
+    expression = parseDice(' 4d6kh3 - d% + 2d6r2! + 3 - 1 ')
+    assert expression.modifier == 2
+    (first, four), (second, percent), (third, two) = expression.groups
+    assert (first, four.count, four.sides, four.keep, four.keepHighest) == (1, 4, 6, 3, True)
+    assert (second, percent.count, percent.sides) == (-1, 1, 100)
+    assert (third, two.reroll, two.explode, two.keep) == (1, 2, True, 2)
+
+# dropping is keeping the rest, and a keep bigger than the group keeps every die
+@pytest.mark.parametrize('text, keep, keepHighest', [('4d6k3', 3, True), ('2d20kl1', 1, False), ('4d6dl1', 3, True),
+                                                     ('3d8dh1', 2, False), ('2d6kh5', 2, True)])
+def testKeepAndDrop(text, keep, keepHighest):
+    group = parseDice(text).groups[0][1]
+    assert (group.keep, group.keepHighest) == (keep, keepHighest)
+
+@pytest.mark.parametrize('text', ['', '2d', 'd', '3x6', '2d6+', '2d0', f'{MAX_DICE + 1}d6', '1d1001', '2d6r6', '4d6kh', 'fireball'])
+def testParseErrors(text):
+    with pytest.raises(ValueError):
+        parseDice(text)
+
+# the same seed gives the same rolls, and a seeded roller's numbered streams are reproducible but differ from each other
+def testSeededRolls():
+    assert DiceRoller(7).rollMany('3d6+1', 50) == DiceRoller(7).rollMany('3d6+1', 50)
+    roller = DiceRoller(7)
+    assert roller.stream(2).rollMany('d20', 50) == DiceRoller(7).stream(2).rollMany('d20', 50)
+    assert roller.stream(1).rollMany('d20', 50) != roller.stream(2).rollMany('d20', 50)
+
+# an unseeded roller's streams are seeded from its own generator, two of them do not roll alike
+def testUnseededStreamsDiffer():
+    roller = DiceRoller()
+    assert roller.stream(0).rollMany('d1000', 20) != roller.stream(0).rollMany('d1000', 20)
+
+# every total lies between the lowest and highest the expression allows
+@pytest.mark.parametrize('text, low, high', [('3d6+1', 4, 19), ('4d6kh3', 3, 18), ('2d20kl1-2', -1, 18), ('d4-d4', -3, 3),
+                                             ('2d6r2', 2, 12), ('1d6!', 1, 6 * (EXPLODE_LIMIT + 1))])
+def testTotalsInRange(text, low, high):
+    totals = DiceRoller(3).rollMany(text, 2000)
+    assert len(totals) == 2000 and all(low <= total <= high for total in totals)
+
+# kept and dropped dice add up to the total, the drop is the lowest die
+def testRollDetails():
+    result = DiceRoller(11).roll('4d6dl1+2')
+    (sign, text, kept, dropped), = result.details
+    assert (sign, text) == (1, '4d6dl1') and len(kept) == 3 and len(dropped) == 1
+    assert min(kept) >= dropped[0]
+    assert result.total == sum(kept) + 2
+    assert result.describe().endswith(f'= {result.total}')
+
+# rerolling low dice and exploding max dice push the average up as expected
+def testRerollAndExplodeAverages():
+    roller = DiceRoller(5)
+    assert abs(sum(roller.rollMany('1d6r2', 40000)) / 40000 - 25 / 6) < 0.05
+    assert abs(sum(roller.rollMany('1d6!', 40000)) / 40000 - 4.2) < 0.05
+
+# a natural 20 on a kept d20 is a crit, one on a dropped d20 is not
+def testCrit():
+    roller = DiceRoller(1)
+    results = [roller.roll('2d20kl1') for number in range(2000)]
+    assert all(result.crit == (result.details[0][2] == [20]) for result in results)
+    assert any(result.crit for result in results)
@@ -0,0 +1,58 @@
+'''
+Encounter simulator: combatants from records, reproducible results on any number of workers, and fights with known outcomes
+'''
+import pytest
+
+from scribblecore.config import ENEMY_JSON
+from scribblecore.encounter import Combatant, findCombatants, simulateEncounter, PARTY_JSON, PARTY_FILES, MAX_ROUNDS
+from scribblecore.storage import CampaignStore, JsonBackend
+
+from conftest import writeDatabase
+
+FIGHTER = {'name': 'Fighter', 'stats': {'health': 30, 'strength': 16, 'dexterity': 12}}
+GOBLIN = {'name': 'Goblin', 'stats': {'health': 7, 'strength': 8, 'dexterity': 14}}
+
+# armor class, attack and damage come from the stats unless the record names them
+def testCombatantFromRecord():
+    fighter = Combatant.fromRecord(FIGHTER)
+    assert (fighter.hp, fighter.ac, fighter.attack, fighter.damage, fighter.initiative) == (30, 11, 5, '1d8+3', 1)
+    ogre = Combatant.fromRecord({'name': 'Ogre', 'stats': {'health': 59}, 'ac': 11, 'attack': 6, 'damage': '2d8+4'})
+    assert (ogre.ac, ogre.attack, ogre.damage) == (11, 6, '2d8+4')
+    for record in ({'name': 'Ghost'}, {'name': 'Ghost', 'stats': {'health': '4d8'}}, dict(GOBLIN, damage = 'lots')):
+        with pytest.raises(ValueError):
+            Combatant.fromRecord(record)
+
+# the same seed gives the same report whether one worker or three roll the chunks
+def testSeededAcrossWorkers():
+    one = simulateEncounter([FIGHTER], [GOBLIN] * 3, trials = 3000, workers = 1, seed = 42)
+    three = simulateEncounter([FIGHTER], [GOBLIN] * 3, trials = 3000, workers = 3, seed = 42)
+    assert one.trials == three.trials == 3000
+    assert (one.wins, one.draws, one.rounds, one.hpLost, one.deaths) == (three.wins, three.draws, three.rounds, three.hpLost, three.deaths)
+    assert 0 < one.winRate() < 1
+    assert one.deaths[0] + one.deaths[1] == 3000 and sum(one.hpLost.values()) == 3000
+
+# a foe that cannot survive a hit and cannot hurt anyone always loses, in as many rounds as the party needs to hit it
+def testCertainWin():
+    target = {'name': 'Dummy', 'stats': {'health': 1}, 'ac': 0, 'damage': '0'}
+    report = simulateEncounter([dict(FIGHTER, attack = 30)], [target], trials = 500, workers = 1, seed = 1)
+    assert report.winRate() == 1 and report.hpLost == {0: 500} and report.deaths == {0: 500}
+    assert report.rounds[1] > 0.9 * 500 # only a natural 1 misses
+    assert 'Party wins 100.0%' in str(report)
+
+# nobody can deal damage: every fight is a draw after MAX_ROUNDS
+def testDraw():
+    pacifist = {'name': 'Monk', 'stats': {'health': 5}, 'damage': '0'}
+    report = simulateEncounter([pacifist], [dict(pacifist, name = 'Priest')], trials = 50, workers = 1, seed = 3)
+    assert report.draws == 50 and report.wins == 0 and report.rounds == {MAX_ROUNDS: 50}
+
+# 'Goblin x3' is three goblins, party members are looked up in party.json before enemies.json
+def testFindCombatants(campaign):
+    writeDatabase(PARTY_JSON, [FIGHTER])
+    writeDatabase(ENEMY_JSON, [GOBLIN, dict(FIGHTER, stats = {'health': 99})])
+    store = CampaignStore(JsonBackend(), flushDelay = 3600)
+    assert [c.hp for c in findCombatants(store, ['Fighter', 'goblin x3'], PARTY_FILES)] == [30, 7, 7, 7]
+    with pytest.raises(ValueError):
+        findCombatants(store, ['Dragon'], PARTY_FILES)
+    with pytest.raises(ValueError):
+        simulateEncounter([], [GOBLIN])
+    store.close()
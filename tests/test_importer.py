@@ -0,0 +1,80 @@
+'''
+Bulk import: CSV, JSON lines and JSON lists mapped onto records, duplicates skipped, the same result with any number of workers
+'''
+import csv
+import json
+
+import pytest
+
+import scribblecore.importer as importer
+from scribblecore.config import INVENTORY_JSON, ENEMY_JSON
+from scribblecore.importer import importFile, mapRecord
+from scribblecore.storage import CampaignStore, JsonBackend
+
+from conftest import writeDatabase, readDatabase
+
+MONSTERS = [{'Name': f'Monster {number}', 'Description': f'line one\nline two of {number}', 'Hit Points': f'{number} (2d8)',
+             'STR': str(number % 20), 'dex': number % 18} for number in range(40)]
+
+def writeCsv(path, rows):
+    with open(path, 'w', newline = '') as csvFile:
+        writer = csv.DictWriter(csvFile, list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+def openStore():
+    return CampaignStore(JsonBackend(), flushDelay = 3600)
+
+# column names seen in the wild are mapped onto our fields, rows without a name are rejected
+def testMapRecord():
+    assert mapRecord({'Title': ' Rope ', 'QTY': '3', 'Active-Or-Passive': 'passive', 'key': 'yes'}, 'item') == \
+        {'name': 'Rope', 'desc': '', 'count': 3, 'activeOrPassive': 'Passive', 'key': 'Key'}
+    enemy = mapRecord({'name': 'Ogre', 'text': 'big', 'stats': {'HP': '59 (7d10+21)', 'str': 19, 'int': 'five'}}, 'enemy')
+    assert enemy['stats']['health'] == 59 and enemy['stats']['strength'] == 19 and enemy['stats']['intelligence'] is None
+    assert mapRecord({'name': 'Bat'}, 'enemy') == {'name': 'Bat', 'desc': ''}
+    assert mapRecord({'desc': 'nameless'}, 'enemy') is None
+    assert mapRecord({'name': 'Rope', 'count': 'many'}, 'item') is None
+
+# quoted values with line breaks stay whole across chunk edges, and any number of workers gives the same records
+@pytest.mark.parametrize('workers', [1, 2])
+def testCsvAcrossChunks(campaign, monkeypatch, workers):
+    monkeypatch.setattr(importer, 'IMPORT_CHUNK_RECORDS', 7)
+    writeCsv('monsters.csv', MONSTERS)
+    writeDatabase(ENEMY_JSON, [{'name': 'Monster 3', 'desc': 'already here'}])
+    store = openStore()
+    progress = []
+    report = importFile(store, 'monsters.csv', ENEMY_JSON, workers = workers, progress = lambda report, done: progress.append(done))
+    assert (report.read, report.added, report.duplicates, report.rejected) == (40, 39, 1, 0)
+    assert progress[-1] == 1.0
+    assert store.get(ENEMY_JSON, 'monster 3')['desc'] == 'already here'
+    monster = store.get(ENEMY_JSON, 'monster 17')
+    assert monster['desc'] == 'line one\nline two of 17' and monster['stats']['health'] == 17 and monster['stats']['dexterity'] == 17
+    assert len(readDatabase(ENEMY_JSON)) == 40 # saved straight away
+    store.close()
+
+# bad lines of a JSON lines file are counted as rejected, names repeated in the file are skipped
+def testJsonLines(campaign):
+    with open('items.jsonl', 'w') as linesFile:
+        linesFile.write('{"name": "Rope", "count": 2}\n\n{"name": "rope", "count": 9}\nnot json\n{"count": 1}\n{"name": "Torch"}\n')
+    store = openStore()
+    report = importFile(store, 'items.jsonl', INVENTORY_JSON, workers = 1)
+    assert (report.read, report.added, report.duplicates, report.rejected) == (5, 2, 1, 2)
+    assert store.get(INVENTORY_JSON, 'rope')['count'] == 2 and store.get(INVENTORY_JSON, 'torch')['count'] == 1
+    store.close()
+
+# a JSON list is streamed; replace overwrites records that exist already
+@pytest.mark.parametrize('workers', [1, 2])
+def testJsonListReplace(campaign, monkeypatch, workers):
+    monkeypatch.setattr(importer, 'IMPORT_CHUNK_RECORDS', 3)
+    with open('items.json', 'w') as listFile:
+        json.dump([{'name': f'Arrow {number}', 'qty': number} for number in range(10)] + ['a note'], listFile)
+    writeDatabase(INVENTORY_JSON, [{'name': 'Arrow 4', 'count': 100}])
+    store = openStore()
+    report = importFile(store, 'items.json', INVENTORY_JSON, replace = True, workers = workers)
+    assert (report.read, report.added, report.rejected) == (11, 10, 1)
+    assert store.get(INVENTORY_JSON, 'arrow 4')['count'] == 4 and len(store.records(INVENTORY_JSON)) == 10
+    store.close()
+
+def testUnknownFormat(campaign):
+    with pytest.raises(ValueError):
+        importFile(openStore(), 'monsters.xml', ENEMY_JSON)
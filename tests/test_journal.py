@@ -0,0 +1,98 @@
+'''
+JournalBackend: changes are appended to the journal and replayed on top of the snapshot, compaction folds them back in
+'''
+import json
+import os
+import threading
+
+from scribblecore.config import INVENTORY_JSON
+import scribblecore.storage as storage
+from scribblecore.storage import CampaignStore, JournalBackend, JOURNAL_SUFFIX, COMPACTING_SUFFIX
+
+from conftest import writeDatabase, readDatabase
+
+def openStore(compactBytes = 1024 * 1024):
+    return CampaignStore(JournalBackend(compactBytes), flushDelay = 3600)
+
+# the changes reach the journal, not the snapshot, and come back when the campaign is opened again
+def testJournalReplay(campaign):
+    writeDatabase(INVENTORY_JSON, [{'name': 'Rope', 'count': 1}, {'name': 'Torch', 'count': 4}])
+    store = openStore()
+    store.adjustCount(INVENTORY_JSON, 'rope', 2)
+    store.remove(INVENTORY_JSON, 'Torch')
+    store.upsert(INVENTORY_JSON, {'name': 'Lantern', 'count': 1})
+    store.close()
+    assert len(readDatabase(INVENTORY_JSON)) == 2 # the snapshot is untouched
+    with open(INVENTORY_JSON + JOURNAL_SUFFIX) as journalFile:
+        entries = [json.loads(line) for line in journalFile]
+    assert {entry['op'] for entry in entries} == {'put', 'remove'}
+    store = openStore()
+    assert store.get(INVENTORY_JSON, 'Rope')['count'] == 3
+    assert store.get(INVENTORY_JSON, 'Torch') is None
+    assert store.get(INVENTORY_JSON, 'lantern') == {'name': 'Lantern', 'count': 1}
+    store.close()
+
+# a leftover journal from a compaction that never finished is replayed before the live journal
+def testCompactingJournalReplayedFirst(campaign):
+    writeDatabase(INVENTORY_JSON, [{'name': 'Rope', 'count': 1}])
+    with open(INVENTORY_JSON + JOURNAL_SUFFIX + COMPACTING_SUFFIX, 'w') as journalFile:
+        journalFile.write(json.dumps({'op': 'put', 'key': 'rope', 'record': {'name': 'Rope', 'count': 5}}) + '\n')
+    with open(INVENTORY_JSON + JOURNAL_SUFFIX, 'w') as journalFile:
+        journalFile.write(json.dumps({'op': 'put', 'key': 'rope', 'record': {'name': 'Rope', 'count': 7}}) + '\n')
+        journalFile.write('{"op": "put", "key": "half wri') # a crash mid-write
+    store = openStore()
+    assert store.get(INVENTORY_JSON, 'Rope')['count'] == 7
+    store.close()
+
+# a journal past compactBytes is folded into a new snapshot and removed
+def testCompaction(campaign):
+    writeDatabase(INVENTORY_JSON, [{'name': 'Rope', 'count': 1}])
+    store = openStore(compactBytes = 200)
+    for number in range(20):
+        store.upsert(INVENTORY_JSON, {'name': f'Arrow {number}', 'count': number})
+        store.flush()
+    store.close()
+    assert not os.path.exists(INVENTORY_JSON + JOURNAL_SUFFIX + COMPACTING_SUFFIX)
+    assert len(readDatabase(INVENTORY_JSON)) >= 2
+    store = openStore()
+    assert len(store.records(INVENTORY_JSON)) == 21
+    assert store.get(INVENTORY_JSON, 'arrow 19')['count'] == 19
+    store.close()
+
+# duplicate names in the snapshot keep their own keys through the journal
+def testJournalKeepsDuplicates(campaign):
+    writeDatabase(INVENTORY_JSON, [{'name': 'Rope', 'count': 1}, {'name': 'Rope', 'count': 2}])
+    store = openStore()
+    store.adjustCount(INVENTORY_JSON, 'Rope', 10)
+    store.close()
+    store = openStore()
+    assert sorted(record['count'] for record in store.records(INVENTORY_JSON)) == [2, 11]
+    store.close()
+
+# opening a database while its compaction is still writing the snapshot waits for it instead of hanging
+def testLoadDuringCompaction(campaign, monkeypatch):
+    writeDatabase(INVENTORY_JSON, [{'name': 'Rope', 'count': 1}])
+    writing, carryOn = threading.Event(), threading.Event()
+    writeJsonAtomic = storage._writeJsonAtomic
+
+    def slowWrite(info, fileName):
+        writing.set()
+        carryOn.wait(5)
+        return writeJsonAtomic(info, fileName)
+
+    monkeypatch.setattr(storage, '_writeJsonAtomic', slowWrite)
+    backend = JournalBackend(200)
+    store = CampaignStore(backend, flushDelay = 3600)
+    while not writing.is_set():
+        store.upsert(INVENTORY_JSON, {'name': f'Arrow {len(store.records(INVENTORY_JSON))}', 'count': 1})
+        store.flush()
+    loaded = []
+    reader = threading.Thread(target = lambda: loaded.append(CampaignStore(backend).records(INVENTORY_JSON)), daemon = True)
+    reader.start()
+    reader.join(0.2)
+    assert reader.is_alive() # waiting for the compaction
+    carryOn.set()
+    reader.join(5)
+    assert not reader.is_alive()
+    assert len(loaded[0]) == len(store.records(INVENTORY_JSON))
+    store.close()
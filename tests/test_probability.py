@@ -0,0 +1,70 @@
+'''
+Dice odds: exact distributions checked against odds worked out by hand, and the approximations of huge groups
+'''
+import math
+
+import pytest
+
+from scribblecore.dice import DiceRoller
+from scribblecore.probability import distribution, formatDistribution
+
+def near(a, b, tolerance = 1e-9):
+    return abs(a - b) <= tolerance
+
+# 2d6: 7 is the most likely total, 6 ways out of 36
+def testTwoDice():
+    dist = distribution('2d6')
+    assert dist.exact and dist.offset == 2 and len(dist.probs) == 11
+    assert near(dict(dist.items())[7], 6 / 36)
+    assert near(dist.chanceAtLeast(10), 6 / 36)
+    assert near(dist.mean(), 7) and near(dist.variance(), 35 / 6)
+
+# advantage and disadvantage on a DC 11 check
+@pytest.mark.parametrize('text, chance', [('2d20kh1', 1 - (10 / 20) ** 2), ('2d20kl1', (10 / 20) ** 2), ('1d20', 0.5)])
+def testAdvantage(text, chance):
+    assert near(distribution(text).chanceAtLeast(11), chance)
+
+# 4d6 dropping the lowest averages 15869/1296, the classic ability score roll
+def testKeepHighestMean():
+    assert near(distribution('4d6kh3').mean(), 15869 / 1296)
+    assert near(sum(distribution('4d6dl1').probs), 1)
+
+# rerolling 1s and 2s once on a d6: 1/3 of the time it is a fresh d6
+def testReroll():
+    dist = distribution('1d6r2')
+    assert near(dict(dist.items())[1], 1 / 3 * 1 / 6)
+    assert near(dict(dist.items())[6], 1 / 6 + 1 / 3 * 1 / 6)
+
+# an exploding d6 averages 3.5 * 6/5, and can never total a multiple of 6
+def testExplode():
+    dist = distribution('1d6!')
+    assert near(dist.mean(), 4.2, 1e-6)
+    assert dict(dist.items()).get(6, 0) == 0 and dict(dist.items()).get(12, 0) == 0
+
+# subtracting a group mirrors it, the modifier shifts everything
+def testSubtractAndModifier():
+    dist = distribution('1d8-1d4+3')
+    assert dist.offset == 1 - 4 + 3 and dist.offset + len(dist.probs) - 1 == 8 - 1 + 3
+    assert near(dist.mean(), 4.5 - 2.5 + 3)
+
+# the exact odds agree with many seeded rolls
+def testOddsMatchRolls():
+    totals = DiceRoller(2).rollMany('3d6kl2+1', 60000)
+    dist = distribution('3d6kl2+1')
+    for total, chance in dist.items():
+        assert abs(totals.count(total) / len(totals) - chance) < 0.01
+
+# a group too big to work out is approximated, with the right mean and spread and in a moment
+def testHugeGroupsApproximated():
+    normal = distribution('1000d20')
+    assert not normal.exact
+    assert abs(normal.mean() - 10500) < 0.5 and abs(normal.stdev() - math.sqrt(1000 * 399 / 12)) < 0.5
+    simulated = distribution('200d100kh150')
+    assert not simulated.exact and near(sum(simulated.probs), 1)
+    assert 150 <= simulated.offset and simulated.offset + len(simulated.probs) - 1 <= 15000
+    assert distribution('200d100kh150').probs == simulated.probs # seeded, the same odds every time
+
+# the chart groups totals into at most maxRows rows
+def testChart():
+    rows = formatDistribution(distribution('10d6'), maxRows = 10)
+    assert 1 < len(rows) <= 10 and any(row.endswith('#' * 40) for row in rows)
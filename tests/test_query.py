@@ -0,0 +1,99 @@
+'''
+Queries: reading the query text, telling queries from names, and columns/indexes that follow edits to the store
+'''
+import random
+
+import pytest
+
+from scribblecore.config import ENEMY_JSON
+from scribblecore.query import QueryEngine, INDEX_AFTER, _Parser, isQuery
+from scribblecore.storage import CampaignStore, JsonBackend
+
+from conftest import writeDatabase
+
+# every part of a query ends up in the parsed dictionary, aliases turned into field names
+def testParse():
+    parsed = _Parser('enemies where (str > 15 or dex >= 14) and not desc contains dragon order by hp desc limit 20').parse()
+    assert parsed['fileName'] == 'enemies.json'
+    assert parsed['where'] == ('and', ('or', ('compare', 'strength', '>', 15), ('compare', 'dexterity', '>=', 14)),
+                               ('not', ('compare', 'desc', 'contains', 'dragon')))
+    assert (parsed['orderBy'], parsed['descending'], parsed['limit']) == ('health', True, 20)
+
+# 'and' binds tighter than 'or', quoted values keep their spaces
+def testParsePrecedenceAndQuotes():
+    parsed = _Parser('inventory.json where name = "Rope of Climbing" or count > 1 and key = Key').parse()
+    assert parsed['fileName'] == 'inventory.json'
+    assert parsed['where'] == ('or', ('compare', 'name', '=', 'Rope of Climbing'),
+                               ('and', ('compare', 'count', '>', 1), ('compare', 'key', '=', 'Key')))
+
+# queries that cannot be read raise ValueError
+@pytest.mark.parametrize('text', ['enemies where', 'enemies where hp > ten', 'enemies where hp >', 'enemies where colour = red',
+                                  'enemies order hp', 'enemies limit -1', 'enemies where (hp > 1', 'enemies where hp > 1 extra',
+                                  'inventory where count contains 3', 'enemies where hp contains "1"'])
+def testParseErrors(text):
+    with pytest.raises(ValueError):
+        _Parser(text).parse()
+
+# only text starting with a known database name is a query
+@pytest.mark.parametrize('text, names, expected', [('enemies where hp > 2', None, True),
+                                                   ('Inventory order by name', None, True),
+                                                   ('enemies.json limit 3', None, True),
+                                                   ('Holy order', None, False),
+                                                   ('Sword limit', None, False),
+                                                   ('Holy order', ['holy.json'], True),
+                                                   ('monsters where hp > 2', ['enemies.json'], False),
+                                                   ('Healing potion', None, False)])
+def testIsQuery(text, names, expected):
+    assert isQuery(text, names) is expected
+
+# a store with 300 enemies and a query engine over it
+@pytest.fixture
+def engine(campaign):
+    chooser = random.Random(3)
+    writeDatabase(ENEMY_JSON, [{'name': f'Enemy {number}', 'count': chooser.randrange(10), 'desc': chooser.choice(['orc', 'goblin', 'dragon']),
+                                'stats': {'health': chooser.randrange(1, 100), 'dexterity': chooser.randrange(1, 20)}}
+                               for number in range(300)])
+    store = CampaignStore(JsonBackend(), flushDelay = 3600)
+    yield store, QueryEngine(store)
+    store.close()
+
+QUERIES = ['enemies where dex >= 14 and hp < 50', 'enemies where desc = Orc', 'enemies where not count <= 5 or hp > 90',
+           'enemies where name > "Enemy 5"']
+
+# keys of the matches of every query, run often enough that its fields are indexed
+def matches(queryEngine):
+    return [sorted(queryEngine.selectKeys(text)[1]) for text in QUERIES for repeat in range(INDEX_AFTER + 1)][::INDEX_AFTER + 1]
+
+# after every kind of edit the engine answers like one built from scratch
+def testIndexesFollowEdits(engine):
+    store, queryEngine = engine
+    chooser = random.Random(4)
+    matches(queryEngine)
+    for step in range(300):
+        name = f'Enemy {chooser.randrange(320)}'
+        choice = chooser.random()
+        if choice < 0.4:
+            store.upsert(ENEMY_JSON, {'name': name, 'count': chooser.randrange(10), 'desc': chooser.choice(['Orc', 'troll', None]),
+                                      'stats': {'health': chooser.choice([chooser.randrange(1, 100), '2d6']), 'dexterity': 15}})
+        elif choice < 0.8:
+            store.remove(ENEMY_JSON, name)
+        elif store.get(ENEMY_JSON, name) is not None:
+            store.adjustCount(ENEMY_JSON, name, 3)
+        if step % 50 == 49:
+            assert matches(queryEngine) == matches(QueryEngine(store))
+    assert store.undo() is not None
+    assert matches(queryEngine) == matches(QueryEngine(store))
+
+# run returns the records themselves, ordered and limited
+def testRunOrderLimit(engine):
+    store, queryEngine = engine
+    results = queryEngine.run('enemies where desc = dragon order by hp desc limit 5')
+    healths = [record['stats']['health'] for fileName, record in results]
+    assert len(results) == 5 and healths == sorted(healths, reverse = True)
+    assert all(record['desc'] == 'dragon' for fileName, record in results)
+
+# a query the parser turns down never reaches the columns
+def testRunRefusesContainsOnNumbers(engine):
+    store, queryEngine = engine
+    with pytest.raises(ValueError):
+        queryEngine.run('enemies where count contains 3')
@@ -0,0 +1,82 @@
+'''
+Result cursor: pages of matches fetched on demand, streamed matches read only as far as needed, sorting by any column
+'''
+import pytest
+
+from scribblecore.config import INVENTORY_JSON, ENEMY_JSON
+from scribblecore.results import ResultCursor, formatRow, DESC_WIDTH
+
+RECORDS = {('inventory.json', 'rope'): {'name': 'Rope', 'count': 3, 'desc': 'hemp'},
+           ('inventory.json', 'torch'): {'name': 'Torch', 'count': '12'},
+           ('inventory.json', 'gem'): {'name': 'gem', 'count': 1, 'desc': 'x' * 100},
+           ('enemies.json', 'orc'): {'name': 'Orc', 'stats': {'health': 15}, 'desc': 'angry'},
+           ('enemies.json', 'bat'): {'name': 'Bat', 'stats': {'health': 1}}}
+
+# fetch for index references and streamed records, counting how many were turned into rows
+class Fetcher:
+    def __init__(self):
+        self.fetched = 0
+
+    def __call__(self, ref):
+        self.fetched += 1
+        if isinstance(ref[1], dict): # read from a streamed database, the record itself
+            return ref
+        record = RECORDS.get(ref)
+        return (ref[0], record) if record is not None else None
+
+# pages start where asked and end with the matches, only the rows of a page are fetched
+def testPages():
+    fetch = Fetcher()
+    refs = [(INVENTORY_JSON, f'item {number}') for number in range(250)] + list(RECORDS)
+    cursor = ResultCursor(fetch, refs)
+    assert cursor.count() == 255 and cursor.complete()
+    assert len(cursor.rows(0)) == 100 and fetch.fetched == 100
+    assert cursor.rows(0)[0] == ['', '(deleted)', '', '', '']
+    last = cursor.rows(200)
+    assert len(last) == 55 and last[-1][:2] == ['enemies.json', 'Bat']
+    assert cursor.rows(255) == [] and cursor.result(-1) is None and cursor.result(254)[1]['name'] == 'Bat'
+
+# a streamed search is read only as far as the pages asked for
+def testStreamedMatches():
+    read = []
+
+    def stream():
+        for number in range(1000):
+            read.append(number)
+            yield (ENEMY_JSON, {'name': f'Zombie {number}'})
+
+    cursor = ResultCursor(Fetcher(), [(INVENTORY_JSON, 'rope')], stream())
+    assert [row[1] for row in cursor.rows(0, 3)] == ['Rope', 'Zombie 0', 'Zombie 1']
+    assert len(read) == 2 and not cursor.complete()
+    cursor.rows(10, 5)
+    assert len(read) == 14 and cursor.count() == 15
+    assert cursor.total() == 1001 and cursor.complete()
+
+# numbers sort as numbers (counts saved as text too) and words without case, rows without a value go last either way
+@pytest.mark.parametrize('column, descending, expected', [('Count', False, ['gem', 'Rope', 'Torch', 'Orc', 'Bat']),
+                                                          ('Count', True, ['Torch', 'Rope', 'gem', 'Orc', 'Bat']),
+                                                          ('Health', False, ['Bat', 'Orc', 'Rope', 'Torch', 'gem']),
+                                                          ('Name', False, ['Bat', 'gem', 'Orc', 'Rope', 'Torch']),
+                                                          ('Description', True, ['gem', 'Rope', 'Orc', 'Torch', 'Bat'])])
+def testSort(column, descending, expected):
+    cursor = ResultCursor(Fetcher(), list(RECORDS))
+    cursor.sort(column, descending)
+    assert [record['name'] for fileName, record in cursor.results(0)] == expected
+    assert cursor.sortColumn() == (column, descending)
+    assert [row[1] for row in cursor.rows(1, 2)] == expected[1:3]
+
+# sorting pulls in the rest of a streamed search, a deleted match sorts last
+def testSortStreamedAndDeleted():
+    cursor = ResultCursor(Fetcher(), [(INVENTORY_JSON, 'gone'), (INVENTORY_JSON, 'rope')],
+                          iter([(ENEMY_JSON, 'orc'), (ENEMY_JSON, 'bat')]))
+    cursor.sort('Name')
+    assert cursor.complete() and cursor.count() == 4
+    assert [found[1]['name'] if found else None for found in cursor.results(0)] == ['Bat', 'Orc', 'Rope', None]
+    with pytest.raises(ValueError):
+        cursor.sort('Weight')
+
+# long descriptions are cut to the table width
+def testFormatRow():
+    assert formatRow(ENEMY_JSON, RECORDS[('enemies.json', 'orc')]) == [ENEMY_JSON, 'Orc', '', '15', 'angry']
+    cells = formatRow(INVENTORY_JSON, RECORDS[('inventory.json', 'gem')])
+    assert len(cells[4]) == DESC_WIDTH and cells[4].endswith('...') and cells[2] == '1'
@@ -0,0 +1,50 @@
+'''
+Searching by name and description: the index and the streaming search find the same records
+'''
+from scribblecore.config import ENEMY_JSON, INVENTORY_JSON
+from scribblecore.search import SearchIndex
+from scribblecore.storage import CampaignStore, JsonBackend
+from scribblecore.stream import streamSearch
+
+from conftest import writeDatabase
+
+ENEMIES = [{'name': 'Goblin King', 'desc': 'rules the goblins'},
+           {'name': 'Goblin', 'desc': 'a small goblin'},
+           {'name': 'Lich King', 'desc': 'undead'},
+           {'name': 'Cave troll', 'desc': 'serves the goblin king'}]
+
+# names of what the index and the streaming search find for text, in that order
+def found(text):
+    store = CampaignStore(JsonBackend(), flushDelay = 3600)
+    index = SearchIndex(store)
+    indexed = sorted(record['name'] for fileName, record in index.query(text))
+    streamed = sorted(record['name'] for fileName, record in streamSearch(text, [ENEMY_JSON]))
+    store.close()
+    return indexed, streamed
+
+# every word has to be in the name or the description
+def testEveryWordMustMatch(campaign):
+    writeDatabase(ENEMY_JSON, ENEMIES)
+    assert found('goblin king') == (['Cave troll', 'Goblin King'], ['Cave troll', 'Goblin King'])
+    assert found('King') == (['Cave troll', 'Goblin King', 'Lich King'], ['Cave troll', 'Goblin King', 'Lich King'])
+    assert found('goblin dragon') == ([], [])
+
+# the exact name comes first, then the better matches
+def testRanking(campaign):
+    writeDatabase(ENEMY_JSON, ENEMIES)
+    store = CampaignStore(JsonBackend(), flushDelay = 3600)
+    index = SearchIndex(store)
+    assert [record['name'] for fileName, record in index.query('goblin')][:2] == ['Goblin', 'Goblin King']
+    store.close()
+
+# edits made through the store are found right away
+def testIndexFollowsEdits(campaign):
+    writeDatabase(INVENTORY_JSON, [{'name': 'Rope', 'desc': 'hemp', 'count': 1}])
+    store = CampaignStore(JsonBackend(), flushDelay = 3600)
+    index = SearchIndex(store)
+    assert index.query('silk rope') == []
+    store.upsert(INVENTORY_JSON, {'name': 'Silk rope', 'desc': 'light', 'count': 1})
+    assert [record['name'] for fileName, record in index.query('silk rope')] == ['Silk rope']
+    store.remove(INVENTORY_JSON, 'silk rope')
+    assert index.query('silk rope') == []
+    store.close()
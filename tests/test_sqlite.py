@@ -0,0 +1,106 @@
+'''
+SqliteBackend: the one-shot migration from the .json databases, choosing it in config.ini, and several readers of one file
+'''
+import configparser
+import os
+import sqlite3
+import threading
+
+from scribblecore.config import INVENTORY_JSON, ENEMY_JSON, LOCATION_JSON
+from scribblecore.storage import CampaignStore, SqliteBackend, makeBackend, migrateJsonToSqlite
+
+from conftest import writeDatabase, readDatabase
+
+INVENTORY = [{'name': 'Rope', 'count': 1}, {'name': 'Torch', 'count': 4}]
+ENEMIES = [{'name': 'Orc', 'count': 2}, {'name': 'Orc', 'count': 5}]
+
+def sqliteConfig(database = 'scribble.db'):
+    config = configparser.ConfigParser()
+    config.read_dict({'Storage': {'backend': 'sqlite', 'database': database}})
+    return config
+
+# every .json database that exists is copied in with its keys, the .json files themselves are left alone
+def testMigrateCopiesDatabases(campaign, capsys):
+    writeDatabase(INVENTORY_JSON, INVENTORY)
+    writeDatabase(ENEMY_JSON, ENEMIES + ['a note'])
+    migrateJsonToSqlite('scribble.db')
+    assert not os.path.exists(LOCATION_JSON)
+    assert readDatabase(ENEMY_JSON) == ENEMIES + ['a note']
+    backend = SqliteBackend('scribble.db')
+    assert backend.load(INVENTORY_JSON) == INVENTORY
+    assert backend.load(ENEMY_JSON) == ENEMIES
+    assert sorted(backend.collectionNames()) == [ENEMY_JSON, INVENTORY_JSON]
+    collection, skipped = backend.loadKeyed(ENEMY_JSON)
+    assert skipped == 0 and collection['orc'] == ENEMIES[0]
+    backend.close()
+    assert 'Left out 1 entries of enemies.json' in capsys.readouterr().out
+
+# the name and type columns are indexed
+def testIndexes(campaign):
+    SqliteBackend('scribble.db').close()
+    with sqlite3.connect('scribble.db') as conn:
+        indexes = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert 'records_name' in indexes and any(name.startswith('sqlite_autoindex_records') for name in indexes)
+
+# choosing sqlite in config.ini migrates on the first start only, later edits to the .json files are not copied again
+def testConfigMigratesOnce(campaign):
+    writeDatabase(INVENTORY_JSON, INVENTORY)
+    store = CampaignStore(makeBackend(sqliteConfig()), flushDelay = 3600)
+    assert store.get(INVENTORY_JSON, 'torch')['count'] == 4
+    store.adjustCount(INVENTORY_JSON, 'Torch', -1)
+    store.close()
+    writeDatabase(INVENTORY_JSON, [{'name': 'Lantern', 'count': 1}])
+    store = CampaignStore(makeBackend(sqliteConfig()), flushDelay = 3600)
+    assert store.get(INVENTORY_JSON, 'torch')['count'] == 3
+    assert store.get(INVENTORY_JSON, 'lantern') is None
+    store.close()
+
+# two copies of Scribble on one database file: a saved change reaches the other one on its next read
+def testSecondConnectionSeesCommits(campaign):
+    writeDatabase(INVENTORY_JSON, INVENTORY)
+    migrateJsonToSqlite('scribble.db')
+    first = CampaignStore(SqliteBackend('scribble.db'), flushDelay = 3600)
+    second = CampaignStore(SqliteBackend('scribble.db'), flushDelay = 3600)
+    assert second.get(INVENTORY_JSON, 'rope')['count'] == 1
+    first.adjustCount(INVENTORY_JSON, 'Rope', 2)
+    first.upsert(INVENTORY_JSON, {'name': 'Lantern', 'count': 1})
+    first.flush()
+    assert second.get(INVENTORY_JSON, 'rope')['count'] == 3
+    assert second.get(INVENTORY_JSON, 'lantern') is not None
+    first.close()
+    second.close()
+
+# readers on other threads keep getting whole records while the write-behind flushes commit
+def testReadersDuringCommits(campaign):
+    writeDatabase(INVENTORY_JSON, INVENTORY)
+    migrateJsonToSqlite('scribble.db')
+    store = CampaignStore(SqliteBackend('scribble.db'), flushDelay = 3600)
+    other = CampaignStore(SqliteBackend('scribble.db'), flushDelay = 3600)
+    errors = []
+    done = threading.Event()
+
+    def read(reader):
+        try:
+            while not done.is_set():
+                assert reader.get(INVENTORY_JSON, 'rope')['count'] >= 1
+                reader.records(INVENTORY_JSON)
+        except Exception as error:
+            errors.append(error)
+
+    readers = [threading.Thread(target = read, args = (reader,)) for reader in (store, other, other)]
+    for thread in readers:
+        thread.start()
+    try:
+        for number in range(50):
+            store.upsert(INVENTORY_JSON, {'name': f'Arrow {number}', 'count': 1})
+            store.adjustCount(INVENTORY_JSON, 'Rope', 1)
+            store.flush()
+    finally:
+        done.set()
+    for thread in readers:
+        thread.join(5)
+    assert errors == []
+    assert other.get(INVENTORY_JSON, 'rope')['count'] == 51
+    assert len(other.records(INVENTORY_JSON)) == 52
+    store.close()
+    other.close()
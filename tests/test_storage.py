@@ -0,0 +1,96 @@
+'''
+CampaignStore loading and saving: records that share a name or have none are kept, nothing is lost on a round trip
+'''
+import pytest
+
+from scribblecore.config import ENEMY_JSON
+from scribblecore.storage import CampaignStore, JsonBackend, JournalBackend, SqliteBackend, keyRecords, migrateJsonToSqlite
+
+from conftest import writeDatabase, readDatabase
+
+RECORDS = [{'name': 'Goblin', 'desc': 'first', 'count': 1},
+           {'name': 'goblin', 'desc': 'second', 'count': 2},
+           {'name': 'Goblin', 'desc': 'first', 'count': 1}, # the very same record twice
+           {'desc': 'no name at all'},
+           {'name': 'Orc', 'count': 3}]
+
+# a store on backend (json, journal or sqlite) over a campaign holding RECORDS in enemies.json
+def openStore(backend):
+    writeDatabase(ENEMY_JSON, RECORDS)
+    if backend == 'sqlite':
+        migrateJsonToSqlite('scribble.db', [ENEMY_JSON])
+        return CampaignStore(SqliteBackend('scribble.db'), flushDelay = 3600)
+    return CampaignStore(JsonBackend() if backend == 'json' else JournalBackend(), flushDelay = 3600)
+
+def reopen(store, backend):
+    store.close()
+    if backend == 'sqlite':
+        return CampaignStore(SqliteBackend('scribble.db'), flushDelay = 3600)
+    return CampaignStore(JsonBackend() if backend == 'json' else JournalBackend(), flushDelay = 3600)
+
+def sortedRecords(records):
+    return sorted(records, key = repr)
+
+# duplicates and unnamed records get keys of their own
+def testKeyRecordsKeepsEveryRecord():
+    collection, skipped = keyRecords(RECORDS + ['not a record'])
+    assert skipped == 1
+    assert len(collection) == len(RECORDS)
+    assert collection['goblin']['desc'] == 'first'
+    assert collection[''] == {'desc': 'no name at all'}
+
+# the same file gives the same keys every time it is read
+def testKeyRecordsIsStable():
+    assert list(keyRecords(RECORDS)[0]) == list(keyRecords(list(RECORDS))[0])
+
+@pytest.mark.parametrize('backend', ['json', 'journal', 'sqlite'])
+def testRoundTripKeepsDuplicates(campaign, backend):
+    store = openStore(backend)
+    assert sortedRecords(store.records(ENEMY_JSON)) == sortedRecords(RECORDS)
+    store.adjustCount(ENEMY_JSON, 'orc', 1)
+    for cycle in range(3):
+        store = reopen(store, backend)
+        records = store.records(ENEMY_JSON)
+        assert len(records) == len(RECORDS)
+    expected = [dict(record, count = 4) if record.get('name') == 'Orc' else record for record in RECORDS]
+    assert sortedRecords(records) == sortedRecords(expected)
+    store.close()
+
+@pytest.mark.parametrize('backend', ['json', 'journal'])
+def testSavedFileNeverShrinks(campaign, backend):
+    store = openStore(backend)
+    store.upsert(ENEMY_JSON, {'name': 'Troll', 'count': 1})
+    store.close()
+    store = CampaignStore(JsonBackend() if backend == 'json' else JournalBackend(), flushDelay = 3600)
+    assert len(store.records(ENEMY_JSON)) == len(RECORDS) + 1
+    store.close()
+    if backend == 'json':
+        assert len(readDatabase(ENEMY_JSON)) == len(RECORDS) + 1
+
+# removing the first of several records with one name leaves the next one under that name
+def testRemovePromotesDuplicate(campaign):
+    store = openStore('json')
+    assert store.remove(ENEMY_JSON, 'Goblin')['desc'] == 'first'
+    assert store.get(ENEMY_JSON, 'goblin')['desc'] == 'second'
+    store = reopen(store, 'json')
+    assert len(store.records(ENEMY_JSON)) == len(RECORDS) - 1
+    assert store.get(ENEMY_JSON, 'goblin') is not None
+    store.close()
+
+# append adds a record even if one with that name exists, upsert replaces the first
+def testAppendAndUpsert(campaign):
+    store = openStore('json')
+    store.append(ENEMY_JSON, {'name': 'Orc', 'count': 9})
+    store.upsert(ENEMY_JSON, {'name': 'Orc', 'count': 5})
+    orcs = [record['count'] for record in store.records(ENEMY_JSON) if record.get('name') == 'Orc']
+    assert sorted(orcs) == [5, 9]
+    store.close()
+
+# a file with entries that are not records is read but never written back, so they are not lost
+def testFileWithOtherEntriesIsNotRewritten(campaign, capsys):
+    writeDatabase(ENEMY_JSON, [{'name': 'Orc', 'count': 1}, 'a note'])
+    store = CampaignStore(JsonBackend(), flushDelay = 3600)
+    store.adjustCount(ENEMY_JSON, 'Orc', 1)
+    store.close()
+    assert readDatabase(ENEMY_JSON) == [{'name': 'Orc', 'count': 1}, 'a note']
+    assert 'not' in capsys.readouterr().out.lower()
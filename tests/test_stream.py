@@ -0,0 +1,50 @@
+'''
+Streaming .json databases: records come out one at a time, whatever the window size, and malformed lists raise
+'''
+import json
+
+import pytest
+
+from scribblecore.stream import iterJsonArray, streamSearch, exportRecords
+
+RECORDS = [{'name': 'Goblin', 'desc': 'a small goblin', 'count': 1},
+           {'name': 'Drüide', 'desc': 'ünïcödé ' * 20, 'count': 2}, # several windows long, characters split between windows
+           12345678901234,
+           'plain text',
+           [1, 2, [3]],
+           {'name': 'Dragon', 'desc': 'breathes fire', 'count': 3}]
+
+def writeText(fileName, text):
+    with open(fileName, 'w', encoding = 'utf-8') as textFile:
+        textFile.write(text)
+
+# records straddling the window edges come out whole, for every window size
+@pytest.mark.parametrize('chunkSize', [1, 2, 3, 7, 64, 1024 * 1024])
+def testRecordsAcrossWindows(campaign, chunkSize):
+    writeText('big.json', json.dumps(RECORDS, indent = 2, ensure_ascii = False))
+    assert list(iterJsonArray('big.json', chunkSize)) == RECORDS
+
+@pytest.mark.parametrize('text', ['[]', ' [ ] ', '[\n]\n'])
+def testEmptyList(campaign, text):
+    writeText('empty.json', text)
+    assert list(iterJsonArray('empty.json', 2)) == []
+
+# a missing, leading, doubled or trailing comma, anything but a list, or a list that never ends raises ValueError
+@pytest.mark.parametrize('text', ['[1 2]', '[1,]', '[,1]', '[1,,2]', '[{"a": 1} {"b": 2}]', '[1, 2', '[1,', '[', '',
+                                  '{"name": "Goblin"}', '[1, nope]'])
+@pytest.mark.parametrize('chunkSize', [1, 1024])
+def testMalformedRaises(campaign, text, chunkSize):
+    writeText('bad.json', text)
+    with pytest.raises(ValueError):
+        list(iterJsonArray('bad.json', chunkSize))
+
+# search stops after limit matches, export writes the matches as a list or as lines
+def testSearchAndExport(campaign):
+    writeText('big.json', json.dumps(RECORDS))
+    assert [record['name'] for fileName, record in streamSearch('goblin', ['big.json'])] == ['Goblin']
+    assert len(list(streamSearch('goblin', ['big.json'] * 3, limit = 2))) == 2
+    keep = lambda record: isinstance(record, dict)
+    assert exportRecords('big.json', 'out.json', keep) == 3
+    assert json.load(open('out.json')) == [record for record in RECORDS if keep(record)]
+    assert exportRecords('big.json', 'out.jsonl', limit = 2) == 2
+    assert [json.loads(line) for line in open('out.jsonl')] == RECORDS[:2]
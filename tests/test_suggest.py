@@ -0,0 +1,65 @@
+'''
+Name suggestions: completions first, then names within a typo or two, kept in step with the store
+'''
+from scribblecore.config import INVENTORY_JSON, ENEMY_JSON
+from scribblecore.storage import CampaignStore, JsonBackend
+from scribblecore.suggest import NameSuggester
+
+from conftest import writeDatabase
+
+INVENTORY = [{'name': 'Healing Potion', 'count': 2}, {'name': 'Healer\'s Kit', 'count': 1}, {'name': 'Rope', 'count': 1},
+             {'name': 'Heavy Crossbow', 'count': 1}, {'name': 'Torch', 'count': 5}]
+ENEMIES = [{'name': 'Hell Hound'}, {'name': 'Goblin'}, {'name': 'goblin', 'desc': 'another one'}]
+
+def openSuggester(skip = None):
+    writeDatabase(INVENTORY_JSON, INVENTORY)
+    writeDatabase(ENEMY_JSON, ENEMIES)
+    store = CampaignStore(JsonBackend(), flushDelay = 3600)
+    return store, NameSuggester(store, skip)
+
+# names starting with the text, alphabetically, across every database unless one is asked for
+def testCompletions(campaign):
+    store, suggester = openSuggester()
+    assert suggester.suggest('hea') == ["Healer's Kit", 'Healing Potion', 'Heavy Crossbow', 'Hell Hound'] # then a typo away
+    assert suggester.suggest('he', limit = 2) == ["Healer's Kit", 'Healing Potion']
+    assert suggester.suggest('hel')[0] == 'Hell Hound'
+    assert suggester.suggest('hel', INVENTORY_JSON) == ["Healer's Kit", 'Healing Potion', 'Heavy Crossbow'] # typos only
+    assert suggester.suggest('ro', ENEMY_JSON) == []
+    assert suggester.suggest('  ') == []
+    store.close()
+
+# a name two databases share, or twice in one, is suggested once
+def testNoDuplicates(campaign):
+    store, suggester = openSuggester()
+    assert suggester.suggest('gob') == ['Goblin']
+    store.close()
+
+# swapped, missing, extra and wrong letters are forgiven, one typo in short text and two in longer text
+def testTypos(campaign):
+    store, suggester = openSuggester()
+    assert suggester.suggest('helaing pot')[0] == 'Healing Potion'
+    assert suggester.suggest('rpoe') == ['Rope']
+    assert suggester.suggest('torhc', INVENTORY_JSON) == ['Torch']
+    assert suggester.suggest('hevy crosbow') == ['Heavy Crossbow']
+    assert suggester.suggest('tx') == [] # too short to guess at
+    assert suggester.suggest('xyzzy') == []
+    store.close()
+
+# edits through the store, and files changed on disk, reach the suggestions
+def testFollowsStore(campaign):
+    store, suggester = openSuggester()
+    assert suggester.suggest('lan') == []
+    store.upsert(INVENTORY_JSON, {'name': 'Lantern', 'count': 1})
+    assert suggester.suggest('lan') == ['Lantern']
+    store.remove(INVENTORY_JSON, 'rope')
+    assert suggester.suggest('rop') == []
+    writeDatabase(ENEMY_JSON, [{'name': 'Ogre'}])
+    assert suggester.suggest('og') == ['Ogre'] and suggester.suggest('gob') == []
+    store.close()
+
+# databases skip() leaves out are never read
+def testSkip(campaign):
+    store, suggester = openSuggester(skip = lambda fileName: fileName == ENEMY_JSON)
+    assert suggester.suggest('gob') == []
+    assert suggester.suggest('tor') == ['Torch']
+    store.close()
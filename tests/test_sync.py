@@ -0,0 +1,106 @@
+'''
+The sync server: requests naming files outside the campaign are refused, changes and outside edits reach every client
+'''
+import asyncio
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+import scribblecore.sync as sync
+from scribblecore.config import ENEMY_JSON
+from scribblecore.storage import CampaignStore, JsonBackend
+
+from conftest import writeDatabase
+
+# a sync server for the campaign folder on a free port, stopped after the test; yields (store, port)
+@pytest.fixture
+def server(campaign, monkeypatch):
+    monkeypatch.setattr(sync, 'SYNC_RELOAD_CHECK', 0.05)
+    writeDatabase(ENEMY_JSON, [{'name': 'Orc', 'count': 1}])
+    writeDatabase('notes.json', [])
+    store = CampaignStore(JsonBackend(), flushDelay = 0.05)
+    syncServer = sync.SyncServer(store)
+    ready = threading.Event()
+    started = {}
+
+    def run():
+        loop = asyncio.new_event_loop()
+        started['loop'] = loop
+        started['task'] = loop.create_task(syncServer.serve('127.0.0.1', 0, lambda port: (started.update(port = port), ready.set())))
+        try:
+            loop.run_until_complete(started['task'])
+        except asyncio.CancelledError:
+            pass
+        loop.close()
+
+    thread = threading.Thread(target = run, daemon = True)
+    thread.start()
+    assert ready.wait(5)
+    yield store, started['port']
+    started['loop'].call_soon_threadsafe(started['task'].cancel)
+    thread.join(5)
+    store.close()
+
+# sends request on a raw connection and returns the reply
+def ask(port, request):
+    with socket.create_connection(('127.0.0.1', port), timeout = 5) as connection, connection.makefile('rwb') as stream:
+        stream.write(json.dumps(dict(request, id = 1)).encode() + b'\n')
+        stream.flush()
+        while True:
+            reply = json.loads(stream.readline())
+            if reply.get('id') == 1:
+                return reply
+
+# waits up to a few seconds for check() to be True
+def eventually(check):
+    deadline = time.time() + 5
+    while not check():
+        assert time.time() < deadline
+        time.sleep(0.02)
+
+# anything but a plain .json name of a database of the campaign is refused
+@pytest.mark.parametrize('fileName', ['../enemies.json', '/etc/passwd.json', 'sub/enemies.json', 'enemies.txt', '.hidden.json',
+                                      'missing.json', 5, None])
+def testDispatchRefusesOtherFiles(server, fileName):
+    store, port = server
+    reply = ask(port, {'op': 'load', 'file': fileName})
+    assert 'error' in reply and 'items' not in reply
+    reply = ask(port, {'op': 'upsert', 'file': fileName, 'record': {'name': 'Imp'}})
+    assert 'error' in reply
+
+# databases the store knows, ones in the folder and the app's own are served
+@pytest.mark.parametrize('fileName', [ENEMY_JSON, 'notes.json', 'inventory.json'])
+def testDispatchAcceptsCampaignFiles(server, fileName):
+    store, port = server
+    assert 'items' in ask(port, {'op': 'load', 'file': fileName})
+
+# a request the server does not know gets an error, not a dropped connection
+def testUnknownRequest(server):
+    store, port = server
+    assert ask(port, {'op': 'drop'})['error'] == 'Unknown request drop'
+
+# a change made by one client reaches the other through the feed
+def testChangesReachClients(server):
+    store, port = server
+    first, second = sync.RemoteStore('127.0.0.1', port), sync.RemoteStore('127.0.0.1', port)
+    assert second.get(ENEMY_JSON, 'orc')['count'] == 1
+    first.adjustCount(ENEMY_JSON, 'Orc', 2)
+    first.upsert(ENEMY_JSON, {'name': 'Troll', 'count': 1})
+    eventually(lambda: second.get(ENEMY_JSON, 'troll') is not None)
+    assert second.get(ENEMY_JSON, 'orc')['count'] == 3
+    first.close()
+    second.close()
+
+# a database edited outside the app on the server's machine is loaded again by the clients
+def testOutsideEditReachesClients(server):
+    store, port = server
+    client = sync.RemoteStore('127.0.0.1', port)
+    assert client.get(ENEMY_JSON, 'orc')['count'] == 1
+    time.sleep(0.05) # a later modification time than the first write
+    writeDatabase(ENEMY_JSON, [{'name': 'Orc', 'count': 7}, {'name': 'Troll', 'count': 1}])
+    eventually(lambda: client.get(ENEMY_JSON, 'troll') is not None)
+    assert client.get(ENEMY_JSON, 'orc')['count'] == 7
+    client.close()
@@ -0,0 +1,84 @@
+'''
+Campaign tallies: counting in memory, one write per batch into config.ini and the history file, totals over time and sessions
+'''
+import configparser
+
+import pytest
+
+from scribblecore.tally import TallyCounters, TALLY_RECORD
+
+CONFIG = '''# my campaign
+[Settings]
+theme = dark
+
+[Campaign]
+; kept as they are
+session_count = 2
+total_deaths: 1
+'''
+
+# counters over config.ini and the history file in the campaign folder
+def openTallies():
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    return TallyCounters(config, configPath = 'config.ini', historyPath = 'history.bin', flushDelay = 3600)
+
+def writeConfig():
+    with open('config.ini', 'w') as configFile:
+        configFile.write(CONFIG)
+
+def readConfig():
+    with open('config.ini') as configFile:
+        return configFile.read()
+
+# increments only touch memory until a flush, which rewrites the counter lines and leaves the rest of the file alone
+def testFlushRewritesCounters(campaign):
+    writeConfig()
+    tallies = openTallies()
+    assert tallies.increment('total_deaths') == 2
+    tallies.increment('beers_consumed', 3)
+    assert readConfig() == CONFIG
+    tallies.close()
+    text = readConfig()
+    assert '# my campaign' in text and '; kept as they are' in text and 'theme = dark' in text
+    assert 'total_deaths: 2' in text and 'beers_consumed = 3' in text and 'enemies_slain = 0' in text
+    assert openTallies().total('beers_consumed') == 3
+    with pytest.raises(ValueError):
+        tallies.increment('dragons_befriended')
+
+# the history comes back on the next start, per session; a record cut short by a crash is dropped and then overwritten
+def testHistorySurvivesRestart(campaign):
+    writeConfig()
+    tallies = openTallies()
+    tallies.increment('enemies_slain', 4)
+    assert tallies.startSession() == 3
+    tallies.increment('enemies_slain', 2)
+    tallies.close()
+    with open('history.bin', 'ab') as historyFile:
+        historyFile.write(b'\x01\x02\x03') # half a record
+    tallies = openTallies()
+    assert tallies.session() == 3
+    assert tallies.sessionTotal('enemies_slain', 2) == 4 and tallies.sessionTotal('enemies_slain') == 2
+    assert tallies.sessionStart(3) is not None and tallies.sessionStart(2) is None
+    tallies.increment('enemies_slain')
+    tallies.close()
+    with open('history.bin', 'rb') as historyFile:
+        size = len(historyFile.read())
+    assert (size - len(b'SCRTALY1')) % TALLY_RECORD.size == 0
+    assert openTallies().sessionTotal('enemies_slain', 3) == 3
+
+# window and bucket totals count the events in them, start included and end not
+def testTimeWindows(campaign, monkeypatch):
+    writeConfig()
+    tallies = openTallies()
+    clock = [1000.0]
+    monkeypatch.setattr('scribblecore.tally.time.time', lambda: clock[0])
+    for when, amount in [(1000, 1), (1010, 2), (1020, 4), (1030, 8)]:
+        clock[0] = when
+        tallies.increment('beers_consumed', amount)
+    assert tallies.between('beers_consumed', 1010, 1030) == 6
+    assert tallies.windowTotal('beers_consumed', 15) == 12
+    assert tallies.buckets('beers_consumed', 1000, 1040, 4) == [1, 2, 4, 8]
+    clock[0] = 900 # the clock went back: the event still counts after the others
+    tallies.increment('beers_consumed', 16)
+    assert tallies.between('beers_consumed', 1030, 1031) == 24
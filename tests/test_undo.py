@@ -0,0 +1,128 @@
+'''
+Undo, redo and snapshots of the CampaignStore, and the CollectionVersions they are kept as
+'''
+import random
+
+from scribblecore.config import ENEMY_JSON, INVENTORY_JSON
+from scribblecore.persistent import PersistentMap, CollectionVersion
+from scribblecore.storage import CampaignStore, JsonBackend
+
+from conftest import writeDatabase, readDatabase
+
+# counts the records the store reports as changed
+class ChangeCounter:
+    def __init__(self):
+        self.changed = []
+
+    def recordChanged(self, fileName, key, record):
+        self.changed.append(key)
+
+    def collectionSaved(self, fileName):
+        pass
+
+# a campaign with 50 inventory items and one enemy
+def openStore():
+    writeDatabase(INVENTORY_JSON, [{'name': f'Item {number}', 'count': number} for number in range(50)])
+    writeDatabase(ENEMY_JSON, [{'name': 'Goblin', 'count': 1}])
+    return CampaignStore(JsonBackend(), flushDelay = 3600)
+
+def counts(store):
+    return {record['name']: record['count'] for record in store.records(INVENTORY_JSON)}
+
+# each change is undone and redone in order, and a redone change is saved
+def testUndoRedo(campaign):
+    store = openStore()
+    before = counts(store)
+    store.adjustCount(INVENTORY_JSON, 'Item 3', 5)
+    store.remove(INVENTORY_JSON, 'Item 4')
+    store.upsert(INVENTORY_JSON, {'name': 'Rope', 'count': 1})
+    assert store.history()[0] == ['add Rope', 'remove Item 4', 'count Item 3 +5']
+    assert store.undo() == 'add Rope'
+    assert store.undo() == 'remove Item 4'
+    assert store.undo() == 'count Item 3 +5'
+    assert store.undo() is None
+    assert counts(store) == before
+    assert store.redo() == 'count Item 3 +5'
+    assert store.get(INVENTORY_JSON, 'Item 3')['count'] == 8
+    store.close()
+    assert {record['name']: record['count'] for record in readDatabase(INVENTORY_JSON)}['Item 3'] == 8
+
+# a new change after an undo drops what could be redone
+def testChangeClearsRedo(campaign):
+    store = openStore()
+    store.adjustCount(INVENTORY_JSON, 'Item 1', 1)
+    store.undo()
+    store.adjustCount(INVENTORY_JSON, 'Item 2', 1)
+    assert store.history()[1] == []
+    assert store.redo() is None
+    store.close()
+
+# restoring a snapshot touches only the records that differ, and is undone as one step
+def testSnapshotRestore(campaign):
+    store = openStore()
+    snapshot = store.snapshot([INVENTORY_JSON, ENEMY_JSON])
+    start = counts(store)
+    store.adjustCount(INVENTORY_JSON, 'Item 7', 1)
+    store.remove(ENEMY_JSON, 'Goblin')
+    store.upsertMany(INVENTORY_JSON, [{'name': f'Arrow {number}', 'count': 1} for number in range(100)])
+    after = counts(store)
+    counter = ChangeCounter()
+    store.addListener(counter)
+    assert store.restore(snapshot, 'restore start') == 102
+    assert len(counter.changed) == 102
+    assert counts(store) == start
+    assert store.get(ENEMY_JSON, 'goblin') is not None
+    assert store.undo() == 'restore start'
+    assert counts(store) == after
+    store.close()
+
+# a batch bigger than its collection starts a new version base, undoing it still restores every record
+def testUndoBulkImport(campaign):
+    store = openStore()
+    store.adjustCount(INVENTORY_JSON, 'Item 0', 1)
+    store.upsertMany(INVENTORY_JSON, [{'name': f'Arrow {number}', 'count': 1} for number in range(500)])
+    store.upsertMany(INVENTORY_JSON, [{'name': 'Item 1', 'count': 99}])
+    assert store.undo() == 'add 1 records to inventory.json'
+    assert store.get(INVENTORY_JSON, 'item 1')['count'] == 1
+    assert store.undo() == 'add 500 records to inventory.json'
+    assert len(store.records(INVENTORY_JSON)) == 50
+    assert store.get(INVENTORY_JSON, 'item 0')['count'] == 1
+    store.close()
+
+# maps share what they do not change, and changes() finds exactly what differs
+def testPersistentMap():
+    empty = PersistentMap()
+    full = empty.update({number: str(number) for number in range(1000)})
+    fewer = full.remove(5).set(6, 'six')
+    assert len(empty) == 0 and len(full) == 1000 and len(fewer) == 999
+    assert full[5] == '5' and 5 not in fewer and fewer[6] == 'six'
+    assert sorted(fewer.changes(full)) == [(5, None, '5'), (6, 'six', '6')]
+    assert full.set(1, full[1]) is full
+
+# every pair of versions, whatever base they grew from, reports exactly the keys that differ
+def testCollectionVersionChanges():
+    chooser = random.Random(1)
+    values = [object() for number in range(4)]
+    collection = {key: chooser.choice(values) for key in range(20)}
+    version = CollectionVersion(collection)
+    history = [(version, dict(collection))]
+    for step in range(200):
+        key = chooser.randrange(30)
+        if step % 25 == 24: # a bulk change takes a new base
+            changed = [chooser.randrange(30) for number in range(5)]
+            for key in changed:
+                collection[key] = chooser.choice(values)
+            version = CollectionVersion(collection, version, changed)
+        elif chooser.random() < 0.5:
+            collection[key] = chooser.choice(values)
+            version = version.set(key, collection[key])
+        else:
+            collection.pop(key, None)
+            version = version.remove(key)
+        assert dict(version.items()) == collection and len(version) == len(collection)
+        history.append((version, dict(collection)))
+    for number in range(200):
+        (mine, mineRecords), (theirs, theirRecords) = chooser.sample(history, 2)
+        expected = {key: (mineRecords.get(key), theirRecords.get(key)) for key in set(mineRecords) | set(theirRecords)
+                    if mineRecords.get(key) is not theirRecords.get(key)}
+        assert {key: (here, there) for key, here, there in mine.changes(theirs)} == expected